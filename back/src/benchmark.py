@@ -0,0 +1,320 @@
+"""
+Benchmark of the file catalog, the index and the search on a synthetic corpus.
+
+It generates a /shared tree with its database rows, then measures
+FileManager.list_files, index_files and search_files for every search mode,
+with and without filters. Results are printed (or written) as JSON so they can
+be compared between versions.
+
+It wipes /shared, /data and the database it runs on, so always run it in a
+throwaway container with a stand-in database, e.g.:
+
+    docker compose run --rm --no-deps \\
+        -v /tmp/bench/shared:/shared -v /tmp/bench/data:/data \\
+        -e DATABASE_URL=sqlite:////data/bench.db \\
+        back /app/benchmark.py --sizes 1000 10000 100000 --output /data/bench.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+SHARED_PATH = "/shared"
+MARKER_PATH = f"{SHARED_PATH}/.benchmark"  # directory, so it is never walked
+
+logger = logging.getLogger("benchmark")
+
+SUBFOLDERS = ["uploads", "notes", "scans", "audio"]
+EXTENSIONS = {  # extension -> weight
+    ".txt": 30,
+    ".md": 25,
+    ".csv": 10,
+    ".json": 5,
+    ".html": 5,
+    ".png": 15,
+    ".mp3": 10,
+}
+TEXT_EXTENSIONS = [".txt", ".md", ".csv", ".json", ".html"]
+
+SUMMARY_RATIO = 0.6
+NOTE_RATIO = 0.2
+TAG_RATIO = 0.3
+PROJECT_RATIO = 0.2
+
+
+def make_vocabulary(rng, size=2000):
+    syllables = [c + v for c in "bcdfghjklmnprstvz" for v in "aeiou"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_text(rng, vocabulary, nbr_words):
+    # Zipf-like distribution so some words are frequent and most are rare
+    return " ".join(
+        vocabulary[min(int(rng.paretovariate(1.2)) - 1, len(vocabulary) - 1)]
+        for _ in range(nbr_words)
+    )
+
+
+def check_environment():
+    """
+    Refuse to run on anything else than a throwaway environment.
+    """
+    if not os.environ.get("DATABASE_URL"):
+        raise SystemExit("Set DATABASE_URL to a stand-in database (e.g. sqlite).")
+    os.makedirs(SHARED_PATH, exist_ok=True)
+    if os.listdir(SHARED_PATH) and not os.path.isdir(MARKER_PATH):
+        raise SystemExit(f"{SHARED_PATH} is not empty and not a benchmark corpus.")
+
+
+def reset():
+    """
+    Empty /shared, the index and the database.
+    """
+    from controllers.FileManager import (
+        INDEX_CHECKPOINT_FILE,
+        INDEX_PATH,
+        INDEX_STAGING_PATH,
+        INDEX_VERSION_FILE,
+    )
+    from db import DB, create_default_values
+    from db.models import Base
+
+    for entry in os.scandir(SHARED_PATH):
+        if entry.is_dir():
+            shutil.rmtree(entry.path)
+        else:
+            os.remove(entry.path)
+    os.makedirs(MARKER_PATH)
+    shutil.rmtree(INDEX_PATH, ignore_errors=True)
+    shutil.rmtree(INDEX_STAGING_PATH, ignore_errors=True)
+    for file in [INDEX_VERSION_FILE, INDEX_CHECKPOINT_FILE]:
+        if os.path.exists(file):
+            os.remove(file)
+
+    Base.metadata.drop_all(bind=DB().engine)
+    Base.metadata.create_all(bind=DB().engine)
+    create_default_values()
+
+
+def generate(nbr_files, nbr_days, rng):
+    """
+    Write nbr_files files over nbr_days date folders along with their
+    catalog, summary, note, tag and project rows.
+    """
+    from controllers.CatalogManager import CatalogManager
+    from db import Note, Project, ProjectFile, Summary, Tag, TagFile, get_db
+
+    vocabulary = make_vocabulary(rng)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    extensions = list(EXTENSIONS)
+    weights = list(EXTENSIONS.values())
+
+    db = get_db()
+    try:
+        tags = [tag.name for tag in db.query(Tag).all()]
+        projects = [project.name for project in db.query(Project).all()]
+
+        for i in range(nbr_files):
+            date = (today - timedelta(days=rng.randrange(nbr_days))).strftime(
+                "%Y-%m-%d"
+            )
+            extension = rng.choices(extensions, weights)[0]
+            folder = os.path.join(SHARED_PATH, date, rng.choice(SUBFOLDERS))
+            os.makedirs(folder, exist_ok=True)
+            file = os.path.join(folder, f"{rng.choice(vocabulary)}_{i}{extension}")
+            with open(file, "w") as f:
+                if extension in TEXT_EXTENSIONS:
+                    f.write(make_text(rng, vocabulary, rng.randint(50, 800)))
+                else:
+                    f.write("binary placeholder")
+
+            db.add(CatalogManager.make_entry(file))
+            if rng.random() < SUMMARY_RATIO:
+                db.add(
+                    Summary(
+                        file=file,
+                        date=datetime.now(),
+                        summary=make_text(rng, vocabulary, rng.randint(50, 300)),
+                        keywords=json.dumps(rng.sample(vocabulary[:500], 8)),
+                    )
+                )
+            if rng.random() < NOTE_RATIO:
+                db.add(
+                    Note(
+                        file=file,
+                        date=datetime.now(),
+                        note=make_text(rng, vocabulary, rng.randint(5, 60)),
+                    )
+                )
+            if rng.random() < TAG_RATIO:
+                for tag in rng.sample(tags, rng.randint(1, 2)):
+                    db.add(TagFile(file=file, tag=tag))
+            if rng.random() < PROJECT_RATIO:
+                db.add(ProjectFile(file=file, project=rng.choice(projects)))
+
+            if i % 1000 == 999:
+                db.commit()
+        db.commit()
+    finally:
+        db.close()
+
+    return vocabulary, tags, projects
+
+
+def measure(function, runs):
+    """
+    Time function over runs, then measure its peak allocation in a separate
+    run so tracing doesn't skew the latencies.
+    """
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "runs": runs,
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(runs * 0.95))], 3),
+        "max_ms": round(latencies[-1], 3),
+        "peak_alloc_mb": round(peak / 1024 / 1024, 3),
+    }
+
+
+def run(nbr_files, nbr_days, runs, modes, rng):
+    from controllers.FileManager import FileManager
+
+    result = {"files": nbr_files, "days": nbr_days}
+
+    reset()
+    FileManager.setup()  # empty index, its background rebuild ends right away
+    FileManager.rebuild_thread.join()
+
+    start = time.perf_counter()
+    vocabulary, tags, projects = generate(nbr_files, nbr_days, rng)
+    result["generate_s"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    FileManager.index_files()
+    result["index_rebuild_s"] = round(time.perf_counter() - start, 3)
+
+    files = FileManager.list_files()
+    result["index_update"] = measure(
+        lambda: FileManager.index_files([rng.choice(files)]), runs
+    )
+
+    today = datetime.now()
+    filters = {
+        "none": {},
+        "date": {
+            "start_date": (today - timedelta(days=nbr_days // 4)).isoformat(),
+            "end_date": today.isoformat(),
+        },
+        "all": {
+            "start_date": (today - timedelta(days=nbr_days // 2)).isoformat(),
+            "end_date": today.isoformat(),
+            "types": ["text/plain", "text/markdown"],
+            "subfolders": SUBFOLDERS[:2],
+            "tags": tags[:2],
+            "projects": projects[:2],
+        },
+    }
+
+    result["list_files"] = {
+        name: measure(lambda: FileManager.list_files(**kwargs), runs)
+        for name, kwargs in filters.items()
+    }
+
+    queries = [
+        " ".join(rng.sample(vocabulary[:50], 1)),  # frequent word
+        " ".join(rng.sample(vocabulary[:500], 2)),
+        " ".join(rng.sample(vocabulary, 2)),  # mostly rare words
+    ]
+    result["search"] = {}
+    for mode in modes:
+        result["search"][str(mode)] = {}
+        for name, kwargs in filters.items():
+            result["search"][str(mode)][name] = measure(
+                lambda: FileManager.run_search(
+                    rng.choice(queries), search_mode=mode, **kwargs
+                ),
+                runs,
+            )
+            FileManager.cache.invalidate()
+            FileManager.search_files(queries[0], search_mode=mode, **kwargs)
+            result["search"][str(mode)][f"{name}_cached"] = measure(
+                lambda: FileManager.search_files(
+                    queries[0], search_mode=mode, **kwargs
+                ),
+                runs,
+            )
+
+    result["max_rss_mb"] = round(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 3
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--days", type=int, default=365, help="Date folders")
+    parser.add_argument("--runs", type=int, default=50, help="Runs per measure")
+    parser.add_argument(
+        "--modes",
+        type=int,
+        nargs="+",
+        default=[0, 1, 2],
+        help="Search modes (3 needs an Ollama embedding model)",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON file, printed when missing")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.ERROR, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    logger.setLevel(logging.INFO)
+    check_environment()
+
+    results = {
+        "date": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "database": os.environ["DATABASE_URL"].split(":")[0],
+        "args": vars(args),
+        "results": [],
+    }
+    for size in args.sizes:
+        logger.info(f"BENCHMARK >> Running with {size} files...")
+        results["results"].append(
+            run(size, args.days, args.runs, args.modes, random.Random(args.seed))
+        )
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+import logging
+import os
+import traceback
+from datetime import datetime
+
+from controllers.FileManager import FileManager
+from db import File, get_db
+from utils import guess_mime, hash_file, parse_path, prune_text_store, walk_files
+
+
+class CatalogManager:
+    @classmethod
+    def make_entry(cls, file, hash=None):
+        stat = os.stat(file)
+        date, subfolder = parse_path(file)
+        return File(
+            path=file,
+            date=date,
+            subfolder=subfolder,
+            mime=guess_mime(file),
+            size=stat.st_size,
+            mtime=datetime.fromtimestamp(int(stat.st_mtime)),
+            hash=hash,
+        )
+
+    @classmethod
+    def add(cls, file, hash=None):
+        """
+        Add or refresh the catalog entry of a file.
+        """
+        db = get_db()
+        try:
+            db.merge(cls.make_entry(file, hash or hash_file(file)))
+            db.commit()
+            FileManager.notify_change()
+        except Exception as e:
+            db.rollback()
+            logging.error(f"Error adding file {file} to catalog: {str(e)}")
+            logging.error(traceback.format_exc())
+            raise e
+        finally:
+            db.close()
+
+    @classmethod
+    def add_files(cls, files):
+        """
+        Add or refresh the catalog entries of many files in one transaction.
+        Content hashes are left to the next reconcile.
+        """
+        if not files:
+            return
+        db = get_db()
+        try:
+            for file in files:
+                try:
+                    db.merge(cls.make_entry(file))
+                except FileNotFoundError:
+                    continue
+            db.commit()
+            FileManager.notify_change()
+        except Exception as e:
+            db.rollback()
+            logging.error(f"Error adding {len(files)} files to catalog: {str(e)}")
+            logging.error(traceback.format_exc())
+            raise e
+        finally:
+            db.close()
+
+    @classmethod
+    def delete(cls, file):
+        """
+        Delete the catalog entry of a file.
+        """
+        db = get_db()
+        try:
+            db.query(File).filter(File.path == file).delete()
+            db.commit()
+            FileManager.notify_change()
+        except Exception as e:
+            db.rollback()
+            logging.error(f"Error deleting file {file} from catalog: {str(e)}")
+            logging.error(traceback.format_exc())
+            raise e
+        finally:
+            db.close()
+
+    @classmethod
+    def delete_files(cls, files):
+        """
+        Delete the catalog entries of many files in one transaction.
+        """
+        if not files:
+            return
+        db = get_db()
+        try:
+            for start in range(0, len(files), 500):
+                db.query(File).filter(File.path.in_(files[start : start + 500])).delete(
+                    synchronize_session=False
+                )
+            db.commit()
+            FileManager.notify_change()
+        except Exception as e:
+            db.rollback()
+            logging.error(f"Error deleting {len(files)} files from catalog: {str(e)}")
+            logging.error(traceback.format_exc())
+            raise e
+        finally:
+            db.close()
+
+    @classmethod
+    def get_stats(cls, files):
+        """
+        Get the cataloged (size, mtime) of the given files.
+        """
+        db = get_db()
+        try:
+            stats = {}
+            for start in range(0, len(files), 500):
+                for entry in db.query(File.path, File.size, File.mtime).filter(
+                    File.path.in_(files[start : start + 500])
+                ):
+                    stats[entry.path] = (entry.size, entry.mtime)
+            return stats
+        finally:
+            db.close()
+
+    @classmethod
+    def find_duplicates(cls, hash, exclude=None):
+        """
+        List the cataloged files with the given content hash that are still
+        in /shared.
+        """
+        db = get_db()
+        try:
+            paths = [
+                row.path
+                for row in db.query(File.path).filter(File.hash == hash)
+                if row.path != exclude
+            ]
+        finally:
+            db.close()
+        return [path for path in paths if os.path.isfile(path)]
+
+    @classmethod
+    def move(cls, file, new_file):
+        """
+        Move the catalog entry of a file, keeping its content hash.
+        """
+        db = get_db()
+        try:
+            entry = db.query(File).filter(File.path == file).first()
+            hash = entry.hash if entry else None
+            if entry:
+                db.delete(entry)
+            db.merge(cls.make_entry(new_file, hash or hash_file(new_file)))
+            db.commit()
+            FileManager.notify_change()
+        except Exception as e:
+            db.rollback()
+            logging.error(
+                f"Error moving file {file} to {new_file} in catalog: {str(e)}"
+            )
+            logging.error(traceback.format_exc())
+            raise e
+        finally:
+            db.close()
+
+    @classmethod
+    def reconcile(cls, start_date: str = None, end_date: str = None):
+        """
+        Fix drift between the catalog and /shared.
+        With a date range, only the matching date directories and entries are
+        reconciled.
+        Entries are first synced from file stats so the catalog is usable right
+        away, then the missing content hashes are computed.
+        Returns the added, updated and removed files.
+        """
+        logging.info("CATALOG >> Reconciling catalog...")
+        files = set(walk_files(start_date, end_date))
+
+        db = get_db()
+        try:
+            query = db.query(File)
+            if start_date:
+                query = query.filter(
+                    File.date >= datetime.fromisoformat(start_date[:10])
+                )
+            if end_date:
+                query = query.filter(File.date <= datetime.fromisoformat(end_date[:10]))
+            entries = {entry.path: entry for entry in query.all()}
+
+            removed = []
+            for path in set(entries) - files:
+                db.delete(entries.pop(path))
+                removed.append(path)
+
+            added, updated = [], []
+            for file in files:
+                try:
+                    entry = cls.make_entry(file)
+                except FileNotFoundError:
+                    continue
+                existing = entries.get(file)
+                if existing is None:
+                    db.add(entry)
+                    added.append(file)
+                elif existing.size != entry.size or existing.mtime != entry.mtime:
+                    db.merge(entry)  # content changed, hash is recomputed below
+                    updated.append(file)
+            db.commit()
+            if added or updated or removed:
+                FileManager.notify_change()
+            logging.info(
+                f"CATALOG >> {len(added)} added, {len(updated)} updated, {len(removed)} removed."
+            )
+
+            for entry in query.filter(File.hash.is_(None)).all():
+                try:
+                    entry.hash = hash_file(entry.path)
+                    db.commit()
+                except FileNotFoundError:
+                    db.rollback()
+
+            if not start_date and not end_date:
+                hashes = set(row.hash for row in db.query(File.hash).distinct())
+                pruned = prune_text_store(hashes)
+                if pruned:
+                    logging.info(f"CATALOG >> Pruned {pruned} extracted texts.")
+        except Exception as e:
+            db.rollback()
+            raise e
+        finally:
+            db.close()
+        logging.info("CATALOG >> Reconcile complete.")
+        return {"added": added, "updated": updated, "removed": removed}
+
+    @classmethod
+    def list_paths(cls, limit: int = None, before: str = None):
+        """
+        List the paths of cataloged files, most recent first.
+        With before, only the paths sorted after that path are listed.
+        """
+        db = get_db()
+        try:
+            query = db.query(File.path)
+            if before:
+                query = query.filter(File.path < before)
+            query = query.order_by(File.path.desc())
+            if limit is not None:
+                query = query.limit(limit)
+            return [row.path for row in query]
+        finally:
+            db.close()
+
+    @classmethod
+    def iter_paths(cls, batch_size: int = 1000):
+        """
+        Iterate over the paths of all cataloged files, most recent first,
+        fetching them batch by batch.
+        """
+        before = None
+        while True:
+            paths = cls.list_paths(limit=batch_size, before=before)
+            yield from paths
+            if len(paths) < batch_size:
+                break
+            before = paths[-1]
+
+    @classmethod
+    def count(cls):
+        """
+        Count the cataloged files.
+        """
+        db = get_db()
+        try:
+            return db.query(File).count()
+        finally:
+            db.close()
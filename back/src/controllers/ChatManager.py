@@ -3,12 +3,13 @@ import logging
 import queue
 import time
 from datetime import datetime
+from threading import Event
 from typing import Dict, List
 
 import tiktoken
 from db import ChatMessage, ChatSession, get_db
 from fastapi import HTTPException
-from tools.ai import request_llm
+from tools.ai import LLMCancelled, request_llm
 from utils import read_content
 
 
@@ -27,6 +28,7 @@ class ChatManager:
     queue = queue.Queue()
     running_chat = None
     running_answer = ""
+    cancel_event = Event()  # stops the answer of the running chat
 
     def start_thread():
         ChatManager.loop()
@@ -101,12 +103,21 @@ Message: {msg['content']}\n\n
             chat_id = cls.queue.get()
             cls.running_chat = chat_id
             cls.running_answer = ""
+            cls.cancel_event.clear()
 
             prompt, files, calendars = cls.generate_prompt(chat_id)
             try:
                 ai_type, model, chat_answer = request_llm(
-                    "chat", prompt, stream_callback=cls.stream_callback
+                    "chat",
+                    prompt,
+                    stream_callback=cls.stream_callback,
+                    cancel_event=cls.cancel_event,
                 )
+            except LLMCancelled:
+                logging.info(f"CHAT >> Cancelled chat session {chat_id}")
+                ai_type = "Cancelled"
+                model = ""
+                chat_answer = f"{cls.running_answer}\n\n*Cancelled*".strip()
             except Exception as e:
                 ai_type = "Error"
                 model = ""
@@ -138,6 +149,20 @@ Message: {msg['content']}\n\n
     def add_to_queue(cls, chat_id):
         cls.queue.put(chat_id)
 
+    @classmethod
+    def cancel(cls, chat_id):
+        """
+        Remove a chat session from the queue, or stop its running answer.
+        """
+        with cls.queue.mutex:
+            if chat_id in cls.queue.queue:
+                cls.queue.queue.remove(chat_id)
+                return {"state": "cancelled"}
+        if cls.running_chat == chat_id:
+            cls.cancel_event.set()
+            return {"state": "cancelled"}
+        raise HTTPException(status_code=404, detail="Chat session is not running")
+
     @classmethod
     def is_running(cls, chat_id):
         if cls.running_chat == chat_id:
@@ -1,49 +1,120 @@
+import json
 import logging
+import multiprocessing
 import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from threading import Lock, Thread
 from typing import List
 
-from controllers.NoteManager import NoteManager
-from controllers.SummarizeManager import SummarizeManager
+from controllers.SuggestManager import SuggestManager
+from controllers.VectorManager import VectorManager
 from db import get_db
-from db.models import ProjectFile, TagFile
+from db.models import File, Note, ProjectFile, Summary, TagFile
+from sqlalchemy import or_, select
+from tools.cache import LRUCache
 from tqdm import tqdm
-from utils import guess_mime, read_content
+from utils import extract_pages, extract_text, guess_mime, parse_path, walk_files
 from views.settings import get_setting
-from whoosh import writing
-from whoosh.fields import ID, NGRAM, Schema
-from whoosh.index import create_in
-from whoosh.qparser import MultifieldParser, OrGroup
-from whoosh.query import Every
+from whoosh import sorting
+from whoosh.fields import DATETIME, ID, KEYWORD, NGRAM, NUMERIC, Schema
+from whoosh.index import create_in, exists_in, open_dir
+from whoosh.qparser import MultifieldParser, OrGroup, QueryParser
+from whoosh.query import And, DateRange, Every, Not, Or, Term
+
+INDEX_PATH = "/data/index"
+INDEX_VERSION_FILE = "/data/index.version"
+# Bump when the schema or the way documents are built changes, the index is
+# then rebuilt from scratch at boot.
+INDEX_VERSION = 4
+INDEX_STAGING_PATH = "/data/index.staging"  # full rebuilds are written here
+INDEX_CHECKPOINT_FILE = "/data/index.checkpoint"  # files of committed batches
+REBUILD_BATCH_SIZE = 2000
+
+SEARCH_CACHE_SIZE = 256
+
+# The content of a file is indexed as child documents of its pages, split in
+# windows so long pages and transcriptions stay cheap to index and score.
+CHUNK_SIZE = 2000  # characters
+CHUNK_OVERLAP = 200
+CHUNK_HITS = 10  # chunk hits fetched per result in DEEP mode
+
+SEARCH_FIELDS = {
+    0: ["file_name", "keywords", "note"],  # FAST
+    1: ["file_name", "keywords", "summary", "note"],  # NORMAL
+    2: ["file_name", "keywords", "summary", "note"],  # DEEP, with content chunks
+    3: ["file_name", "keywords", "summary", "note"],  # HYBRID, fused with vectors
+}
+DEEP_MODE = 2
+HYBRID_MODE = 3
+MIN_DATE = datetime(1900, 1, 1)
+RRF_K = 60  # reciprocal rank fusion constant
 
 
 class FileManager:
     schema = None
     ix = None
+    writer_lock = Lock()
+    cache = LRUCache(max_size=SEARCH_CACHE_SIZE)
+    rebuild_lock = Lock()
+    rebuild_thread = None
+    rebuild_dirty = None  # files updated in the live index during a rebuild
+    rebuild_progress = {"state": "idle"}
+    # The live index was emptied for a rebuild, listings and facets come from
+    # the catalog until the staging index is swapped in
+    live_empty = False
 
     @classmethod
     def setup(cls):
         logging.info("FileManager >> Setting up...")
         cls.schema = Schema(
-            file=ID(stored=True),  # exact match only, fast and compact
+            file=ID(stored=True, unique=True),  # exact match only, fast and compact
             file_name=NGRAM(minsize=3, maxsize=7, stored=True),  # used in query
-            # mime=ID(stored=True),  # filter only
-            # date=DATETIME(stored=True, sortable=True),  # filter only
-            # subfolder=ID(stored=True),  # filter only
+            mime=ID(stored=True),  # filter only
+            date=DATETIME(stored=True, sortable=True),  # filter only
+            subfolder=ID(stored=True),  # filter only
+            projects=KEYWORD(commas=True),  # filter only
+            tags=KEYWORD(commas=True),  # filter only
             keywords=NGRAM(minsize=3, maxsize=5, stored=False),  # used in query
             summary=NGRAM(minsize=3, maxsize=5, stored=False),  # used in query
             note=NGRAM(minsize=3, maxsize=5, stored=False),  # used in query
+            # content chunks, child documents of the file
+            parent=ID(stored=True),  # file of the chunk
+            page=NUMERIC(stored=True),  # 1-based, only for paged documents
+            start=NUMERIC(stored=True),  # character offsets in the page or text
+            end=NUMERIC(stored=True),
             content=NGRAM(minsize=3, maxsize=5, stored=False),  # used in query
         )
 
-        if not os.path.exists("/data/index"):
-            os.makedirs("/data/index", exist_ok=True)
-        cls.ix = create_in("/data/index", cls.schema)
+        if not os.path.exists(INDEX_PATH):
+            os.makedirs(INDEX_PATH, exist_ok=True)
+
+        version = None
+        if os.path.exists(INDEX_VERSION_FILE):
+            with open(INDEX_VERSION_FILE, "r") as f:
+                version = f.read().strip()
+
+        if exists_in(INDEX_PATH) and version == str(INDEX_VERSION):
+            cls.ix = open_dir(INDEX_PATH)
+            logging.info(
+                f"FileManager >> Opened existing index with {cls.get_nbr_indexed_files()} documents."
+            )
+            if os.path.exists(INDEX_CHECKPOINT_FILE):
+                logging.info("FileManager >> Resuming interrupted index rebuild...")
+                cls.start_rebuild()
+        else:
+            logging.info("FileManager >> No up-to-date index found, rebuilding...")
+            cls.ix = create_in(INDEX_PATH, cls.schema)
+            cls.live_empty = True
+            cls.start_rebuild()
         logging.info("FileManager >> Setup complete.")
 
     @classmethod
-    def list_files(
+    def catalog_query(
         cls,
+        db,
         start_date: str = None,
         end_date: str = None,
         subfolders: List[str] = None,
@@ -55,8 +126,9 @@ class FileManager:
         exclude_projects: bool = False,
         exclude_tags: bool = False,
     ):
-        files = []
-
+        """
+        Build the catalog query of the files matching the filters.
+        """
         start_dt = (
             datetime.fromisoformat(start_date.replace("T", " ")) if start_date else None
         )
@@ -64,144 +136,426 @@ class FileManager:
             datetime.fromisoformat(end_date.replace("T", " ")) if end_date else None
         )
 
-        if projects or tags:
-            db = get_db()
+        query = db.query(File).filter(File.date.isnot(None))
+
+        # --- Handle date range ---
+        if start_dt:
+            query = query.filter(File.date >= start_dt)
+        if end_dt:
+            query = query.filter(File.date <= end_dt)
+
+        # --- Handle file type filter (with exclude) ---
+        if types:
+            if exclude_file_types:
+                query = query.filter(File.mime.notin_(types))
+            else:
+                query = query.filter(File.mime.in_(types))
+
+        # --- Handle subfolder filter (with exclude) ---
+        if subfolders:
+            if exclude_subfolders:
+                query = query.filter(
+                    or_(File.subfolder.is_(None), File.subfolder.notin_(subfolders))
+                )
+            else:
+                query = query.filter(File.subfolder.in_(subfolders))
 
-        try:
-            for dp, _, filenames in tqdm(
-                os.walk("/shared"), desc="Indexing files", unit="file"
-            ):
-                for filename in filenames:
-                    if filename == ".DS_Store":
-                        continue
-
-                    file = os.path.join(dp, filename)
-                    mime_file = guess_mime(file) or "application/octet-stream"
-
-                    try:
-                        date = datetime.fromisoformat(file.split("/")[2])
-                    except Exception:
-                        continue  # skip if date parsing fails
-
-                    subfolder = file.split("/")[3]
-
-                    # --- Handle file type filter (with exclude) ---
-                    if types:
-                        if exclude_file_types:
-                            if mime_file in types:
-                                continue
-                        else:
-                            if mime_file not in types:
-                                continue
-
-                    # --- Handle subfolder filter (with exclude) ---
-                    if subfolders:
-                        if exclude_subfolders:
-                            if subfolder in subfolders:
-                                continue
-                        else:
-                            if subfolder not in subfolders:
-                                continue
-
-                    # --- Handle date range ---
-                    if start_dt and date < start_dt:
-                        continue
-                    if end_dt and date > end_dt:
-                        continue
-
-                    file_projects, file_tags = [], []
-
-                    # --- Handle project filter (with exclude) ---
-                    if projects:
-                        file_projects = [
-                            p.project
-                            for p in db.query(ProjectFile)
-                            .filter(ProjectFile.file == file)
-                            .all()
-                        ]
-                        if exclude_projects:
-                            if any(p in file_projects for p in projects):
-                                continue
-                        else:
-                            if not any(p in file_projects for p in projects):
-                                continue
-
-                    # --- Handle tag filter (with exclude) ---
-                    if tags:
-                        file_tags = [
-                            t.tag
-                            for t in db.query(TagFile)
-                            .filter(TagFile.file == file)
-                            .all()
-                        ]
-                        if exclude_tags:
-                            if any(t in file_tags for t in tags):
-                                continue
-                        else:
-                            if not any(t in file_tags for t in tags):
-                                continue
+        # --- Handle project filter (with exclude) ---
+        if projects:
+            project_files = select(ProjectFile.file).where(
+                ProjectFile.project.in_(projects)
+            )
+            if exclude_projects:
+                query = query.filter(File.path.notin_(project_files))
+            else:
+                query = query.filter(File.path.in_(project_files))
+
+        # --- Handle tag filter (with exclude) ---
+        if tags:
+            tag_files = select(TagFile.file).where(TagFile.tag.in_(tags))
+            if exclude_tags:
+                query = query.filter(File.path.notin_(tag_files))
+            else:
+                query = query.filter(File.path.in_(tag_files))
 
-                    files.append(file)
+        return query
+
+    @classmethod
+    def list_files(cls, **filters):
+        """
+        List the files of the catalog matching the filters of catalog_query.
+        """
+        db = get_db()
+        try:
+            query = cls.catalog_query(db, **filters).with_entities(File.path)
+            files = [file for (file,) in query.all()]
 
         except Exception as e:
             logging.error(f"Error querying database: {str(e)}")
             raise RuntimeError(f"Error querying database: {str(e)}")
 
         finally:
-            if projects or tags:
-                db.close()
+            db.close()
 
         return files
 
     @classmethod
-    def index_files(cls, files, search_mode: int = 0):
+    def catalog_facets(cls, files: List[str] = None, **filters):
+        """
+        Count the facets of count_facets from the catalog, while the live index
+        is being rebuilt.
+        """
+        db = get_db()
+        try:
+            query = cls.catalog_query(db, **filters).with_entities(
+                File.path, File.mime, File.subfolder, File.date
+            )
+            allowed = set(files) if files is not None else None
+            rows = [row for row in query if allowed is None or row.path in allowed]
+            matched = set(row.path for row in rows)
+
+            counts = {name: {} for name in ["types", "subfolders", "projects", "tags"]}
+            days, months = {}, {}
+            for row in rows:
+                for name, value in [("types", row.mime), ("subfolders", row.subfolder)]:
+                    if value is not None:
+                        counts[name][value] = counts[name].get(value, 0) + 1
+                day, month = row.date.strftime("%Y-%m-%d"), row.date.strftime("%Y-%m")
+                days[day] = days.get(day, 0) + 1
+                months[month] = months.get(month, 0) + 1
+            for name, links in [
+                ("projects", db.query(ProjectFile.file, ProjectFile.project)),
+                ("tags", db.query(TagFile.file, TagFile.tag)),
+            ]:
+                for file, value in links:
+                    if file in matched:
+                        counts[name][value] = counts[name].get(value, 0) + 1
+        finally:
+            db.close()
+
+        facets = {
+            name: {
+                value: values[value]
+                for value in sorted(values, key=values.get, reverse=True)
+            }
+            for name, values in counts.items()
+        }
+        facets["days"] = dict(sorted(days.items()))
+        facets["months"] = dict(sorted(months.items()))
+        return facets
+
+    @classmethod
+    def notify_change(cls):
+        """
+        Invalidate cached search results after files, tags, projects or file
+        metadata changed.
+        """
+        cls.cache.invalidate()
+
+    @classmethod
+    def make_document(cls, file):
+        """
+        Build the index document of a file from its summary, note and the fields
+        used to filter searches.
+        """
+        db = get_db()
+        try:
+            summary = db.query(Summary).filter(Summary.file == file).first()
+            note = db.query(Note).filter(Note.file == file).first()
+            projects = [
+                project
+                for (project,) in db.query(ProjectFile.project).filter(
+                    ProjectFile.file == file
+                )
+            ]
+            tags = [
+                tag for (tag,) in db.query(TagFile.tag).filter(TagFile.file == file)
+            ]
+        finally:
+            db.close()
+
+        keywords = json.loads(summary.keywords) if summary and summary.keywords else []
+        date, subfolder = parse_path(file)
+        document = {
+            "file": file,
+            "file_name": os.path.basename(file),
+            "mime": guess_mime(file),
+            "projects": ",".join(projects),
+            "tags": ",".join(tags),
+            "keywords": ",".join(keywords),
+            "summary": summary.summary if summary else "",
+            "note": note.note if note else "",
+        }
+        if date:
+            document["date"] = date
+        if subfolder:
+            document["subfolder"] = subfolder
+        return document
+
+    @classmethod
+    def make_documents(cls, file):
+        """
+        Build the index document of a file followed by the ones of its content
+        chunks.
+        """
+        try:
+            pages = extract_pages(file)
+            if pages is None:
+                content = extract_text(file)
+                pages = [content] if content else []
+                paged = False
+            else:
+                paged = True
+        except Exception as e:
+            # Still indexed by name and metadata, like unreadable files
+            logging.error(f"Error extracting the content of {file}: {str(e)}")
+            pages = []
+            paged = False
+
+        documents = [cls.make_document(file)]
+        for number, text in enumerate(pages, start=1):
+            for start, end in chunk_offsets(text):
+                chunk = {
+                    "parent": file,
+                    "start": start,
+                    "end": end,
+                    "content": text[start:end],
+                }
+                if paged:
+                    chunk["page"] = number
+                documents.append(chunk)
+        return documents
+
+    @classmethod
+    def delete_documents(cls, writer, file):
+        """
+        Delete the index document of a file and the ones of its content chunks.
+        """
+        writer.delete_by_term("file", file)
+        writer.delete_by_term("parent", file)
+
+    @classmethod
+    def index_file(cls, file):
+        """
+        Add or refresh the index document of a single file.
+        """
+        try:
+            cls.index_files([file])
+        except Exception as e:
+            logging.error(f"Error updating index for file {file}: {str(e)}")
+
+    @classmethod
+    def unindex_file(cls, file):
+        """
+        Remove a file from the index.
+        """
+        cls.unindex_files([file])
+
+    @classmethod
+    def unindex_files(cls, files):
+        """
+        Remove files from the index in one commit.
+        """
+        try:
+            if not cls.ix:
+                raise Exception("Index not initialized. Call setup() first.")
+            with cls.writer_lock:
+                writer = cls.ix.writer()
+                for file in files:
+                    cls.delete_documents(writer, file)
+                writer.commit()
+                if cls.rebuild_dirty is not None:
+                    cls.rebuild_dirty.update(files)
+            SuggestManager.remove_files(files)
+        except Exception as e:
+            logging.error(f"Error removing {len(files)} files from index: {str(e)}")
+        cls.notify_change()
+
+    @classmethod
+    def index_files(cls, files=None):
+        """
+        Update the index documents of the given files.
+        Without files, the whole index is rebuilt from /shared.
+        """
         if not cls.ix:
             raise Exception("Index not initialized. Call setup() first.")
-        writer = cls.ix.writer()
-        writer.mergetype = writing.CLEAR  # clear existing index
-        count = 0
-
-        for file in files:
-            filename = os.path.basename(file)
-            dp = os.path.dirname(file)
-
-            file = os.path.join(dp, filename)
-            mime_file = guess_mime(file)
-            mime_file = mime_file or "application/octet-stream"
-
-            content = ""
-            summary = ""
-            keywords = []
-
-            summary_keywords = SummarizeManager.get(file)
-            if summary_keywords is not None:
-                # Always keywords
-                keywords = summary_keywords.get("keywords", [])
-
-                if search_mode != 0:
-                    # Summary only if search mode is NORMAL or DEEP
-                    summary = summary_keywords.get("summary", "")
-
-            if search_mode == 2:
-                # Read content only if search mode is DEEP
-                content = read_content(file, force_read=True)
-
-            note = NoteManager.get(file)
-            note = note.get("note", "") if note else ""
-            writer.add_document(
-                file=file,
-                file_name=filename,
-                # mime=mime_file or "application/octet-stream",
-                # date=date,
-                # subfolder=subfolder,
-                keywords=",".join(keywords) if keywords else "",
-                summary=summary,
-                note=note,
-                content=content,
-            )
-            count += 1
+        if files is None:
+            return cls.rebuild_index()
+
+        with cls.writer_lock:
+            writer = cls.ix.writer()
+            for file in files:
+                cls.delete_documents(writer, file)
+                try:
+                    if os.path.exists(file):
+                        documents = cls.make_documents(file)
+                        for document in documents:
+                            writer.add_document(**document)
+                        SuggestManager.update_file(
+                            file, documents[0]["keywords"].split(",")
+                        )
+                    else:
+                        SuggestManager.remove_files([file])
+                except Exception as e:
+                    logging.error(f"Error indexing file {file}: {str(e)}")
+            writer.commit()
+            if cls.rebuild_dirty is not None:
+                cls.rebuild_dirty.update(files)
+        cls.notify_change()
+
+    @classmethod
+    def start_rebuild(cls):
+        """
+        Rebuild the whole index in the background.
+        """
+        if cls.rebuild_lock.locked():
+            raise RuntimeError("An index rebuild is already running.")
+        cls.rebuild_thread = Thread(target=cls.rebuild_index)
+        cls.rebuild_thread.daemon = True
+        cls.rebuild_thread.start()
+
+    @classmethod
+    def rebuild_index(cls):
+        """
+        Rebuild the whole index into a staging index, then swap it with the live
+        one, which keeps serving searches meanwhile.
+        Documents are built by a pool of index_workers processes and written by
+        Whoosh's multi-process writer, batch by batch. Committed batches are
+        checkpointed so an interrupted rebuild resumes where it stopped.
+        """
+        if not cls.rebuild_lock.acquire(blocking=False):
+            raise RuntimeError("An index rebuild is already running.")
+        try:
+            cls.rebuild_dirty = set()
+            cls.rebuild_progress = {
+                "state": "running",
+                "started": datetime.now().isoformat(),
+            }
+            cls.run_rebuild()
+        except Exception as e:
+            cls.rebuild_progress["state"] = "failed"
+            cls.rebuild_progress["error"] = str(e)
+            logging.error(f"FileManager >> Error rebuilding index: {str(e)}")
+            raise e
+        finally:
+            cls.rebuild_dirty = None
+            cls.rebuild_lock.release()
 
-        writer.commit()
+    @classmethod
+    def run_rebuild(cls):
+        files = sorted(walk_files())
+        done = cls.open_staging()
+        staging = open_dir(INDEX_STAGING_PATH)
+
+        # Files removed since the interrupted run
+        stale = done - set(files)
+        if stale:
+            writer = staging.writer()
+            for file in stale:
+                cls.delete_documents(writer, file)
+            writer.commit()
+        todo = [file for file in files if file not in done]
+
+        workers = max(1, get_setting("index_workers"))
+        progress = cls.rebuild_progress
+        progress.update(
+            {
+                "total": len(files),
+                "resumed": len(files) - len(todo),
+                "done": len(files) - len(todo),
+                "workers": workers,
+            }
+        )
+        logging.info(
+            f"FileManager >> Rebuilding index of {len(files)} files with {workers} workers, {progress['resumed']} already done."
+        )
+
+        start = time.time()
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as pool, tqdm(
+            total=len(files), initial=progress["done"], desc="Indexing files"
+        ) as bar:
+            for i in range(0, len(todo), REBUILD_BATCH_SIZE):
+                batch = todo[i : i + REBUILD_BATCH_SIZE]
+                if workers > 1:
+                    writer = staging.writer(procs=workers, multisegment=True)
+                else:
+                    writer = staging.writer()
+                for documents in pool.map(build_documents, batch, chunksize=16):
+                    for document in documents:
+                        writer.add_document(**document)
+                    if documents:
+                        SuggestManager.update_file(
+                            documents[0]["file"], documents[0]["keywords"].split(",")
+                        )
+                    bar.update(1)
+                writer.commit()
+                with open(INDEX_CHECKPOINT_FILE, "a") as f:
+                    f.writelines(f"{json.dumps(file)}\n" for file in batch)
+
+                elapsed = time.time() - start
+                progress["done"] += len(batch)
+                progress["files_per_second"] = round((i + len(batch)) / elapsed, 2)
+                progress["eta_seconds"] = round(
+                    (len(todo) - i - len(batch)) / progress["files_per_second"]
+                )
+
+        progress["state"] = "merging"
+        staging.optimize()
+        cls.swap_staging()
+
+        progress["state"] = "completed"
+        progress["completed"] = datetime.now().isoformat()
+        logging.info(
+            f"FileManager >> Rebuilt index with {cls.get_nbr_indexed_files()} files in {round(time.time() - start)}s."
+        )
+
+    @classmethod
+    def open_staging(cls):
+        """
+        Prepare the staging index, returns the files already indexed in it by an
+        interrupted rebuild of the same index version.
+        """
+        done = set()
+        if os.path.exists(INDEX_CHECKPOINT_FILE) and exists_in(INDEX_STAGING_PATH):
+            with open(INDEX_CHECKPOINT_FILE, "r") as f:
+                lines = f.read().splitlines()
+            if lines and lines[0] == json.dumps({"version": INDEX_VERSION}):
+                done = set(json.loads(line) for line in lines[1:])
+                return done
+
+        shutil.rmtree(INDEX_STAGING_PATH, ignore_errors=True)
+        os.makedirs(INDEX_STAGING_PATH)
+        create_in(INDEX_STAGING_PATH, cls.schema)
+        with open(INDEX_CHECKPOINT_FILE, "w") as f:
+            f.write(json.dumps({"version": INDEX_VERSION}) + "\n")
+        return done
+
+    @classmethod
+    def swap_staging(cls):
+        """
+        Replace the live index with the staging one, then apply the updates the
+        live index received during the rebuild.
+        """
+        old_path = f"{INDEX_PATH}.old"
+        with cls.writer_lock:
+            shutil.rmtree(old_path, ignore_errors=True)
+            if os.path.exists(INDEX_PATH):
+                os.rename(INDEX_PATH, old_path)
+            os.rename(INDEX_STAGING_PATH, INDEX_PATH)
+            with open(INDEX_VERSION_FILE, "w") as f:
+                f.write(str(INDEX_VERSION))
+            os.remove(INDEX_CHECKPOINT_FILE)
+            cls.ix = open_dir(INDEX_PATH)
+            cls.live_empty = False
+            dirty = cls.rebuild_dirty
+            cls.rebuild_dirty = None
+        shutil.rmtree(old_path, ignore_errors=True)
+
+        if dirty:
+            cls.index_files(list(dirty))
+        cls.notify_change()
 
     @classmethod
     def search_files(
@@ -219,7 +573,107 @@ class FileManager:
         exclude_projects: bool = False,
         exclude_tags: bool = False,
     ):
-        files = cls.list_files(
+        """
+        Search files, serving repeated identical queries from the result cache.
+        """
+        key = (
+            " ".join(text.split()) if text else None,
+            start_date,
+            end_date,
+            tuple(sorted(subfolders)) if subfolders else None,
+            tuple(sorted(types)) if types else None,
+            tuple(sorted(projects)) if projects else None,
+            tuple(sorted(tags)) if tags else None,
+            search_mode if text else None,
+            exclude_file_types and bool(types),
+            exclude_subfolders and bool(subfolders),
+            exclude_projects and bool(projects),
+            exclude_tags and bool(tags),
+        )
+        generation = cls.cache.generation
+        result = cls.cache.get(key)
+        if result is None:
+            result, complete = cls.run_search(
+                text,
+                start_date,
+                end_date,
+                subfolders,
+                types,
+                projects,
+                tags,
+                search_mode=search_mode,
+                exclude_file_types=exclude_file_types,
+                exclude_subfolders=exclude_subfolders,
+                exclude_projects=exclude_projects,
+                exclude_tags=exclude_tags,
+            )
+            # A hybrid search degraded to full-text only is not cached
+            if complete:
+                cls.cache.set(key, result, generation)
+        return list(result)
+
+    @classmethod
+    def make_filter(
+        cls,
+        start_date: str = None,
+        end_date: str = None,
+        subfolders: List[str] = None,
+        types: List[str] = None,
+        projects: List[str] = None,
+        tags: List[str] = None,
+        exclude_file_types: bool = False,
+        exclude_subfolders: bool = False,
+        exclude_projects: bool = False,
+        exclude_tags: bool = False,
+    ):
+        """
+        Build the index query matching the same files as list_files.
+        """
+        start_dt = (
+            datetime.fromisoformat(start_date.replace("T", " ")) if start_date else None
+        )
+        end_dt = (
+            datetime.fromisoformat(end_date.replace("T", " ")) if end_date else None
+        )
+
+        # Files outside of a date directory have no date and are never listed
+        filters = [DateRange("date", start_dt or MIN_DATE, end_dt)]
+        for field, values, exclude in [
+            ("mime", types, exclude_file_types),
+            ("subfolder", subfolders, exclude_subfolders),
+            ("projects", projects, exclude_projects),
+            ("tags", tags, exclude_tags),
+        ]:
+            if values:
+                query = Or([Term(field, value) for value in values])
+                filters.append(Not(query) if exclude else query)
+        return And(filters)
+
+    @classmethod
+    def run_search(
+        cls,
+        text: str = None,
+        start_date: str = None,
+        end_date: str = None,
+        subfolders: List[str] = None,
+        types: List[list] = None,
+        projects: List[str] = None,
+        tags: List[str] = None,
+        search_mode: int = 0,
+        exclude_file_types: bool = False,
+        exclude_subfolders: bool = False,
+        exclude_projects: bool = False,
+        exclude_tags: bool = False,
+    ):
+        """
+        Search the index, filters are applied inside the index query.
+        Returns the matched files and False if the semantic part of a hybrid
+        search failed.
+        """
+        if not cls.ix:
+            raise RuntimeError("Index not initialised")
+
+        filter_query = cls.make_filter(
             start_date=start_date,
             end_date=end_date,
             subfolders=subfolders,
@@ -231,28 +685,241 @@ class FileManager:
             exclude_projects=exclude_projects,
             exclude_tags=exclude_tags,
         )
-        if text:
+        if (not text or not text.strip()) and cls.live_empty:
+            files = cls.list_files(
+                start_date=start_date,
+                end_date=end_date,
+                subfolders=subfolders,
+                types=types,
+                projects=projects,
+                tags=tags,
+                exclude_file_types=exclude_file_types,
+                exclude_subfolders=exclude_subfolders,
+                exclude_projects=exclude_projects,
+                exclude_tags=exclude_tags,
+            )
+            return files, True
+
+        with cls.ix.searcher() as searcher:
+            if not text or not text.strip():
+                files = [
+                    searcher.stored_fields(docnum)["file"]
+                    for docnum in searcher.docs_for_query(filter_query)
+                ]
+                return files, True
+
             text = text.strip()
-            if not cls.ix:
-                raise RuntimeError("Index not initialised")
-            cls.index_files(files, search_mode=search_mode)
-
-            with cls.ix.searcher() as searcher:
-                parser = MultifieldParser(
-                    ["file_name", "keywords", "summary", "note"],
-                    schema=cls.schema,
-                    group=OrGroup,
+            parser = MultifieldParser(
+                SEARCH_FIELDS.get(search_mode, SEARCH_FIELDS[1]),
+                schema=cls.schema,
+                group=OrGroup,
+            )
+            limit = get_setting("search_limit")
+            hits = searcher.search(parser.parse(text), filter=filter_query, limit=limit)
+            matches = [hit["file"] for hit in hits]
+
+            # Files passing the filters, to restrict the chunk and vector searches
+            allowed = None
+            if search_mode in (DEEP_MODE, HYBRID_MODE) and (
+                start_date or end_date or subfolders or types or projects or tags
+            ):
+                allowed = set(
+                    searcher.stored_fields(docnum)["file"]
+                    for docnum in searcher.docs_for_query(filter_query)
                 )
 
-                if text:
-                    query = parser.parse(text)
-                else:
-                    query = Every()
+            if search_mode == DEEP_MODE:
+                matches = cls.match_chunks(
+                    searcher, text, hits, filter_query, allowed, limit
+                )
+        if search_mode == HYBRID_MODE:
+            return cls.fuse(matches, text, allowed, limit)
+        return matches, True
 
-                results = searcher.search(query, limit=get_setting("search_limit"))
-                return [r.get("file") for r in results]
-        else:
-            return files
+    @classmethod
+    def match_chunks(cls, searcher, text, hits, filter_query, allowed, limit):
+        """
+        Rank files by the score of their fields plus the one of their best
+        content chunk.
+        With allowed, only the chunks of those files are searched.
+        """
+        scores = {hit["file"]: hit.score for hit in hits}
+        if allowed is not None and not allowed:
+            return []
+
+        best = {}
+        for hit in searcher.search(
+            QueryParser("content", cls.schema, group=OrGroup).parse(text),
+            filter=(
+                Or([Term("parent", file) for file in allowed])
+                if allowed is not None
+                else None
+            ),
+            limit=limit * CHUNK_HITS,
+        ):
+            best.setdefault(hit["parent"], hit.score)
+
+        # Without filters, still drop the chunks of files the default filter
+        # excludes, chunks carry no filter field
+        candidates = set(best) - set(scores) if allowed is None else set()
+        if candidates:
+            kept = set(
+                searcher.stored_fields(docnum)["file"]
+                for docnum in searcher.docs_for_query(
+                    And(
+                        [
+                            Or([Term("file", file) for file in candidates]),
+                            filter_query,
+                        ]
+                    )
+                )
+            )
+            best = {
+                file: score
+                for file, score in best.items()
+                if file in scores or file in kept
+            }
+
+        for file, score in best.items():
+            scores[file] = scores.get(file, 0) + score
+        return sorted(scores, key=scores.get, reverse=True)[:limit]
+
+    @classmethod
+    def match_pages(cls, text: str, files: List[str], nbr_pages: int = 3):
+        """
+        Find the best matching content chunks of the given files, with their
+        page and character offsets.
+        """
+        if not cls.ix:
+            raise RuntimeError("Index not initialised")
+        if not text or not text.strip() or not files:
+            return {}
+
+        key = ("pages", " ".join(text.split()), hash(frozenset(files)), nbr_pages)
+        generation = cls.cache.generation
+        pages = cls.cache.get(key)
+        if pages is not None:
+            return pages
+
+        pages = {}
+        with cls.ix.searcher() as searcher:
+            for hit in searcher.search(
+                QueryParser("content", cls.schema, group=OrGroup).parse(text.strip()),
+                filter=Or([Term("parent", file) for file in files]),
+                limit=None,
+            ):
+                matches = pages.setdefault(hit["parent"], [])
+                if len(matches) < nbr_pages:
+                    matches.append(
+                        {
+                            "page": hit.get("page"),
+                            "start": hit["start"],
+                            "end": hit["end"],
+                            "score": round(hit.score, 3),
+                        }
+                    )
+
+        cls.cache.set(key, pages, generation)
+        return pages
+
+    @classmethod
+    def fuse(cls, matches, text, allowed, limit):
+        """
+        Merge the full-text ranking with the semantic one using reciprocal rank
+        fusion.
+        Returns the fused files, or the full-text ones and False if the semantic
+        search failed.
+        """
+        try:
+            semantic = [file for file, _ in VectorManager.search(text, limit, allowed)]
+        except Exception as e:
+            logging.error(f"Semantic search failed, using full-text only: {str(e)}")
+            return matches, False
+
+        scores = {}
+        for ranking in [matches, semantic]:
+            for rank, file in enumerate(ranking):
+                scores[file] = scores.get(file, 0) + 1 / (RRF_K + rank + 1)
+        return sorted(scores, key=scores.get, reverse=True)[:limit], True
+
+    @classmethod
+    def count_facets(cls, files: List[str] = None, **filters):
+        """
+        Count the matched files by type, subfolder, project, tag, day and month
+        in one pass over the index.
+        With files (the result of a text search), only those are counted,
+        otherwise every file matching the filters.
+        """
+        if files is not None and not files:
+            return {
+                name: {}
+                for name in [
+                    "types",
+                    "subfolders",
+                    "projects",
+                    "tags",
+                    "days",
+                    "months",
+                ]
+            }
+
+        key = (
+            "facets",
+            hash(frozenset(files)) if files is not None else None,
+            tuple(
+                (name, tuple(sorted(value)) if isinstance(value, list) else value)
+                for name, value in sorted(filters.items())
+            ),
+        )
+        generation = cls.cache.generation
+        facets = cls.cache.get(key)
+        if facets is not None:
+            return facets
+
+        if cls.live_empty:
+            facets = cls.catalog_facets(files, **filters)
+            cls.cache.set(key, facets, generation)
+            return facets
+
+        if not cls.ix:
+            raise RuntimeError("Index not initialised")
+        query = cls.make_filter(**filters)
+        if files is not None:
+            query = And([Or([Term("file", file) for file in files]), query])
+
+        groups = sorting.Facets()
+        groups.add_field("mime")
+        groups.add_field("subfolder")
+        groups.add_field("projects", allow_overlap=True)
+        groups.add_field("tags", allow_overlap=True)
+        groups.add_field("date")
+
+        facets = {}
+        with cls.ix.searcher() as searcher:
+            results = searcher.search(
+                query, groupedby=groups, maptype=sorting.Count, limit=1
+            )
+            for name, field in [
+                ("types", "mime"),
+                ("subfolders", "subfolder"),
+                ("projects", "projects"),
+                ("tags", "tags"),
+            ]:
+                counts = results.groups(field)
+                facets[name] = {
+                    value: counts[value]
+                    for value in sorted(counts, key=counts.get, reverse=True)
+                    if value is not None
+                }
+
+            facets["days"], facets["months"] = {}, {}
+            for date, count in sorted(results.groups("date").items()):
+                day, month = date.strftime("%Y-%m-%d"), date.strftime("%Y-%m")
+                facets["days"][day] = facets["days"].get(day, 0) + count
+                facets["months"][month] = facets["months"].get(month, 0) + count
+
+        cls.cache.set(key, facets, generation)
+        return facets
 
     @classmethod
     def get_indexed_files(cls):
@@ -262,7 +929,7 @@ class FileManager:
         with cls.ix.searcher() as searcher:
             return [
                 searcher.stored_fields(docnum)
-                for docnum in range(searcher.doc_count_all())
+                for docnum in searcher.docs_for_query(Every("file"))
             ]
 
     @classmethod
@@ -271,4 +938,33 @@ class FileManager:
             raise Exception("Index not initialized.")
 
         with cls.ix.searcher() as searcher:
-            return searcher.doc_count_all()
+            return sum(1 for _ in searcher.docs_for_query(Every("file")))
+
+
+def chunk_offsets(text: str):
+    """
+    Split a text in overlapping windows of CHUNK_SIZE characters, returns their
+    (start, end) offsets.
+    """
+    offsets = []
+    if not text.strip():
+        return offsets
+    start = 0
+    while True:
+        end = min(start + CHUNK_SIZE, len(text))
+        offsets.append((start, end))
+        if end == len(text):
+            return offsets
+        start += CHUNK_SIZE - CHUNK_OVERLAP
+
+
+def build_documents(file):
+    """
+    Build the index documents of a file, run by the rebuild worker processes.
+    """
+    try:
+        if os.path.exists(file):
+            return FileManager.make_documents(file)
+    except Exception as e:
+        logging.error(f"Error indexing file {file}: {str(e)}")
+    return []
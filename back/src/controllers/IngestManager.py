@@ -0,0 +1,263 @@
+import logging
+import os
+import time
+import traceback
+from datetime import datetime
+from threading import Lock, Thread
+
+from controllers.CatalogManager import CatalogManager
+from controllers.FileManager import FileManager
+from controllers.OCRManager import OCRManager
+from controllers.SchedulerManager import PRIORITY_BACKFILL, PRIORITY_UPLOAD
+from controllers.SimilarityManager import SimilarityManager
+from controllers.SummarizeManager import SummarizeManager
+from controllers.TranscriptionManager import TranscriptionManager
+from controllers.VectorManager import VectorManager
+from db import OCR, Summary, Transcription, get_db
+from utils import TEMPORARY_SUFFIXES, guess_mime
+from views.settings import get_setting
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+SHARED_PATH = "/shared"
+WATCH_BATCH_SIZE = 1000
+
+
+def is_watched(file: str):
+    """
+    Tell if a path is a regular file of /shared, skipping temporary files of
+    copy tools (rsync, browsers, editors).
+    """
+    name = os.path.basename(file)
+    return (
+        file.startswith(f"{SHARED_PATH}/")
+        and name != ".DS_Store"
+        and not name.startswith(".")
+        and not name.endswith(TEMPORARY_SUFFIXES)
+    )
+
+
+class SharedEventHandler(FileSystemEventHandler):
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        IngestManager.touch(event.src_path)
+        if getattr(event, "dest_path", None):
+            IngestManager.touch(event.dest_path)
+
+
+class IngestManager:
+    """
+    Pick up files added, changed or removed in /shared outside of the API,
+    from inotify events with a periodic full scan as fallback.
+    """
+
+    pending = {}  # file -> time of its last event
+    lock = Lock()
+
+    def start_thread():
+        IngestManager.scan(process=CatalogManager.count() > 0)
+
+        observer = Observer()
+        try:
+            observer.schedule(SharedEventHandler(), SHARED_PATH, recursive=True)
+            observer.daemon = True
+            observer.start()
+            logging.info(f"INGEST >> Watching {SHARED_PATH} for changes.")
+        except Exception as e:
+            logging.error(
+                f"INGEST >> Can't watch {SHARED_PATH}, relying on periodic scans: {str(e)}"
+            )
+
+        IngestManager.loop()
+
+    @classmethod
+    def loop(cls):
+        last_scan = time.time()
+        while True:
+            time.sleep(1)
+            try:
+                cls.flush()
+                if time.time() - last_scan >= get_setting("catalog_reconcile_interval"):
+                    cls.scan()
+                    last_scan = time.time()
+            except Exception as e:
+                logging.error(f"INGEST >> Error ingesting files: {str(e)}")
+                logging.error(traceback.format_exc())
+
+    @classmethod
+    def touch(cls, file):
+        """
+        Record an event on a file, it is ingested once it stayed quiet for the
+        debounce delay.
+        """
+        if is_watched(file):
+            with cls.lock:
+                cls.pending[file] = time.time()
+
+    @classmethod
+    def flush(cls):
+        """
+        Ingest the pending files that stayed quiet for the debounce delay, by
+        batches.
+        """
+        limit = time.time() - get_setting("watcher_debounce")
+        with cls.lock:
+            files = [file for file, last in cls.pending.items() if last <= limit]
+            for file in files:
+                del cls.pending[file]
+
+        for start in range(0, len(files), WATCH_BATCH_SIZE):
+            cls.ingest(files[start : start + WATCH_BATCH_SIZE])
+
+    @classmethod
+    def ingest(cls, files):
+        """
+        Sync the catalog, the index and the processing queues with the current
+        state of the given files.
+        """
+        cataloged = CatalogManager.get_stats(files)
+        added, updated, removed = [], [], []
+        for file in files:
+            if not os.path.isfile(file):
+                if file in cataloged:
+                    removed.append(file)
+                continue
+            stat = os.stat(file)
+            if file not in cataloged:
+                added.append(file)
+            elif cataloged[file] != (
+                stat.st_size,
+                datetime.fromtimestamp(int(stat.st_mtime)),
+            ):
+                updated.append(file)
+
+        CatalogManager.add_files(added + updated)
+        CatalogManager.delete_files(removed)
+        cls.apply({"added": added, "updated": updated, "removed": removed})
+
+    @classmethod
+    def scan(cls, start_date: str = None, end_date: str = None, process=True):
+        """
+        Reconcile the catalog with /shared and ingest the differences.
+        Without process, new files are only cataloged and indexed.
+        """
+        changes = CatalogManager.reconcile(start_date, end_date)
+        cls.apply(changes, process=process)
+        return changes
+
+    @classmethod
+    def apply(cls, changes, process=True):
+        """
+        Update the index and the vectors from catalog changes and queue the
+        processing of the new files.
+        """
+        added, updated, removed = (
+            changes["added"],
+            changes["updated"],
+            changes["removed"],
+        )
+        if not added and not updated and not removed:
+            return
+        logging.info(
+            f"INGEST >> {len(added)} added, {len(updated)} updated, {len(removed)} removed."
+        )
+
+        if added or updated:
+            FileManager.index_files(added + updated)
+            for file in added + updated:
+                SimilarityManager.index_file(file)
+        if removed:
+            FileManager.unindex_files(removed)
+            for file in removed:
+                VectorManager.remove_file(file)
+                SimilarityManager.remove_file(file)
+
+        if process:
+            for file in added:
+                try:
+                    cls.enqueue_processing(file, priority=PRIORITY_BACKFILL)
+                except Exception as e:
+                    logging.error(f"INGEST >> Error queuing file {file}: {str(e)}")
+
+    @classmethod
+    def enqueue_processing(cls, file, done=(), priority=PRIORITY_UPLOAD):
+        """
+        Queue the OCR, transcription and summary of a new file, depending on
+        its type and the auto processing settings.
+        Steps in done (results copied from a duplicate) are skipped.
+        """
+        auto_summary = get_setting("enable_auto_summary") and "summary" not in done
+        mime = guess_mime(file)
+
+        if mime and mime.startswith("image/") and get_setting("enable_auto_ocr"):
+            if "ocr" not in done:
+                OCRManager.add_file_to_queue(file, priority)
+            if auto_summary:
+                SummarizeManager.add_file_to_queue(file, priority)
+
+        elif (
+            mime and (mime.startswith("audio/") or mime.startswith("video/"))
+        ) and get_setting("enable_auto_transcription"):
+            if "transcription" not in done:
+                TranscriptionManager.add_file_to_queue(file, priority)
+            if auto_summary:
+                SummarizeManager.add_file_to_queue(file, priority)
+
+        elif auto_summary:
+            SummarizeManager.add_file_to_queue(file, priority)
+
+    @classmethod
+    def copy_processing(cls, source, file):
+        """
+        Copy the OCR, transcription, summary and vectors of a file to another
+        one with the same content, returns the copied steps.
+        """
+        done = []
+        db = get_db()
+        try:
+            ocr = db.query(OCR).filter(OCR.file == source).first()
+            if ocr:
+                db.merge(
+                    OCR(file=file, date=datetime.now(), ocr=ocr.ocr, blip=ocr.blip)
+                )
+                done.append("ocr")
+            transcription = (
+                db.query(Transcription).filter(Transcription.file == source).first()
+            )
+            if transcription:
+                db.merge(
+                    Transcription(
+                        file=file,
+                        date=datetime.now(),
+                        transcription=transcription.transcription,
+                    )
+                )
+                done.append("transcription")
+            summary = db.query(Summary).filter(Summary.file == source).first()
+            if summary:
+                db.merge(
+                    Summary(
+                        file=file,
+                        date=datetime.now(),
+                        summary=summary.summary,
+                        keywords=summary.keywords,
+                    )
+                )
+                done.append("summary")
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logging.error(
+                f"INGEST >> Error copying results of {source} to {file}: {str(e)}"
+            )
+            logging.error(traceback.format_exc())
+            raise e
+        finally:
+            db.close()
+
+        if "summary" in done and not VectorManager.copy_file(source, file):
+            Thread(target=VectorManager.index_file, args=(file,), daemon=True).start()
+        if done:
+            logging.info(f"INGEST >> Copied {', '.join(done)} of {source} to {file}.")
+        return done
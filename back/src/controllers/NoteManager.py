@@ -1,5 +1,6 @@
 from datetime import datetime
 
+from controllers.FileManager import FileManager
 from db import Note, get_db
 
 
@@ -45,6 +46,7 @@ class NoteManager:
             raise e
         finally:
             db.close()
+        FileManager.index_file(file)
 
     @classmethod
     def delete(cls, file):
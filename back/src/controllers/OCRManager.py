@@ -1,121 +1,154 @@
+import json
 import logging
-import queue
-import subprocess
-import time
 import traceback
 from datetime import datetime
 
+from controllers.FileManager import FileManager
+from controllers.SchedulerManager import (
+    PRIORITY_NAMES,
+    PRIORITY_UPLOAD,
+    SchedulerManager,
+)
+from controllers.SimilarityManager import SimilarityManager
 from db import OCR, OCRTask, TaskStateEnum, get_db
 from sqlalchemy import and_
+from tools.worker import ModelWorker
 
 
 class OCRManager:
-    in_progess_file = None
-    queue = queue.Queue()
+    workers = {}  # pool slot -> (BLIP worker, OCR worker)
 
-    def start_thread():
+    @classmethod
+    def get_workers(cls, slot):
         """
-        Start the OCR processing thread.
-        This method should be implemented to handle the OCR processing logic.
+        Get the BLIP and OCR workers of a pool slot, each slot has its own.
         """
-        db = get_db()
-        pending = (
-            db.query(OCRTask)
-            .filter(
-                OCRTask.state.in_([TaskStateEnum.PENDING, TaskStateEnum.IN_PROGRESS])
+        if slot not in cls.workers:
+            cls.workers[slot] = (
+                ModelWorker(f"BLIP {slot}", ["python3", "/app/ocr_blip.py"]),
+                # ["python3", "/app/ocr_tesseract.py"]
+                ModelWorker(f"OCR {slot}", ["python3", "/app/ocr_paddle.py"]),
             )
-            .all()
-        )
-        for task in pending:
-            task.state = TaskStateEnum.PENDING
-            OCRManager.queue.put(task.file)
-        db.commit()
-        db.close()
-        OCRManager.loop()
+        return cls.workers[slot]
+
+    @classmethod
+    def stop_workers(cls, slot):
+        for worker in cls.workers.get(slot, ()):
+            worker.stop()
+
+    @classmethod
+    def cancel(cls, slot):
+        """
+        Stop the job running on the workers of a pool slot.
+        """
+        for worker in cls.workers.get(slot, ()):
+            worker.terminate()
 
     @classmethod
-    def loop(cls):
-        time.sleep(10)
-        while True:
-            file = cls.queue.get()
-            cls.in_progess_file = file
-
-            db = get_db()
-            try:
-                task = (
-                    db.query(OCRTask)
-                    .filter(
-                        and_(
-                            OCRTask.file == file, OCRTask.state == TaskStateEnum.PENDING
-                        )
+    def process(cls, file, slot):
+        """
+        Run the OCR & BLIP task of a file claimed by the scheduler.
+        """
+        db = get_db()
+        try:
+            task = (
+                db.query(OCRTask)
+                .filter(
+                    and_(
+                        OCRTask.file == file, OCRTask.state == TaskStateEnum.IN_PROGRESS
                     )
-                    .first()
                 )
-                task.state = TaskStateEnum.IN_PROGRESS
-                db.commit()
+                .first()
+            )
+            if task is None:
+                logging.info(f"OCR >> Cancelled before processing file: {file}")
+                return
 
-                logging.info(f"OCR >> Processing BLIP for file: {file}")
-                blip_proc = subprocess.run(
-                    ["python3", "/app/ocr_blip.py", file],
-                    capture_output=True,
-                    text=True,
-                )
-                if blip_proc.returncode != 0:
-                    raise RuntimeError(
-                        f"BLIP subprocess failed with code {blip_proc.returncode}: {blip_proc.stderr.strip()}"
+            blip_worker, ocr_worker = cls.get_workers(slot)
+            logging.info(f"OCR >> Processing BLIP for file: {file}")
+            blip_result = blip_worker.run(file=file).strip().capitalize()
+            logging.info(f"OCR >> BLIP Result for file {file}: {blip_result}")
+
+            logging.info(f"OCR >> Processing for file: {file}")
+            result = json.dumps(ocr_worker.run(file=file) or [])
+            logging.info(f"OCR >> Result for file {file}: {result}")
+
+            # Unless it was cancelled meanwhile
+            completed = (
+                db.query(OCRTask)
+                .filter(
+                    and_(
+                        OCRTask.file == file,
+                        OCRTask.added == task.added,
+                        OCRTask.state == TaskStateEnum.IN_PROGRESS,
                     )
-                blip_result = blip_proc.stdout.strip().capitalize()
-                logging.info(f"OCR >> BLIP Result for file {file}: {blip_result}")
-
-                logging.info(f"OCR >> Processing for file: {file}")
-                proc = subprocess.run(
-                    # ["python3", "/app/ocr_tesseract.py", file],
-                    ["python3", "/app/ocr_paddle.py", file],
-                    capture_output=True,
-                    text=True,
                 )
-                if proc.returncode != 0:
-                    raise RuntimeError(
-                        f"Subprocess failed with code {proc.returncode}: {proc.stderr.strip()}"
-                    )
-                result = proc.stdout.strip()
-                result = result[result.find("[") : result.rfind("]") + 1]
-                logging.info(f"OCR >> Result for file {file}: {result}")
-
-                task.state = TaskStateEnum.COMPLETED
-                task.completed = datetime.now()
-                task.result = f"{blip_result} - {result}"
+                .update(
+                    {
+                        "state": TaskStateEnum.COMPLETED,
+                        "completed": datetime.now(),
+                        "result": f"{blip_result} - {result}",
+                    },
+                    synchronize_session=False,
+                )
+            )
+            if not completed:
+                db.rollback()
+                logging.info(f"OCR >> Cancelled processing for file: {file}")
+                return
 
-                db.query(OCR).filter(OCR.file == file).delete()
-                db.add(
-                    OCR(
-                        file=file,
-                        date=datetime.now(),
-                        ocr=result,
-                        blip=blip_result,
+            db.query(OCR).filter(OCR.file == file).delete()
+            db.add(
+                OCR(
+                    file=file,
+                    date=datetime.now(),
+                    ocr=result,
+                    blip=blip_result,
+                )
+            )
+            db.commit()
+            logging.info(f"OCR >> Completed processing for file: {file}")
+        except Exception as e:
+            db.rollback()
+            task = (
+                db.query(OCRTask)
+                .filter(
+                    and_(
+                        OCRTask.file == file, OCRTask.state == TaskStateEnum.IN_PROGRESS
                     )
                 )
+                .first()
+            )
+            if task:
+                task.state = TaskStateEnum.FAILED
+                task.completed = datetime.now()
+                task.result = str(e)
                 db.commit()
-                logging.info(f"OCR >> Completed processing for file: {file}")
-            except Exception as e:
-                db.rollback()
-                task = db.query(OCRTask).filter(OCRTask.file == file).first()
-                if task:
-                    task.state = TaskStateEnum.FAILED
-                    task.completed = datetime.now()
-                    task.result = str(e)
-                    db.commit()
                 logging.error(f"Error processing OCR for file {file}: {str(e)}")
                 logging.error(traceback.format_exc())
-            finally:
-                cls.in_progess_file = None
-                db.close()
+            else:
+                logging.info(f"OCR >> Cancelled processing for file: {file}")
+        finally:
+            db.close()
 
     @classmethod
-    def add_file_to_queue(cls, file):
+    def index(cls, file):
+        """
+        Update the search index and the similarity signature of a file from
+        its new OCR result.
+        """
+        FileManager.index_file(file)
+        SimilarityManager.index_file(file)
+
+    @classmethod
+    def add_file_to_queue(cls, file, priority=PRIORITY_UPLOAD):
+        """
+        Queue the OCR of a file, queuing a pending file again with a
+        higher priority promotes it.
+        """
         db = get_db()
         try:
-            if (
+            task = (
                 db.query(OCRTask)
                 .filter(OCRTask.file == file)
                 .filter(
@@ -124,17 +157,24 @@ class OCRManager:
                     )
                 )
                 .first()
+            )
+            if task is None:
+                now = datetime.now()
+                db.add(
+                    OCRTask(
+                        file=file,
+                        added=now,
+                        state=TaskStateEnum.PENDING,
+                        priority=priority,
+                        due=SchedulerManager.due(now, priority),
+                    )
+                )
+                db.commit()
+            elif task.state != TaskStateEnum.PENDING or (
+                task.priority is not None and task.priority <= priority
             ):
                 raise Exception(f"File {file} is already in the OCR queue.")
-            db.add(
-                OCRTask(
-                    file=file,
-                    added=datetime.now(),
-                    state=TaskStateEnum.PENDING,
-                )
-            )
-            db.commit()
-            cls.queue.put(file)
+            SchedulerManager.promote("ocr", file, priority)
         except Exception as e:
             db.rollback()
             logging.error(f"Error adding file {file} to OCR queue: {str(e)}")
@@ -226,6 +266,7 @@ class OCRManager:
                 if task.completed
                 else None,
                 "result": task.result,
+                "priority": PRIORITY_NAMES.get(task.priority),
             }
             for task in ocr_tasks
         ]
@@ -247,6 +288,7 @@ class OCRManager:
                 if task.completed
                 else None,
                 "result": task.result,
+                "priority": PRIORITY_NAMES.get(task.priority),
             }
             for task in ocr_tasks
         ]
@@ -0,0 +1,501 @@
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread
+
+from db import (
+    OCRTask,
+    StockPile,
+    SummaryTask,
+    TaskStateEnum,
+    TranscriptionTask,
+    get_db,
+)
+from sqlalchemy import and_, case, exists, or_
+from tools.pool import WorkerPool
+from views.settings import get_setting
+
+STAGES = {
+    "ocr": OCRTask,
+    "transcription": TranscriptionTask,
+    "summary": SummaryTask,
+}
+DEPENDENCIES = {  # stage -> stages of the same file it runs after
+    "summary": ["ocr", "transcription"],
+}
+CONCURRENCY_SETTINGS = {
+    "ocr": "ocr_concurrency",
+    "transcription": "transcription_concurrency",
+    "summary": "summary_concurrency",
+}
+LEASE_DURATION = 120  # seconds a claimed job stays owned without heartbeat
+HEARTBEAT_INTERVAL = 30  # seconds between lease renewals of running jobs
+CANCEL_CHECK_INTERVAL = 2  # seconds between checks for cancelled running jobs
+POLL_INTERVAL = 10  # seconds between checks when not notified
+CLAIM_ATTEMPTS = 5  # candidates tried when other workers claim the same jobs
+FOLLOW_INTERVAL = 5  # seconds between checks for jobs completed by other workers
+FOLLOW_MARGIN = 60  # seconds, completion dates older than the last check
+FOLLOW_KEY = "scheduler_indexed_until"  # StockPile key of the last check
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Lanes, interactive jobs always run first
+PRIORITY_INTERACTIVE = 0  # asked for from the viewer
+PRIORITY_UPLOAD = 1  # uploaded files
+PRIORITY_BACKFILL = 2  # files found by the watcher or a reconcile
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_UPLOAD: "upload",
+    PRIORITY_BACKFILL: "backfill",
+}
+BACKFILL_AGING = 3600  # seconds, a backfill job runs before uploads queued later
+
+ACTIVE_STATES = [TaskStateEnum.PENDING, TaskStateEnum.IN_PROGRESS]
+
+
+class SchedulerManager:
+    """
+    Runs the OCR, transcription and summary jobs straight from their task
+    tables. A job is runnable once the jobs it depends on are done, and is
+    claimed with a lease renewed while it runs, so the job of a crashed
+    worker is claimed again once its lease expires.
+    Jobs run in the API process or in worker containers (worker.py), the API
+    process alone indexes their results (see follow).
+    """
+
+    lock = Lock()
+    events = {stage: Event() for stage in STAGES}
+    completed = Event()
+    pools = {}
+    handlers = {}  # stage -> (process, idle, index, cancel), see load_handlers
+    running = {}  # (stage, file, added) claimed by this process -> pool slot
+
+    def start_thread():
+        """
+        Start the worker pools of every stage, renew the leases of their
+        jobs and stop the cancelled ones.
+        """
+        SchedulerManager.load_handlers()
+        time.sleep(10)
+        logging.info(f"SCHEDULER >> Running jobs as {WORKER_ID}")
+        for stage in STAGES:
+            pool = WorkerPool(
+                stage.upper(),
+                CONCURRENCY_SETTINGS[stage],
+                lambda slot, stage=stage: SchedulerManager.loop(stage, slot),
+            )
+            SchedulerManager.pools[stage] = pool
+            pool_thread = Thread(target=pool.run)
+            pool_thread.daemon = True
+            pool_thread.start()
+        SchedulerManager.heartbeat()
+
+    @classmethod
+    def load_handlers(cls):
+        # Imported here as the managers notify the scheduler when queuing
+        from controllers.OCRManager import OCRManager
+        from controllers.SummarizeManager import SummarizeManager
+        from controllers.TranscriptionManager import TranscriptionManager
+
+        cls.handlers = {
+            "ocr": (
+                OCRManager.process,
+                OCRManager.stop_workers,
+                OCRManager.index,
+                OCRManager.cancel,
+            ),
+            "transcription": (
+                TranscriptionManager.process,
+                TranscriptionManager.stop_worker,
+                TranscriptionManager.index,
+                TranscriptionManager.cancel,
+            ),
+            "summary": (
+                SummarizeManager.process,
+                None,
+                SummarizeManager.index,
+                SummarizeManager.cancel,
+            ),
+        }
+
+    @classmethod
+    def due(cls, added, priority):
+        """
+        Date ordering the jobs of the upload and backfill lanes: an older
+        backfill job ends up before newer uploads, so it isn't starved.
+        """
+        if priority == PRIORITY_BACKFILL:
+            return added + timedelta(seconds=BACKFILL_AGING)
+        return added
+
+    @classmethod
+    def promote(cls, stage, file, priority):
+        """
+        Raise the pending job of a file to a priority, along with the jobs it
+        depends on, and wake their threads. A raised job loses its aging delay.
+        """
+        stages = [stage] + DEPENDENCIES.get(stage, [])
+        now = datetime.now()
+        db = get_db()
+        try:
+            for other in stages:
+                table = STAGES[other]
+                db.query(table).filter(
+                    and_(
+                        table.file == file,
+                        table.state == TaskStateEnum.PENDING,
+                        or_(table.priority.is_(None), table.priority > priority),
+                    )
+                ).update(
+                    {
+                        "priority": priority,
+                        "due": case((table.due > now, now), else_=table.due),
+                    },
+                    synchronize_session=False,
+                )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+        finally:
+            db.close()
+        for other in stages:
+            cls.notify(other)
+
+    @classmethod
+    def notify(cls, stage):
+        """
+        Wake the threads of a stage, after a job was queued or unblocked.
+        """
+        cls.events[stage].set()
+
+    @classmethod
+    def loop(cls, stage, slot):
+        process, idle, _, _ = cls.handlers[stage]
+        pool = cls.pools[stage]
+        idle_since = time.time()
+        while not pool.is_retired(slot):
+            # Cleared before claiming, so a job queued meanwhile isn't missed
+            cls.events[stage].clear()
+            job = cls.claim(stage)
+            if job is None:
+                if idle and time.time() - idle_since > get_setting(
+                    f"{stage}_worker_idle_timeout"
+                ):
+                    # Free the models until the next job
+                    idle(slot)
+                cls.events[stage].wait(POLL_INTERVAL)
+                continue
+
+            file, added = job
+            with cls.lock:
+                cls.running[(stage, file, added)] = slot
+            try:
+                process(file, slot)
+            except Exception as e:
+                logging.error(f"SCHEDULER >> Error running {stage} of {file}: {e}")
+                logging.error(traceback.format_exc())
+            finally:
+                with cls.lock:
+                    cls.running.pop((stage, file, added), None)
+            cls.completed.set()
+            for dependent, prerequisites in DEPENDENCIES.items():
+                if stage in prerequisites:
+                    cls.notify(dependent)
+            idle_since = time.time()
+        if idle:
+            idle(slot)
+
+    @classmethod
+    def cancel(cls, stage, file):
+        """
+        Cancel the pending or running job of a file in a stage, along with the
+        jobs depending on it, which would run on a partial content.
+        Returns the number of cancelled jobs.
+        """
+        stages = [stage] + [
+            dependent
+            for dependent, prerequisites in DEPENDENCIES.items()
+            if stage in prerequisites
+        ]
+        db = get_db()
+        try:
+            cancelled = 0
+            for other in stages:
+                table = STAGES[other]
+                cancelled += (
+                    db.query(table)
+                    .filter(and_(table.file == file, table.state.in_(ACTIVE_STATES)))
+                    .update(
+                        {
+                            "state": TaskStateEnum.CANCELLED,
+                            "completed": datetime.now(),
+                            "result": "Cancelled",
+                        },
+                        synchronize_session=False,
+                    )
+                )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+        finally:
+            db.close()
+        if cancelled:
+            logging.info(f"SCHEDULER >> Cancelled {cancelled} job(s) of {file}")
+            # Running here, it is stopped right away, elsewhere by heartbeat
+            cls.stop_cancelled()
+        return cancelled
+
+    @classmethod
+    def stop_cancelled(cls):
+        """
+        Stop the jobs running in this process that were cancelled.
+        """
+        with cls.lock:
+            running = list(cls.running)
+        if not running:
+            return
+        db = get_db()
+        try:
+            cancelled = []
+            for stage, file, added in running:
+                table = STAGES[stage]
+                if (
+                    db.query(table.state)
+                    .filter(and_(table.file == file, table.added == added))
+                    .scalar()
+                    == TaskStateEnum.CANCELLED
+                ):
+                    cancelled.append((stage, file, added))
+        finally:
+            db.close()
+        with cls.lock:
+            for job in cancelled:
+                # Still running, otherwise the slot may run another job
+                if job in cls.running:
+                    logging.info(f"SCHEDULER >> Stopping {job[0]} of {job[1]}")
+                    cls.handlers[job[0]][3](cls.running[job])
+
+    @classmethod
+    def runnable(cls, stage, now):
+        """
+        Condition of the runnable jobs of a stage: pending or with an expired
+        lease, and no unfinished job of the file in the stages it depends on.
+        """
+        table = STAGES[stage]
+        conditions = [
+            or_(
+                table.state == TaskStateEnum.PENDING,
+                and_(
+                    table.state == TaskStateEnum.IN_PROGRESS,
+                    or_(table.lease.is_(None), table.lease < now),
+                ),
+            )
+        ]
+        for prerequisite in DEPENDENCIES.get(stage, []):
+            other = STAGES[prerequisite]
+            conditions.append(
+                ~exists().where(
+                    and_(other.file == table.file, other.state.in_(ACTIVE_STATES))
+                )
+            )
+        return and_(*conditions)
+
+    @classmethod
+    def claim(cls, stage):
+        """
+        Claim the next runnable job of a stage, interactive ones first then by
+        due date, returns its (file, added) or None.
+        """
+        table = STAGES[stage]
+        db = get_db()
+        try:
+            for _ in range(CLAIM_ATTEMPTS):
+                now = datetime.now()
+                # Picked without locking, the sort reads every runnable row
+                candidates = (
+                    db.query(table.file, table.added)
+                    .filter(cls.runnable(stage, now))
+                    .order_by(
+                        case((table.priority == PRIORITY_INTERACTIVE, 0), else_=1),
+                        table.due,
+                        table.added,
+                    )
+                    .limit(CLAIM_ATTEMPTS)
+                    .all()
+                )
+                if not candidates:
+                    return None
+                for file, added in candidates:
+                    # Only the candidate row is locked, one locked by another worker
+                    # is being claimed by it
+                    key = and_(table.file == file, table.added == added)
+                    locked = (
+                        db.query(table.file)
+                        .filter(key)
+                        .with_for_update(skip_locked=True, of=table)
+                        .first()
+                    )
+                    if locked is None:
+                        db.rollback()
+                        continue
+
+                    # Where SKIP LOCKED isn't supported, only one thread wins the
+                    # update of a still runnable job
+                    claimed = (
+                        db.query(table)
+                        .filter(and_(key, cls.runnable(stage, now)))
+                        .update(
+                            {
+                                "state": TaskStateEnum.IN_PROGRESS,
+                                "lease": now + timedelta(seconds=LEASE_DURATION),
+                                "worker": WORKER_ID,
+                            },
+                            synchronize_session=False,
+                        )
+                    )
+                    db.commit()
+                    if claimed:
+                        return (file, added)
+            return None
+        except Exception as e:
+            db.rollback()
+            logging.error(f"SCHEDULER >> Error claiming {stage} job: {str(e)}")
+            logging.error(traceback.format_exc())
+            return None
+        finally:
+            db.close()
+
+    @classmethod
+    def heartbeat(cls):
+        """
+        Renew the leases of the jobs running in this process and stop the
+        cancelled ones, forever.
+        """
+        renewed = time.time()
+        while True:
+            time.sleep(CANCEL_CHECK_INTERVAL)
+            try:
+                cls.stop_cancelled()
+            except Exception as e:
+                logging.error(f"SCHEDULER >> Error stopping cancelled jobs: {str(e)}")
+            if time.time() - renewed < HEARTBEAT_INTERVAL:
+                continue
+            renewed = time.time()
+            with cls.lock:
+                running = list(cls.running)
+            if not running:
+                continue
+            db = get_db()
+            try:
+                lease = datetime.now() + timedelta(seconds=LEASE_DURATION)
+                for stage, file, added in running:
+                    table = STAGES[stage]
+                    db.query(table).filter(
+                        and_(
+                            table.file == file,
+                            table.added == added,
+                            table.state == TaskStateEnum.IN_PROGRESS,
+                            table.worker == WORKER_ID,
+                        )
+                    ).update({"lease": lease}, synchronize_session=False)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logging.error(f"SCHEDULER >> Error renewing leases: {str(e)}")
+            finally:
+                db.close()
+
+    @classmethod
+    def follow(cls):
+        """
+        Index the results of the jobs completed by any worker, forever.
+        Completion dates are checked again FOLLOW_MARGIN seconds back, for
+        jobs committed after they were dated.
+        """
+        cls.load_handlers()
+        until = cls.load_follow_mark() or datetime.now()
+        indexed = {}  # (stage, file, added) -> completed
+        while True:
+            cls.completed.wait(FOLLOW_INTERVAL)
+            cls.completed.clear()
+            since = until - timedelta(seconds=FOLLOW_MARGIN)
+            db = get_db()
+            try:
+                jobs = []
+                for stage, table in STAGES.items():
+                    jobs += [
+                        (stage, file, added, completed)
+                        for file, added, completed in db.query(
+                            table.file, table.added, table.completed
+                        ).filter(
+                            and_(
+                                table.state == TaskStateEnum.COMPLETED,
+                                table.completed > since,
+                            )
+                        )
+                    ]
+            except Exception as e:
+                logging.error(f"SCHEDULER >> Error listing completed jobs: {str(e)}")
+                continue
+            finally:
+                db.close()
+
+            for stage, file, added, completed in sorted(jobs, key=lambda j: j[3]):
+                if (stage, file, added) in indexed:
+                    continue
+                try:
+                    cls.handlers[stage][2](file)
+                except Exception as e:
+                    logging.error(f"SCHEDULER >> Error indexing {stage} of {file}: {e}")
+                indexed[(stage, file, added)] = completed
+                until = max(until, completed)
+            indexed = {job: date for job, date in indexed.items() if date > since}
+            cls.save_follow_mark(until)
+
+    @classmethod
+    def load_follow_mark(cls):
+        db = get_db()
+        try:
+            mark = db.query(StockPile).filter(StockPile.key == FOLLOW_KEY).first()
+            return datetime.fromisoformat(mark.value) if mark else None
+        finally:
+            db.close()
+
+    @classmethod
+    def save_follow_mark(cls, until):
+        db = get_db()
+        try:
+            db.merge(StockPile(key=FOLLOW_KEY, value=until.isoformat()))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logging.error(f"SCHEDULER >> Error saving indexing mark: {str(e)}")
+        finally:
+            db.close()
+
+    @classmethod
+    def running_files(cls, stage):
+        """
+        List the files whose job of a stage runs in any worker.
+        """
+        table = STAGES[stage]
+        db = get_db()
+        try:
+            return [
+                file
+                for (file,) in db.query(table.file)
+                .filter(
+                    and_(
+                        table.state == TaskStateEnum.IN_PROGRESS,
+                        table.lease >= datetime.now(),
+                    )
+                )
+                .order_by(table.file)
+            ]
+        finally:
+            db.close()
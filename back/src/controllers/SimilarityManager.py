@@ -0,0 +1,296 @@
+import logging
+import os
+import re
+import traceback
+import zlib
+from datetime import datetime
+from threading import Lock, Thread
+
+import numpy as np
+from db import File, Signature, Summary, get_db
+from utils import extract_text
+
+NUM_PERM = 128  # MinHash permutations
+LSH_BANDS = 16  # bands of LSH_ROWS values, candidates share at least one band
+LSH_ROWS = NUM_PERM // LSH_BANDS  # similarity threshold ~ (1/16)^(1/8) = 0.7
+SHINGLE_SIZE = 3  # words
+MIN_SHINGLES = 10  # shorter texts are too small to compare
+MAX_TEXT_LENGTH = 200000  # characters
+SIMILARITY_THRESHOLD = 0.7  # estimated Jaccard similarity of near-duplicates
+
+PRIME = (1 << 32) + 15  # above every 32-bit shingle hash
+_rng = np.random.RandomState(42)  # fixed, signatures are stored
+PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+
+
+def make_signature(text: str):
+    """
+    MinHash signature of the word shingles of a text, None if it is too short.
+    """
+    words = re.findall(r"\w+", text[:MAX_TEXT_LENGTH].lower())
+    shingles = set(
+        " ".join(words[i : i + SHINGLE_SIZE])
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    )
+    if len(shingles) < MIN_SHINGLES:
+        return None
+
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode()) for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    signature = np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint64)
+    for start in range(0, len(hashes), 4096):  # bounds the (NUM_PERM, n) matrix
+        block = hashes[start : start + 4096]
+        permuted = (PERM_A[:, None] * block[None, :] + PERM_B[:, None]) % PRIME
+        signature = np.minimum(signature, permuted.min(axis=1))
+    return signature.astype(np.uint32)
+
+
+class SimilarityManager:
+    """
+    Near-duplicate detection: a MinHash signature of the text of every file,
+    indexed by locality-sensitive hashing (LSH) bands so similar files are
+    found without comparing all pairs.
+    """
+
+    lock = Lock()
+    signatures = {}  # file -> signature
+    bands = [{} for _ in range(LSH_BANDS)]  # band value -> files
+
+    @classmethod
+    def setup(cls):
+        logging.info("SimilarityManager >> Setting up...")
+        db = get_db()
+        try:
+            rows = db.query(Signature.file, Signature.signature).all()
+        finally:
+            db.close()
+
+        with cls.lock:
+            cls.signatures = {}
+            cls.bands = [{} for _ in range(LSH_BANDS)]
+            for file, signature in rows:
+                cls.insert(file, np.frombuffer(signature, dtype=np.uint32))
+        logging.info(f"SimilarityManager >> Loaded {len(rows)} signatures.")
+
+        backfill_thread = Thread(target=cls.backfill)
+        backfill_thread.daemon = True
+        backfill_thread.start()
+        logging.info("SimilarityManager >> Setup complete.")
+
+    @classmethod
+    def backfill(cls):
+        """
+        Sign the cataloged files missing a signature.
+        """
+        db = get_db()
+        try:
+            files = [file for (file,) in db.query(File.path)]
+        finally:
+            db.close()
+
+        missing = [file for file in files if file not in cls.signatures]
+        if missing:
+            logging.info(f"SimilarityManager >> Signing {len(missing)} files...")
+        for file in missing:
+            cls.index_file(file, store_empty=False)
+
+    @classmethod
+    def get_text(cls, file):
+        """
+        Get the text a file is compared on: its content, or its summary when
+        it has no readable content.
+        """
+        text = extract_text(file) if os.path.exists(file) else None
+        if text:
+            return text
+        db = get_db()
+        try:
+            summary = db.query(Summary).filter(Summary.file == file).first()
+        finally:
+            db.close()
+        return summary.summary if summary else None
+
+    @classmethod
+    def index_file(cls, file, store_empty=True):
+        """
+        Compute, store and index the signature of a file.
+        Without store_empty, a file too short to be signed is left untouched.
+        """
+        try:
+            text = cls.get_text(file)
+            signature = make_signature(text) if text else None
+            if signature is None:
+                if store_empty:
+                    cls.remove_file(file)
+                return
+
+            db = get_db()
+            try:
+                db.merge(
+                    Signature(
+                        file=file, date=datetime.now(), signature=signature.tobytes()
+                    )
+                )
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                raise e
+            finally:
+                db.close()
+
+            with cls.lock:
+                cls.discard(file)
+                cls.insert(file, signature)
+        except Exception as e:
+            logging.error(f"Error signing file {file}: {str(e)}")
+            logging.error(traceback.format_exc())
+
+    @classmethod
+    def remove_file(cls, file):
+        """
+        Remove the signature of a file.
+        """
+        db = get_db()
+        try:
+            db.query(Signature).filter(Signature.file == file).delete()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logging.error(f"Error removing signature of {file}: {str(e)}")
+        finally:
+            db.close()
+        with cls.lock:
+            cls.discard(file)
+
+    @classmethod
+    def move_file(cls, file, new_file):
+        """
+        Move the signature of a file to its new path.
+        """
+        db = get_db()
+        try:
+            db.query(Signature).filter(Signature.file == new_file).delete()
+            db.query(Signature).filter(Signature.file == file).update(
+                {"file": new_file}
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logging.error(f"Error moving signature of {file}: {str(e)}")
+        finally:
+            db.close()
+        with cls.lock:
+            signature = cls.signatures.get(file)
+            cls.discard(file)
+            cls.discard(new_file)
+            if signature is not None:
+                cls.insert(new_file, signature)
+
+    @classmethod
+    def insert(cls, file, signature):
+        cls.signatures[file] = signature
+        for band, key in enumerate(band_keys(signature)):
+            cls.bands[band].setdefault(key, set()).add(file)
+
+    @classmethod
+    def discard(cls, file):
+        signature = cls.signatures.pop(file, None)
+        if signature is None:
+            return
+        for band, key in enumerate(band_keys(signature)):
+            files = cls.bands[band].get(key)
+            if files is not None:
+                files.discard(file)
+                if not files:
+                    del cls.bands[band][key]
+
+    @classmethod
+    def similar(cls, file, threshold: float = SIMILARITY_THRESHOLD, limit: int = 20):
+        """
+        Find the files similar to a file, from the ones sharing an LSH band
+        with it, most similar first.
+        """
+        with cls.lock:
+            signature = cls.signatures.get(file)
+            if signature is None:
+                return []
+            candidates = set()
+            for band, key in enumerate(band_keys(signature)):
+                candidates.update(cls.bands[band].get(key, ()))
+            candidates.discard(file)
+            scored = [
+                (candidate, similarity(signature, cls.signatures[candidate]))
+                for candidate in candidates
+            ]
+
+        scored = [(other, score) for other, score in scored if score >= threshold]
+        scored.sort(key=lambda match: match[1], reverse=True)
+        return [
+            {"file": other, "similarity": round(score, 3)}
+            for other, score in scored[:limit]
+        ]
+
+    @classmethod
+    def clusters(cls, threshold: float = SIMILARITY_THRESHOLD, min_size: int = 2):
+        """
+        Group near-duplicate files, largest groups first.
+        The members of each LSH bucket are compared with its first member only,
+        the other bands connect what this misses.
+        """
+        parents = {}
+
+        def find(file):
+            while parents.get(file, file) != file:
+                parents[file] = parents.get(parents[file], parents[file])
+                file = parents[file]
+            return file
+
+        with cls.lock:
+            for buckets in cls.bands:
+                for files in buckets.values():
+                    if len(files) < 2:
+                        continue
+                    files = sorted(files)
+                    first = cls.signatures[files[0]]
+                    for other in files[1:]:
+                        if find(files[0]) != find(other) and (
+                            similarity(first, cls.signatures[other]) >= threshold
+                        ):
+                            parents[find(other)] = find(files[0])
+
+        groups = {}
+        for file in parents:
+            groups.setdefault(find(file), set()).add(file)
+        for root, files in groups.items():
+            files.add(root)
+        clusters = [
+            sorted(files) for files in groups.values() if len(files) >= min_size
+        ]
+        clusters.sort(key=len, reverse=True)
+        return clusters
+
+    @classmethod
+    def stats(cls):
+        with cls.lock:
+            return {
+                "signatures": len(cls.signatures),
+                "buckets": sum(len(buckets) for buckets in cls.bands),
+            }
+
+
+def band_keys(signature):
+    return [
+        signature[band * LSH_ROWS : (band + 1) * LSH_ROWS].tobytes()
+        for band in range(LSH_BANDS)
+    ]
+
+
+def similarity(signature, other):
+    """
+    Estimated Jaccard similarity of the shingles of two signed texts.
+    """
+    return float(np.mean(signature == other))
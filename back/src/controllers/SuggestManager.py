@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+from bisect import bisect_left, insort
+from threading import Lock
+
+from db import File, Project, Summary, Tag, get_db
+
+SUGGEST_KINDS = ["file", "keyword", "tag", "project"]
+SUGGEST_SCAN_LIMIT = 500  # prefix matches ranked per request
+
+
+class SuggestManager:
+    """
+    Typeahead over file names, summary keywords, tag and project names, kept in
+    a sorted array searched by bisection.
+    """
+
+    lock = Lock()
+    keys = []  # sorted (folded value, kind, value)
+    counts = {}  # (kind, value) -> number of files or rows holding it
+    files = {}  # file -> its (kind, value) entries
+
+    @classmethod
+    def setup(cls):
+        """
+        Build the suggestions from the catalog, the summaries, the tags and the
+        projects.
+        """
+        logging.info("SuggestManager >> Setting up...")
+        db = get_db()
+        try:
+            files = {
+                path: [("file", os.path.basename(path))]
+                for (path,) in db.query(File.path)
+            }
+            for file, keywords in db.query(Summary.file, Summary.keywords).filter(
+                Summary.keywords.isnot(None)
+            ):
+                if file in files:
+                    files[file] += [
+                        ("keyword", keyword) for keyword in parse_keywords(keywords)
+                    ]
+            names = [("tag", name) for (name,) in db.query(Tag.name)]
+            names += [("project", name) for (name,) in db.query(Project.name)]
+        finally:
+            db.close()
+
+        counts = {}
+        for entries in files.values():
+            for entry in set(entries):
+                counts[entry] = counts.get(entry, 0) + 1
+        for entry in names:
+            counts[entry] = counts.get(entry, 0) + 1
+
+        with cls.lock:
+            cls.files = {file: set(entries) for file, entries in files.items()}
+            cls.counts = counts
+            cls.keys = sorted((value.casefold(), kind, value) for kind, value in counts)
+        logging.info(f"SuggestManager >> Loaded {len(cls.keys)} suggestions.")
+
+    @classmethod
+    def add(cls, kind, value):
+        """
+        Count one more holder of a suggestion.
+        """
+        if not value:
+            return
+        with cls.lock:
+            cls.increment((kind, value))
+
+    @classmethod
+    def remove(cls, kind, value):
+        """
+        Count one less holder of a suggestion, dropping it when none is left.
+        """
+        with cls.lock:
+            cls.decrement((kind, value))
+
+    @classmethod
+    def update_file(cls, file, keywords=None):
+        """
+        Refresh the suggestions of an indexed file from its name and keywords.
+        """
+        entries = {("file", os.path.basename(file))}
+        entries.update(("keyword", keyword) for keyword in keywords or [] if keyword)
+        with cls.lock:
+            old = cls.files.get(file, set())
+            for entry in entries - old:
+                cls.increment(entry)
+            for entry in old - entries:
+                cls.decrement(entry)
+            cls.files[file] = entries
+
+    @classmethod
+    def remove_files(cls, files):
+        """
+        Drop the suggestions of files removed from the index.
+        """
+        with cls.lock:
+            for file in files:
+                for entry in cls.files.pop(file, set()):
+                    cls.decrement(entry)
+
+    @classmethod
+    def increment(cls, entry):
+        count = cls.counts.get(entry, 0)
+        if count == 0:
+            kind, value = entry
+            insort(cls.keys, (value.casefold(), kind, value))
+        cls.counts[entry] = count + 1
+
+    @classmethod
+    def decrement(cls, entry):
+        count = cls.counts.get(entry, 0)
+        if count > 1:
+            cls.counts[entry] = count - 1
+        elif count == 1:
+            del cls.counts[entry]
+            kind, value = entry
+            key = (value.casefold(), kind, value)
+            i = bisect_left(cls.keys, key)
+            if i < len(cls.keys) and cls.keys[i] == key:
+                del cls.keys[i]
+
+    @classmethod
+    def suggest(cls, prefix: str, limit: int = 10, kinds=None):
+        """
+        Get the suggestions starting with prefix (case insensitive), the most
+        used first.
+        """
+        prefix = prefix.strip().casefold()
+        if not prefix:
+            return []
+
+        matches = []
+        with cls.lock:
+            i = bisect_left(cls.keys, (prefix,))
+            while i < len(cls.keys) and len(matches) < SUGGEST_SCAN_LIMIT:
+                folded, kind, value = cls.keys[i]
+                if not folded.startswith(prefix):
+                    break
+                if kinds is None or kind in kinds:
+                    matches.append((cls.counts[(kind, value)], kind, value))
+                i += 1
+
+        matches.sort(key=lambda match: (-match[0], len(match[2]), match[2]))
+        return [
+            {"value": value, "kind": kind, "count": count}
+            for count, kind, value in matches[:limit]
+        ]
+
+    @classmethod
+    def stats(cls):
+        with cls.lock:
+            stats = {kind: 0 for kind in SUGGEST_KINDS}
+            for kind, _ in cls.counts:
+                stats[kind] += 1
+            return stats
+
+
+def parse_keywords(keywords):
+    try:
+        keywords = json.loads(keywords)
+    except Exception:
+        return []
+    return [keyword for keyword in keywords if isinstance(keyword, str) and keyword]
@@ -1,126 +1,194 @@
 import json
 import logging
-import queue
-import time
 import traceback
 from datetime import datetime
+from threading import Event
 
-from controllers.OCRManager import OCRManager
-from controllers.TranscriptionManager import TranscriptionManager
+from controllers.FileManager import FileManager
+from controllers.SchedulerManager import (
+    PRIORITY_NAMES,
+    PRIORITY_UPLOAD,
+    SchedulerManager,
+)
+from controllers.SimilarityManager import SimilarityManager
+from controllers.VectorManager import VectorManager
 from db import Summary, SummaryTask, TaskStateEnum, get_db
 from sqlalchemy import and_
 from tools.ai import request_llm
-from utils import guess_mime, read_content
+from utils import read_content
 
 
 class SummarizeManager:
-    in_progress_file = None
-    queue = queue.Queue()
+    cancel_events = {}  # pool slot -> Event stopping its LLM request
 
-    def start_thread():
-        db = get_db()
-        pending = (
-            db.query(SummaryTask)
-            .filter(
-                SummaryTask.state.in_(
-                    [TaskStateEnum.PENDING, TaskStateEnum.IN_PROGRESS]
-                )
-            )
-            .all()
-        )
-        for task in pending:
-            task.state = TaskStateEnum.PENDING
-            SummarizeManager.queue.put(task.file)
-        db.commit()
-        db.close()
-        SummarizeManager.loop()
+    @classmethod
+    def cancel(cls, slot):
+        """
+        Stop the LLM request running in a pool slot.
+        """
+        cls.cancel_events.setdefault(slot, Event()).set()
 
     @classmethod
-    def loop(cls):
-        time.sleep(10)
-        while True:
-            time.sleep(1)
-            file = cls.queue.get()
-            cls.in_progress_file = file
-
-            db = get_db()
-            try:
-                logging.info(f"SUMMARY >> Processing file: {file}")
-
-                mime = guess_mime(file)
-                if mime.startswith("image/"):
-                    logging.info("SUMMARY >> Attempting to get OCR.")
-                    result = OCRManager.get(file)
-                    if result is None:
-                        logging.info("SUMMARY >> No OCR found, re-adding to queue.")
-                        cls.queue.put(file)
-                        continue
-                elif mime.startswith("audio/") or mime.startswith("video/"):
-                    logging.info("SUMMARY >> Attempting to get transcription.")
-                    transcription = TranscriptionManager.get(file)
-                    if transcription is None:
-                        logging.info(
-                            "SUMMARY >> No transcription found, re-adding to queue."
-                        )
-                        cls.queue.put(file)
-                        continue
-
-                task = (
-                    db.query(SummaryTask)
-                    .filter(
-                        and_(
-                            SummaryTask.file == file,
-                            SummaryTask.state == TaskStateEnum.PENDING,
-                        )
+    def process(cls, file, slot=None):
+        """
+        Run the summary task of a file claimed by the scheduler.
+        """
+        cancel_event = cls.cancel_events.setdefault(slot, Event())
+        cancel_event.clear()
+        db = get_db()
+        try:
+            logging.info(f"SUMMARY >> Processing file: {file}")
+
+            task = (
+                db.query(SummaryTask)
+                .filter(
+                    and_(
+                        SummaryTask.file == file,
+                        SummaryTask.state == TaskStateEnum.IN_PROGRESS,
                     )
-                    .order_by(SummaryTask.added.desc())
-                    .first()
                 )
-                task.state = TaskStateEnum.IN_PROGRESS
-                db.commit()
+                .first()
+            )
+            if task is None:
+                logging.info(f"SUMMARY >> Cancelled before processing file: {file}")
+                return
 
-                content = read_content(file)
+            content = read_content(file)
 
-                # MARK: Prompt
-                if content is None:
-                    raise Exception(f"Can't summarize this type of file: {file}")
-                else:
-                    logging.info("SUMMARY >> Asking LLM for summary.")
-                    keywords, summary = cls.make_summary(input=content)
-                logging.info(
-                    f"SUMMARY >> Result for file {file}: {keywords} - {summary}"
+            # MARK: Prompt
+            if content is None:
+                raise Exception(f"Can't summarize this type of file: {file}")
+            else:
+                logging.info("SUMMARY >> Asking LLM for summary.")
+                keywords, summary = cls.make_summary(
+                    input=content, cancel_event=cancel_event
                 )
+            logging.info(f"SUMMARY >> Result for file {file}: {keywords} - {summary}")
 
-                task.state = TaskStateEnum.COMPLETED
-                task.completed = datetime.now()
-                task.result = f"{keywords} - {summary}"
-                db.query(Summary).filter(Summary.file == file).delete()
-                db.add(
-                    Summary(
-                        file=file,
-                        date=datetime.now(),
-                        summary=summary,
-                        keywords=json.dumps(keywords),
+            # Unless it was cancelled meanwhile
+            completed = (
+                db.query(SummaryTask)
+                .filter(
+                    and_(
+                        SummaryTask.file == file,
+                        SummaryTask.added == task.added,
+                        SummaryTask.state == TaskStateEnum.IN_PROGRESS,
                     )
                 )
-                db.commit()
-                logging.info(f"SUMMARY >> Completed processing for file: {file}")
-            except Exception as e:
+                .update(
+                    {
+                        "state": TaskStateEnum.COMPLETED,
+                        "completed": datetime.now(),
+                        "result": f"{keywords} - {summary}",
+                    },
+                    synchronize_session=False,
+                )
+            )
+            if not completed:
                 db.rollback()
-                task = db.query(SummaryTask).filter(SummaryTask.file == file).first()
-                if task:
-                    task.state = TaskStateEnum.FAILED
-                    task.completed = datetime.now()
-                    task.result = str(e)
-                    db.commit()
+                logging.info(f"SUMMARY >> Cancelled processing for file: {file}")
+                return
+
+            db.query(Summary).filter(Summary.file == file).delete()
+            db.add(
+                Summary(
+                    file=file,
+                    date=datetime.now(),
+                    summary=summary,
+                    keywords=json.dumps(keywords),
+                )
+            )
+            db.commit()
+            logging.info(f"SUMMARY >> Completed processing for file: {file}")
+        except Exception as e:
+            db.rollback()
+            task = (
+                db.query(SummaryTask)
+                .filter(
+                    and_(
+                        SummaryTask.file == file,
+                        SummaryTask.state == TaskStateEnum.IN_PROGRESS,
+                    )
+                )
+                .first()
+            )
+            if task:
+                task.state = TaskStateEnum.FAILED
+                task.completed = datetime.now()
+                task.result = str(e)
+                db.commit()
                 logging.error(f"Error processing summary for file {file}: {str(e)}")
                 logging.error(traceback.format_exc())
-            finally:
-                cls.in_progress_file = None
-                db.close()
+            else:
+                logging.info(f"SUMMARY >> Cancelled processing for file: {file}")
+        finally:
+            db.close()
 
     @classmethod
-    def make_summary(cls, input):
+    def make_summary(cls, input, cancel_event=None):
+        """
+        Ask the LLM for the keywords and the summary of a content in a single
+        JSON answer, so the content is only evaluated once. Falls back to one
+        request each when the answer can't be parsed.
+        """
+        _, _, answer = request_llm(
+            setting_prefix="summarization",
+            prompt="""! FILE CONTENT START !
+{input}
+! FILE CONTENT END !
+
+! TASK !
+You are an expert summarizer.
+
+1. Extract **5 to 10 relevant keywords** that capture the **main topics and themes** of the file content above.
+2. Write a **summary** from the CONTENT of the file above. Maximum of **400 WORDS**. Focus on the main ideas and key points. Use clear and concise language.
+
+! FORMAT !
+Respond ONLY with a JSON object, without code blocks or any text around it:
+{"keywords": ["keyword1", "keyword2", "keyword3", ...], "summary": "The summary in plain markdown."}
+""",
+            input_text=input,
+            cancel_event=cancel_event,
+            json_output=True,
+        )
+        try:
+            return cls.parse_summary(answer)
+        except ValueError as e:
+            logging.warning(
+                f"SUMMARY >> Can't parse the LLM answer ({e}), asking separately."
+            )
+            return cls.make_summary_separately(input, cancel_event)
+
+    @classmethod
+    def parse_summary(cls, answer):
+        """
+        Get the keywords and the summary of a JSON answer, tolerating text or
+        code blocks around the object. Raises ValueError when either is missing.
+        """
+        start, end = answer.find("{"), answer.rfind("}")
+        if start == -1 or end < start:
+            raise ValueError("no JSON object")
+        data = json.loads(answer[start : end + 1])
+        if not isinstance(data, dict):
+            raise ValueError("not a JSON object")
+
+        keywords = data.get("keywords")
+        if isinstance(keywords, str):
+            keywords = keywords.split(",")
+        if not isinstance(keywords, list):
+            raise ValueError("no keywords")
+        keywords = [str(k).strip() for k in keywords if str(k).strip()]
+
+        summary = data.get("summary")
+        if not isinstance(summary, str) or not summary.strip():
+            raise ValueError("no summary")
+        summary = summary.strip()
+        if summary.startswith("```") and summary.endswith("```"):
+            summary = summary[3:-3].strip()
+        return (keywords, summary)
+
+    @classmethod
+    def make_summary_separately(cls, input, cancel_event=None):
         _, _, keywords = request_llm(
             setting_prefix="summarization",
             prompt=""""! FILE CONTENT START !
@@ -138,6 +206,7 @@ Do NOT use JSON, code blocks, quotes, or formatting.
 Example: keyword1, keyword2, keyword3, ...
 """,
             input_text=input,
+            cancel_event=cancel_event,
         )
         if keywords.startswith("[") and keywords.endswith("]"):
             keywords = json.loads(keywords)
@@ -160,6 +229,7 @@ Respond ONLY with plain markdown.
 Do NOT include explanations, notes, or any formatting outside the summary itself.
 """,
             input_text=input,
+            cancel_event=cancel_event,
         )
         summary = summary.strip()
         if summary.startswith("```") and summary.endswith("```"):
@@ -167,10 +237,24 @@ Do NOT include explanations, notes, or any formatting outside the summary itself
         return (keywords, summary)
 
     @classmethod
-    def add_file_to_queue(cls, file):
+    def index(cls, file):
+        """
+        Update the search index, the vectors and the similarity signature of a
+        file from its new summary.
+        """
+        FileManager.index_file(file)
+        VectorManager.index_file(file)
+        SimilarityManager.index_file(file)
+
+    @classmethod
+    def add_file_to_queue(cls, file, priority=PRIORITY_UPLOAD):
+        """
+        Queue the summary of a file, queuing a pending file again with a
+        higher priority promotes it.
+        """
         db = get_db()
         try:
-            if (
+            task = (
                 db.query(SummaryTask)
                 .filter(SummaryTask.file == file)
                 .filter(
@@ -179,17 +263,24 @@ Do NOT include explanations, notes, or any formatting outside the summary itself
                     )
                 )
                 .first()
+            )
+            if task is None:
+                now = datetime.now()
+                db.add(
+                    SummaryTask(
+                        file=file,
+                        added=now,
+                        state=TaskStateEnum.PENDING,
+                        priority=priority,
+                        due=SchedulerManager.due(now, priority),
+                    )
+                )
+                db.commit()
+            elif task.state != TaskStateEnum.PENDING or (
+                task.priority is not None and task.priority <= priority
             ):
                 raise Exception(f"File {file} is already in the summary queue.")
-            db.add(
-                SummaryTask(
-                    file=file,
-                    added=datetime.now(),
-                    state=TaskStateEnum.PENDING,
-                )
-            )
-            db.commit()
-            cls.queue.put(file)
+            SchedulerManager.promote("summary", file, priority)
         except Exception as e:
             db.rollback()
             logging.error(f"Error adding file {file} to Summary queue: {str(e)}")
@@ -276,6 +367,7 @@ Do NOT include explanations, notes, or any formatting outside the summary itself
                 if task.completed
                 else None,
                 "result": task.result,
+                "priority": PRIORITY_NAMES.get(task.priority),
             }
             for task in tasks
         ]
@@ -294,6 +386,7 @@ Do NOT include explanations, notes, or any formatting outside the summary itself
                 if task.completed
                 else None,
                 "result": task.result,
+                "priority": PRIORITY_NAMES.get(task.priority),
             }
             for task in tasks
         ]
@@ -1,110 +1,169 @@
 import logging
-import queue
-import subprocess
-import time
 import traceback
 from datetime import datetime
 
+from controllers.FileManager import FileManager
+from controllers.SchedulerManager import (
+    PRIORITY_NAMES,
+    PRIORITY_UPLOAD,
+    SchedulerManager,
+)
+from controllers.SimilarityManager import SimilarityManager
 from db import TaskStateEnum, Transcription, TranscriptionTask, get_db
 from sqlalchemy import and_
+from tools.worker import ModelWorker
+from views.settings import get_setting
 
 
 class TranscriptionManager:
-    in_progress_file = None
-    queue = queue.Queue()
+    workers = {}  # pool slot -> Whisper worker
 
-    def start_thread():
+    @classmethod
+    def get_worker(cls, slot):
+        """
+        Get the Whisper worker of a pool slot for the current settings,
+        replacing it when the model, compute type or CPU threads changed.
+        """
+        command = [
+            "python3",
+            "/app/whisper.py",
+            get_setting("transcription_model"),
+            get_setting("transcription_compute_type"),
+            str(get_setting("transcription_cpu_threads")),
+        ]
+        worker = cls.workers.get(slot)
+        if worker is None or worker.command != command:
+            if worker is not None:
+                worker.stop()
+            # Long recordings take as long as they need on CPU, no job timeout
+            worker = ModelWorker(f"TRANSCRIPTION {slot}", command, job_timeout=None)
+            cls.workers[slot] = worker
+        return worker
+
+    @classmethod
+    def stop_worker(cls, slot):
+        worker = cls.workers.get(slot)
+        if worker is not None:
+            worker.stop()
+
+    @classmethod
+    def cancel(cls, slot):
+        """
+        Stop the job running on the worker of a pool slot.
+        """
+        worker = cls.workers.get(slot)
+        if worker is not None:
+            worker.terminate()
+
+    @classmethod
+    def process(cls, file, slot):
+        """
+        Run the transcription task of a file claimed by the scheduler.
+        """
         db = get_db()
-        pending = (
-            db.query(TranscriptionTask)
-            .filter(
-                TranscriptionTask.state.in_(
-                    [TaskStateEnum.PENDING, TaskStateEnum.IN_PROGRESS]
+        try:
+            task = (
+                db.query(TranscriptionTask)
+                .filter(
+                    and_(
+                        TranscriptionTask.file == file,
+                        TranscriptionTask.state == TaskStateEnum.IN_PROGRESS,
+                    )
                 )
+                .first()
             )
-            .all()
-        )
-        for task in pending:
-            task.state = TaskStateEnum.PENDING
-            TranscriptionManager.queue.put(task.file)
-        db.commit()
-        db.close()
-        TranscriptionManager.loop()
+            if task is None:
+                logging.info(
+                    f"TRANSCRIPTION >> Cancelled before processing file: {file}"
+                )
+                return
 
-    @classmethod
-    def loop(cls):
-        time.sleep(10)
-        while True:
-            file = cls.queue.get()
-            cls.in_progress_file = file
-
-            db = get_db()
-            try:
-                task = (
-                    db.query(TranscriptionTask)
-                    .filter(
-                        and_(
-                            TranscriptionTask.file == file,
-                            TranscriptionTask.state == TaskStateEnum.PENDING,
-                        )
+            logging.info(f"TRANSCRIPTION >> Processing file: {file}")
+            result = (
+                cls.get_worker(slot)
+                .run(file=file, beam_size=get_setting("transcription_beam_size"))
+                .strip()
+            )
+            logging.info(f"TRANSCRIPTION >> Result for file {file}: {result}")
+
+            # Unless it was cancelled meanwhile
+            completed = (
+                db.query(TranscriptionTask)
+                .filter(
+                    and_(
+                        TranscriptionTask.file == file,
+                        TranscriptionTask.added == task.added,
+                        TranscriptionTask.state == TaskStateEnum.IN_PROGRESS,
                     )
-                    .order_by(TranscriptionTask.added.desc())
-                    .first()
                 )
-                task.state = TaskStateEnum.IN_PROGRESS
-                db.commit()
-
-                logging.info(f"TRANSCRIPTION >> Processing file: {file}")
-                proc = subprocess.run(
-                    ["python3", "/app/whisper.py", "small", file],
-                    capture_output=True,
-                    text=True,
+                .update(
+                    {
+                        "state": TaskStateEnum.COMPLETED,
+                        "completed": datetime.now(),
+                        "result": result,
+                    },
+                    synchronize_session=False,
                 )
-                if proc.returncode != 0:
-                    raise RuntimeError(
-                        f"Subprocess failed with code {proc.returncode}: {proc.stderr.strip()}"
-                    )
-                result = proc.stdout.strip()
-                logging.info(f"TRANSCRIPTION >> Result for file {file}: {result}")
+            )
+            if not completed:
+                db.rollback()
+                logging.info(f"TRANSCRIPTION >> Cancelled processing for file: {file}")
+                return
 
-                task.state = TaskStateEnum.COMPLETED
-                task.completed = datetime.now()
-                task.result = result
-                db.query(Transcription).filter(Transcription.file == file).delete()
-                db.add(
-                    Transcription(
-                        file=file,
-                        date=datetime.now(),
-                        transcription=result,
+            db.query(Transcription).filter(Transcription.file == file).delete()
+            db.add(
+                Transcription(
+                    file=file,
+                    date=datetime.now(),
+                    transcription=result,
+                )
+            )
+            db.commit()
+            logging.info(f"TRANSCRIPTION >> Completed processing for file: {file}")
+        except Exception as e:
+            db.rollback()
+            task = (
+                db.query(TranscriptionTask)
+                .filter(
+                    and_(
+                        TranscriptionTask.file == file,
+                        TranscriptionTask.state == TaskStateEnum.IN_PROGRESS,
                     )
                 )
+                .first()
+            )
+            if task:
+                task.state = TaskStateEnum.FAILED
+                task.completed = datetime.now()
+                task.result = str(e)
                 db.commit()
-                logging.info(f"TRANSCRIPTION >> Completed processing for file: {file}")
-            except Exception as e:
-                db.rollback()
-                task = (
-                    db.query(TranscriptionTask)
-                    .filter(TranscriptionTask.file == file)
-                    .first()
-                )
-                if task:
-                    task.state = TaskStateEnum.FAILED
-                    task.completed = datetime.now()
-                    task.result = str(e)
-                    db.commit()
                 logging.error(
                     f"Error processing transcription for file {file}: {str(e)}"
                 )
                 logging.error(traceback.format_exc())
-            finally:
-                cls.in_progress_file = None
-                db.close()
+            else:
+                logging.info(f"TRANSCRIPTION >> Cancelled processing for file: {file}")
+        finally:
+            db.close()
 
     @classmethod
-    def add_file_to_queue(cls, file):
+    def index(cls, file):
+        """
+        Update the search index and the similarity signature of a file from
+        its new transcription result.
+        """
+        FileManager.index_file(file)
+        SimilarityManager.index_file(file)
+
+    @classmethod
+    def add_file_to_queue(cls, file, priority=PRIORITY_UPLOAD):
+        """
+        Queue the transcription of a file, queuing a pending file again with a
+        higher priority promotes it.
+        """
         db = get_db()
         try:
-            if (
+            task = (
                 db.query(TranscriptionTask)
                 .filter(TranscriptionTask.file == file)
                 .filter(
@@ -113,17 +172,24 @@ class TranscriptionManager:
                     )
                 )
                 .first()
+            )
+            if task is None:
+                now = datetime.now()
+                db.add(
+                    TranscriptionTask(
+                        file=file,
+                        added=now,
+                        state=TaskStateEnum.PENDING,
+                        priority=priority,
+                        due=SchedulerManager.due(now, priority),
+                    )
+                )
+                db.commit()
+            elif task.state != TaskStateEnum.PENDING or (
+                task.priority is not None and task.priority <= priority
             ):
                 raise Exception(f"File {file} is already in the transcription queue.")
-            db.add(
-                TranscriptionTask(
-                    file=file,
-                    added=datetime.now(),
-                    state=TaskStateEnum.PENDING,
-                )
-            )
-            db.commit()
-            cls.queue.put(file)
+            SchedulerManager.promote("transcription", file, priority)
         except Exception as e:
             db.rollback()
             logging.error(f"Error adding file {file} to Transcription queue: {str(e)}")
@@ -218,6 +284,7 @@ class TranscriptionManager:
                 if task.completed
                 else None,
                 "result": task.result,
+                "priority": PRIORITY_NAMES.get(task.priority),
             }
             for task in tasks
         ]
@@ -238,6 +305,7 @@ class TranscriptionManager:
                 if task.completed
                 else None,
                 "result": task.result,
+                "priority": PRIORITY_NAMES.get(task.priority),
             }
             for task in tasks
         ]
@@ -0,0 +1,515 @@
+import json
+import logging
+import os
+import traceback
+from itertools import groupby
+from threading import Lock, Thread
+
+import numpy as np
+from db import Summary, get_db
+from tools.ai import request_embeddings
+from utils import read_content
+from views.settings import get_setting
+
+VECTOR_PATH = "/data/vectors"
+VECTORS_FILE = f"{VECTOR_PATH}/vectors.f32"  # raw float32 rows, append only
+ROWS_FILE = f"{VECTOR_PATH}/rows.jsonl"  # log of added, deleted and moved files
+META_FILE = f"{VECTOR_PATH}/meta.json"
+
+CHUNK_SIZE = 1000  # characters
+CHUNK_OVERLAP = 200
+MAX_CHUNKS = 32
+EMBED_BATCH_SIZE = 16
+
+IVF_MIN_VECTORS = 4096  # below, scanning every vector is fast enough
+IVF_MAX_LISTS = 1024
+IVF_SAMPLE_SIZE = 20000
+IVF_ITERATIONS = 8
+IVF_PROBES = 8
+
+
+def chunk_text(text: str):
+    """
+    Split a text into overlapping chunks of CHUNK_SIZE characters.
+    """
+    text = " ".join(text.split())
+    chunks = []
+    start = 0
+    while start < len(text) and len(chunks) < MAX_CHUNKS:
+        chunks.append(text[start : start + CHUNK_SIZE])
+        start += CHUNK_SIZE - CHUNK_OVERLAP
+    return chunks
+
+
+def embed(texts):
+    """
+    Embed texts by batches, returns a normalized float32 matrix.
+    """
+    vectors = []
+    for i in range(0, len(texts), EMBED_BATCH_SIZE):
+        vectors.extend(request_embeddings(texts[i : i + EMBED_BATCH_SIZE]))
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def kmeans(vectors, rows):
+    """
+    Cluster rows of vectors with spherical k-means, returns the centroids and
+    the rows of each of them.
+    """
+    nlist = min(IVF_MAX_LISTS, int(np.sqrt(len(rows))))
+    rng = np.random.default_rng(0)
+    sample = np.array(
+        vectors[
+            np.sort(rng.choice(rows, min(IVF_SAMPLE_SIZE, len(rows)), replace=False))
+        ]
+    )
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+    for _ in range(IVF_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+
+    lists = [[] for _ in range(nlist)]
+    for start in range(0, len(rows), IVF_SAMPLE_SIZE):
+        batch = rows[start : start + IVF_SAMPLE_SIZE]
+        for row, list_id in zip(batch, np.argmax(vectors[batch] @ centroids.T, axis=1)):
+            lists[list_id].append(int(row))
+    return centroids, lists
+
+
+class VectorManager:
+    """
+    Chunk embeddings of summarized files, stored in a memory-mapped file and
+    searched through an inverted file (IVF) of k-means clusters.
+    """
+
+    lock = Lock()
+    train_lock = Lock()  # held by the running training
+    model = None
+    dim = None
+    vectors = None  # memmap of shape (rows, dim)
+    files = []  # file of each row, None once deleted
+    rows = {}  # file -> row ids
+    dead = 0  # rows of deleted files
+    epoch = 0  # bumped when row ids change, to drop a training started before
+    centroids = None  # None until enough vectors to train the IVF
+    lists = []  # row ids of each centroid
+    trained_size = 0
+
+    @classmethod
+    def setup(cls):
+        logging.info("VectorManager >> Setting up...")
+        os.makedirs(VECTOR_PATH, exist_ok=True)
+
+        meta = {}
+        if os.path.exists(META_FILE):
+            with open(META_FILE, "r") as f:
+                meta = json.load(f)
+
+        with cls.lock:
+            if meta.get("model") == get_setting("embedding_model") and cls.load(meta):
+                logging.info(
+                    f"VectorManager >> Loaded {len(cls.rows)} files and {len(cls.files)} vectors."
+                )
+            else:
+                cls.reset()
+
+        backfill_thread = Thread(target=cls.backfill)
+        backfill_thread.daemon = True
+        backfill_thread.start()
+        logging.info("VectorManager >> Setup complete.")
+
+    @classmethod
+    def load(cls, meta):
+        """
+        Replay the rows log and map the vectors file, returns False if they
+        don't match.
+        """
+        files, rows = [], {}
+        if os.path.exists(ROWS_FILE):
+            with open(ROWS_FILE, "r") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if "add" in entry:
+                        rows[entry["add"]] = list(
+                            range(len(files), len(files) + entry["rows"])
+                        )
+                        files.extend([entry["add"]] * entry["rows"])
+                    elif "delete" in entry:
+                        for row in rows.pop(entry["delete"], []):
+                            files[row] = None
+                    elif "move" in entry:
+                        old, new = entry["move"]
+                        for row in rows.pop(new, []):
+                            files[row] = None
+                        rows[new] = rows.pop(old, [])
+                        for row in rows[new]:
+                            files[row] = new
+
+        cls.model = meta["model"]
+        cls.dim = meta.get("dim")
+        size = os.path.getsize(VECTORS_FILE) if os.path.exists(VECTORS_FILE) else 0
+        if cls.dim is None:
+            if files or size:
+                logging.warning("VectorManager >> Missing dimension, resetting.")
+                return False
+        elif size != len(files) * cls.dim * 4:
+            logging.warning("VectorManager >> Vectors and rows mismatch, resetting.")
+            return False
+
+        cls.files = files
+        cls.rows = {file: file_rows for file, file_rows in rows.items() if file_rows}
+        cls.dead = files.count(None)
+        cls.map_vectors()
+        cls.start_training()
+        return True
+
+    @classmethod
+    def reset(cls):
+        """
+        Drop every vector, for instance when the embedding model changed.
+        """
+        logging.info("VectorManager >> Resetting vector store.")
+        for path in [VECTORS_FILE, ROWS_FILE]:
+            if os.path.exists(path):
+                os.remove(path)
+        cls.model = get_setting("embedding_model")
+        cls.dim = None
+        cls.vectors = None
+        cls.files = []
+        cls.rows = {}
+        cls.dead = 0
+        cls.epoch += 1
+        cls.centroids = None
+        cls.lists = []
+        cls.trained_size = 0
+        cls.write_meta()
+
+    @classmethod
+    def write_meta(cls):
+        with open(META_FILE, "w") as f:
+            json.dump({"model": cls.model, "dim": cls.dim}, f)
+
+    @classmethod
+    def map_vectors(cls):
+        if cls.files:
+            cls.vectors = np.memmap(
+                VECTORS_FILE,
+                dtype=np.float32,
+                mode="r",
+                shape=(len(cls.files), cls.dim),
+            )
+        else:
+            cls.vectors = None
+
+    @classmethod
+    def log(cls, entry):
+        with open(ROWS_FILE, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    @classmethod
+    def notify_change(cls):
+        """
+        Invalidate the cached hybrid search results after vectors changed.
+        """
+        # FileManager imports VectorManager
+        from controllers.FileManager import FileManager
+
+        FileManager.notify_change()
+
+    @classmethod
+    def check_model(cls):
+        """
+        Reset the store and embed every summarized file again if the
+        embedding model setting changed.
+        """
+        with cls.lock:
+            if cls.model == get_setting("embedding_model"):
+                return
+            cls.reset()
+        backfill_thread = Thread(target=cls.backfill)
+        backfill_thread.daemon = True
+        backfill_thread.start()
+
+    @classmethod
+    def backfill(cls):
+        """
+        Embed the summarized files missing from the store.
+        """
+        db = get_db()
+        try:
+            files = [file for (file,) in db.query(Summary.file).all()]
+        finally:
+            db.close()
+
+        missing = [file for file in files if file not in cls.rows]
+        if missing:
+            logging.info(f"VectorManager >> Embedding {len(missing)} files...")
+        for file in missing:
+            cls.index_file(file)
+
+    @classmethod
+    def make_chunks(cls, file):
+        """
+        Get the texts to embed for a file: its summary then its content.
+        """
+        db = get_db()
+        try:
+            summary = db.query(Summary).filter(Summary.file == file).first()
+        finally:
+            db.close()
+
+        chunks = chunk_text(summary.summary) if summary and summary.summary else []
+        content = read_content(file, include_note=False)
+        if content:
+            chunks.extend(chunk_text(content)[: MAX_CHUNKS - len(chunks)])
+        return chunks
+
+    @classmethod
+    def index_file(cls, file):
+        """
+        Embed a file and replace its vectors in the store.
+        """
+        try:
+            cls.check_model()
+            chunks = cls.make_chunks(file) if os.path.exists(file) else []
+            if not chunks:
+                cls.remove_file(file)
+                return
+            vectors = embed(chunks)
+
+            with cls.lock:
+                if cls.dim is None:
+                    cls.dim = vectors.shape[1]
+                    cls.write_meta()
+                elif vectors.shape[1] != cls.dim:
+                    raise Exception(
+                        f"Embedding dimension {vectors.shape[1]} doesn't match the store ({cls.dim})"
+                    )
+                cls.add_rows(file, vectors)
+            cls.notify_change()
+        except Exception as e:
+            logging.error(f"Error embedding file {file}: {str(e)}")
+            logging.error(traceback.format_exc())
+
+    @classmethod
+    def copy_file(cls, file, new_file):
+        """
+        Give a file with the same content the vectors of another one, returns
+        False if it has none.
+        """
+        with cls.lock:
+            rows = cls.rows.get(file)
+            if not rows:
+                return False
+            cls.add_rows(new_file, np.array(cls.vectors[rows]))
+        cls.notify_change()
+        return True
+
+    @classmethod
+    def add_rows(cls, file, vectors):
+        """
+        Append the vectors of a file to the store, replacing its previous ones.
+        """
+        cls.delete_rows(file)
+
+        start = len(cls.files)
+        with open(VECTORS_FILE, "ab") as f:
+            f.write(vectors.tobytes())
+        cls.log({"add": file, "rows": len(vectors)})
+        cls.files.extend([file] * len(vectors))
+        cls.rows[file] = list(range(start, len(cls.files)))
+        cls.map_vectors()
+
+        alive = len(cls.files) - cls.dead
+        if cls.dead > alive:
+            cls.compact()
+        elif cls.centroids is not None:
+            for row, cluster in zip(
+                cls.rows[file], np.argmax(vectors @ cls.centroids.T, axis=1)
+            ):
+                cls.lists[cluster].append(row)
+        if alive >= max(IVF_MIN_VECTORS, 2 * cls.trained_size):
+            cls.start_training()
+
+    @classmethod
+    def delete_rows(cls, file):
+        rows = cls.rows.pop(file, None)
+        if rows:
+            for row in rows:
+                cls.files[row] = None
+            cls.dead += len(rows)
+            cls.log({"delete": file})
+            # IVF lists keep the dead rows, they are skipped at search time
+
+    @classmethod
+    def remove_file(cls, file):
+        """
+        Remove the vectors of a file.
+        """
+        with cls.lock:
+            cls.delete_rows(file)
+        cls.notify_change()
+
+    @classmethod
+    def move_file(cls, file, new_file):
+        """
+        Move the vectors of a file to its new path.
+        """
+        with cls.lock:
+            rows = cls.rows.pop(file, None)
+            if rows:
+                cls.delete_rows(new_file)
+                for row in rows:
+                    cls.files[row] = new_file
+                cls.rows[new_file] = rows
+                cls.log({"move": [file, new_file]})
+        cls.notify_change()
+
+    @classmethod
+    def compact(cls):
+        """
+        Rewrite the store without the rows of deleted files.
+        The IVF is dropped, searches scan every vector until it is retrained.
+        """
+        if not cls.dead:
+            return
+        alive = [row for row, file in enumerate(cls.files) if file is not None]
+        vectors = np.array(cls.vectors[alive]) if alive else None
+        files = [cls.files[row] for row in alive]
+
+        with open(f"{VECTORS_FILE}.tmp", "wb") as f:
+            if vectors is not None:
+                f.write(vectors.tobytes())
+        with open(f"{ROWS_FILE}.tmp", "w") as f:
+            for file, group in groupby(files):
+                f.write(json.dumps({"add": file, "rows": len(list(group))}) + "\n")
+        os.replace(f"{VECTORS_FILE}.tmp", VECTORS_FILE)
+        os.replace(f"{ROWS_FILE}.tmp", ROWS_FILE)
+
+        cls.files = files
+        cls.rows = {}
+        for row, file in enumerate(files):
+            cls.rows.setdefault(file, []).append(row)
+        cls.dead = 0
+        cls.epoch += 1
+        cls.centroids = None
+        cls.lists = []
+        cls.trained_size = 0
+        cls.map_vectors()
+        cls.start_training()
+
+    @classmethod
+    def start_training(cls):
+        """
+        Train the IVF in the background, unless a training is running.
+        """
+        if not cls.train_lock.locked():
+            Thread(target=cls.train, daemon=True).start()
+
+    @classmethod
+    def train(cls):
+        """
+        Cluster the vectors with spherical k-means and build the IVF lists.
+        The clustering runs on a snapshot of the store without holding the lock,
+        so searches go on meanwhile. The rows added since are assigned before the
+        lists are swapped in.
+        """
+        if not cls.train_lock.acquire(blocking=False):
+            return
+        try:
+            while True:
+                with cls.lock:
+                    vectors, epoch = cls.vectors, cls.epoch
+                    alive = np.array(
+                        [row for row, file in enumerate(cls.files) if file is not None],
+                        dtype=int,
+                    )
+                if len(alive) < IVF_MIN_VECTORS:
+                    return
+                centroids, lists = kmeans(vectors, alive)
+
+                with cls.lock:
+                    if cls.epoch != epoch:
+                        continue  # compacted or reset meanwhile, row ids changed
+                    added = [
+                        row
+                        for row in range(len(vectors), len(cls.files))
+                        if cls.files[row] is not None
+                    ]
+                    if added:
+                        for row, list_id in zip(
+                            added, np.argmax(cls.vectors[added] @ centroids.T, axis=1)
+                        ):
+                            lists[list_id].append(row)
+                    cls.centroids = centroids
+                    cls.lists = lists
+                    cls.trained_size = len(alive) + len(added)
+                break
+            logging.info(
+                f"VectorManager >> Trained IVF with {len(lists)} lists over {len(alive)} vectors."
+            )
+        finally:
+            cls.train_lock.release()
+
+    @classmethod
+    def search(cls, text: str, limit: int, allowed=None):
+        """
+        Find the files whose chunks are the closest to the text.
+        Returns (file, score) pairs, best first.
+        """
+        cls.check_model()
+        with cls.lock:
+            if cls.vectors is None:
+                return []
+        query = embed([text])[0]
+
+        with cls.lock:
+            if cls.vectors is None or len(query) != cls.dim:
+                return []
+
+            allowed_rows = None
+            if allowed is not None:
+                allowed_rows = [
+                    row for file in allowed for row in cls.rows.get(file, [])
+                ]
+            if cls.centroids is None:
+                candidates = np.arange(len(cls.files))
+            else:
+                probes = np.argsort(cls.centroids @ query)[-IVF_PROBES:]
+                candidates = np.array(
+                    [row for probe in probes for row in cls.lists[probe]], dtype=int
+                )
+            if allowed_rows is not None and len(allowed_rows) <= len(candidates):
+                candidates = np.array(allowed_rows, dtype=int)  # exact scan is cheaper
+                allowed = None
+            if len(candidates) == 0:
+                return []
+
+            candidates = np.sort(candidates)
+            scores = cls.vectors[candidates] @ query
+            best = {}
+            for row, score in zip(candidates, scores):
+                file = cls.files[row]
+                if file is None or (allowed is not None and file not in allowed):
+                    continue
+                if score > best.get(file, -1.0):
+                    best[file] = float(score)
+
+        return sorted(best.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    @classmethod
+    def stats(cls):
+        with cls.lock:
+            return {
+                "model": cls.model,
+                "dim": cls.dim,
+                "files": len(cls.rows),
+                "vectors": len(cls.files) - cls.dead,
+                "rows": len(cls.files),
+                "lists": len(cls.lists),
+            }
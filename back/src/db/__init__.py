@@ -1,7 +1,10 @@
 import logging
 from db.db import DB, get_db
+from sqlalchemy import Enum, inspect, text
 from db.models import (
     Setting,
+    File,
+    Signature,
     Note,
     OCR,
     OCRTask,
@@ -27,6 +30,58 @@ from db.models import (
     KanbanColumn,
     KanbanColumnTask
 )
+from db.models import Base
+
+
+def migrate():
+    """
+    Add the columns missing from existing tables, as create_all only creates
+    missing tables. Added columns must be nullable or have a server default.
+    Enum columns missing new values are widened and missing indexes created.
+    """
+    engine = DB().engine
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {
+                column["name"]: column["type"]
+                for column in inspector.get_columns(table.name)
+            }
+            added = [column for column in table.columns if column.name not in existing]
+            for column in added:
+                column_type = column.type.compile(dialect=engine.dialect)
+                default = (
+                    f" DEFAULT {column.server_default.arg}"
+                    if column.server_default is not None
+                    else ""
+                )
+                connection.execute(
+                    text(
+                        f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}{default}"
+                    )
+                )
+                logging.info(f"Added column {table.name}.{column.name}")
+            for column in table.columns:
+                enums = getattr(existing.get(column.name), "enums", None)
+                if not isinstance(column.type, Enum) or not enums:
+                    continue
+                if set(column.type.enums) - set(enums):
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    null = "NULL" if column.nullable else "NOT NULL"
+                    connection.execute(
+                        text(
+                            f"ALTER TABLE {quote(table.name)} MODIFY COLUMN {quote(column.name)} {column_type} {null}"
+                        )
+                    )
+                    logging.info(f"Widened column {table.name}.{column.name}")
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(connection)
+                    logging.info(f"Added index {index.name}")
 
 
 def create_default_values():
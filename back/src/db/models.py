@@ -1,7 +1,18 @@
 import uuid
 from enum import Enum
 
-from sqlalchemy import TEXT, Column, DateTime, Float, ForeignKey, String
+from sqlalchemy import (
+    TEXT,
+    BigInteger,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+)
 from sqlalchemy import Enum as SQLEnum
 from sqlalchemy.orm import declarative_base, mapped_column
 
@@ -22,6 +33,29 @@ class Setting(Base):
     value = Column(TEXT, nullable=False)
 
 
+class File(Base):
+    __tablename__ = "File"
+
+    path = Column(String(512), primary_key=True, index=True)
+    date = Column(DateTime, nullable=True, index=True)
+    subfolder = Column(String(256), nullable=True, index=True)
+    mime = Column(String(128), nullable=False, index=True)
+    size = Column(BigInteger, nullable=False)
+    mtime = Column(DateTime, nullable=False)
+    hash = Column(String(64), nullable=True, index=True)
+
+    # Date partition index: a date range query only reads the matching slice.
+    __table_args__ = (Index("ix_File_date_path", "date", "path"),)
+
+
+class Signature(Base):
+    __tablename__ = "Signature"
+
+    file = Column(String(512), primary_key=True, index=True)
+    date = Column(DateTime, nullable=False)
+    signature = Column(LargeBinary, nullable=False)  # MinHash of the file text
+
+
 class Note(Base):
     __tablename__ = "Note"
 
@@ -35,6 +69,7 @@ class TaskStateEnum(Enum):
     IN_PROGRESS = "IN_PROGRESS"
     COMPLETED = "COMPLETED"
     FAILED = "FAILED"
+    CANCELLED = "CANCELLED"
 
 
 class OCR(Base):
@@ -48,6 +83,10 @@ class OCR(Base):
 
 class OCRTask(Base):
     __tablename__ = "OCRTask"
+    __table_args__ = (
+        Index("ix_OCRTask_claim", "state", "priority", "due", "added"),  # scheduler
+        Index("ix_OCRTask_completed", "completed"),  # indexing of completed jobs
+    )
 
     file = Column(String(512), primary_key=True, index=True)
     state = Column(
@@ -56,6 +95,10 @@ class OCRTask(Base):
     added = Column(DateTime, primary_key=True)
     completed = Column(DateTime, nullable=True)
     result = Column(TEXT, nullable=True)
+    lease = Column(DateTime, nullable=True)  # IN_PROGRESS until, renewed while running
+    worker = Column(String(128), nullable=True)  # host:pid holding the lease
+    priority = Column(Integer, nullable=True)  # lane, see SchedulerManager
+    due = Column(DateTime, nullable=True)  # order within the lane, with aging
 
 
 class Summary(Base):
@@ -69,6 +112,10 @@ class Summary(Base):
 
 class SummaryTask(Base):
     __tablename__ = "SummaryTask"
+    __table_args__ = (
+        Index("ix_SummaryTask_claim", "state", "priority", "due", "added"),  # scheduler
+        Index("ix_SummaryTask_completed", "completed"),  # indexing of completed jobs
+    )
 
     file = Column(String(512), primary_key=True, index=True)
     state = Column(
@@ -77,6 +124,10 @@ class SummaryTask(Base):
     added = Column(DateTime, primary_key=True)
     completed = Column(DateTime, nullable=True)
     result = Column(TEXT, nullable=True)
+    lease = Column(DateTime, nullable=True)  # IN_PROGRESS until, renewed while running
+    worker = Column(String(128), nullable=True)  # host:pid holding the lease
+    priority = Column(Integer, nullable=True)  # lane, see SchedulerManager
+    due = Column(DateTime, nullable=True)  # order within the lane, with aging
 
 
 class Transcription(Base):
@@ -89,6 +140,10 @@ class Transcription(Base):
 
 class TranscriptionTask(Base):
     __tablename__ = "TranscriptionTask"
+    __table_args__ = (
+        Index("ix_TranscriptionTask_claim", "state", "priority", "due", "added"),  # scheduler
+        Index("ix_TranscriptionTask_completed", "completed"),  # indexing of completed jobs
+    )
 
     file = Column(String(512), primary_key=True, index=True)
     state = Column(
@@ -97,6 +152,10 @@ class TranscriptionTask(Base):
     added = Column(DateTime, primary_key=True)
     completed = Column(DateTime, nullable=True)
     result = Column(TEXT, nullable=True)
+    lease = Column(DateTime, nullable=True)  # IN_PROGRESS until, renewed while running
+    worker = Column(String(128), nullable=True)  # host:pid holding the lease
+    priority = Column(Integer, nullable=True)  # lane, see SchedulerManager
+    due = Column(DateTime, nullable=True)  # order within the lane, with aging
 
 
 class Tag(Base):
@@ -6,22 +6,27 @@ import traceback
 from threading import Thread
 
 import uvicorn
+from controllers.CatalogManager import CatalogManager
 from controllers.ChatManager import ChatManager
 from controllers.FileManager import FileManager
-from controllers.OCRManager import OCRManager
-from controllers.SummarizeManager import SummarizeManager
-from controllers.TranscriptionManager import TranscriptionManager
-from db import DB, ProjectFile, TagFile, create_default_values, get_db
-from db.models import Base, CalendarRecord
+from controllers.IngestManager import IngestManager
+from controllers.SchedulerManager import SchedulerManager
+from controllers.SimilarityManager import SimilarityManager
+from controllers.SuggestManager import SuggestManager
+from controllers.VectorManager import VectorManager
+from db import DB, ProjectFile, TagFile, create_default_values, get_db, migrate
+from db.models import Base, CalendarRecord, File
 from fastapi import FastAPI
 from pillow_heif import register_heif_opener
 from sqlalchemy import func
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
-from utils import walk_files
 
 app = FastAPI()
 
+# Processing jobs run in the API process unless worker containers run them
+EMBEDDED_WORKERS = os.environ.get("EMBEDDED_WORKERS", "true").lower() != "false"
+
 
 class LoggingMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
@@ -103,7 +108,9 @@ def ocr_health():
     """
     Health check for the OCR service.
     """
-    if ocr_thread.is_alive():
+    if not EMBEDDED_WORKERS:
+        return "EXTERNAL"
+    if scheduler_thread.is_alive():
         return "RUNNING"
     else:
         return "DEAD"
@@ -114,7 +121,9 @@ def transcription_health():
     """
     Health check for the transcription service.
     """
-    if transcription_thread.is_alive():
+    if not EMBEDDED_WORKERS:
+        return "EXTERNAL"
+    if scheduler_thread.is_alive():
         return "RUNNING"
     else:
         return "DEAD"
@@ -125,7 +134,9 @@ def summarize_health():
     """
     Health check for the summarization service.
     """
-    if summarize_thread.is_alive():
+    if not EMBEDDED_WORKERS:
+        return "EXTERNAL"
+    if scheduler_thread.is_alive():
         return "RUNNING"
     else:
         return "DEAD"
@@ -163,7 +174,7 @@ def du_size(path: str) -> int:
 def metrics():
     db = get_db()
     try:
-        files = walk_files()
+        files = CatalogManager.list_paths()
         calendars = db.query(CalendarRecord).all()
         # Count files per project
         files_per_project = dict(
@@ -211,7 +222,7 @@ def metrics():
         )
         ollama_size = du_size("/ollama")
         mysql_size = du_size("/mysql")
-        files_size = du_size("/shared")
+        files_size = db.query(func.sum(File.size)).scalar() or 0
 
         # Mount size at /shared (total capacity, not free)
         total, used, free = shutil.disk_usage("/shared")
@@ -252,22 +263,27 @@ if __name__ == "__main__":
         level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
     )
     Base.metadata.create_all(bind=DB().engine)
+    migrate()
     create_default_values()
 
     FileManager.setup()
+    VectorManager.setup()
+    SuggestManager.setup()
+    SimilarityManager.setup()
 
-    register_heif_opener()
-    transcription_thread = Thread(target=TranscriptionManager.start_thread)
-    transcription_thread.daemon = True  # Daemonize thread
-    transcription_thread.start()
-
-    summarize_thread = Thread(target=SummarizeManager.start_thread)
-    summarize_thread.daemon = True  # Daemonize thread
-    summarize_thread.start()
+    ingest_thread = Thread(target=IngestManager.start_thread)
+    ingest_thread.daemon = True  # Daemonize thread
+    ingest_thread.start()
 
-    ocr_thread = Thread(target=OCRManager.start_thread)
-    ocr_thread.daemon = True  # Daemonize thread
-    ocr_thread.start()
+    register_heif_opener()
+    if EMBEDDED_WORKERS:
+        scheduler_thread = Thread(target=SchedulerManager.start_thread)
+        scheduler_thread.daemon = True  # Daemonize thread
+        scheduler_thread.start()
+
+    follow_thread = Thread(target=SchedulerManager.follow)
+    follow_thread.daemon = True  # Daemonize thread
+    follow_thread.start()
 
     chat_thread = Thread(target=ChatManager.start_thread)
     chat_thread.daemon = True  # Daemonize thread
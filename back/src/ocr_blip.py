@@ -3,21 +3,34 @@ import torch
 from PIL import Image
 from transformers import BlipProcessor, BlipForConditionalGeneration
 
-def main(image_path):
+def load():
     device = "cuda" if torch.cuda.is_available() else "cpu"
 
     processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
     model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
     model.to(device)
+    return processor, model, device
 
+def caption(processor, model, device, image_path):
     image = Image.open(image_path).convert("RGB")
     inputs = processor(images=image, return_tensors="pt")
     inputs = {k: v.to(device) for k, v in inputs.items()}
 
     output = model.generate(**inputs, max_new_tokens=50)
-    description = processor.tokenizer.decode(output[0], skip_special_tokens=True)
-    print(description)
+    return processor.tokenizer.decode(output[0], skip_special_tokens=True)
+
+def main(image_path):
+    print(caption(*load(), image_path))
+
+def serve():
+    from tools.worker import serve
+
+    processor, model, device = load()
+    serve(lambda file: caption(processor, model, device, file))
 
 if __name__ == "__main__":
-    image_path = sys.argv[1]
-    main(image_path)
\ No newline at end of file
+    if sys.argv[1] == "--serve":
+        serve()
+    else:
+        image_path = sys.argv[1]
+        main(image_path)
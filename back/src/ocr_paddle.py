@@ -4,12 +4,26 @@ import sys
 from paddleocr import PaddleOCR
 
 
+def load():
+    return PaddleOCR(use_angle_cls=True, lang="latin", show_log=False)
+
+
 def main(image_path):
-    ocr = PaddleOCR(use_angle_cls=True, lang="latin", show_log=False)
+    ocr = load()
     result = ocr.ocr(image_path, cls=True)
     print(json.dumps(result[0]))
 
 
+def serve():
+    from tools.worker import serve
+
+    ocr = load()
+    serve(lambda file: ocr.ocr(file, cls=True)[0])
+
+
 if __name__ == "__main__":
-    image_path = sys.argv[1]
-    main(image_path)
+    if sys.argv[1] == "--serve":
+        serve()
+    else:
+        image_path = sys.argv[1]
+        main(image_path)
@@ -7,7 +7,16 @@ def main(audio_path):
     print(pytesseract.image_to_string(audio_path, lang="eng+fra"))
 
 
+def serve():
+    from tools.worker import serve
+
+    serve(lambda file: pytesseract.image_to_string(file, lang="eng+fra"))
+
+
 if __name__ == "__main__":
-    audio_path = sys.argv[1]
+    if sys.argv[1] == "--serve":
+        serve()
+    else:
+        audio_path = sys.argv[1]
 
-    main(audio_path)
+        main(audio_path)
@@ -1,11 +1,20 @@
 import json
 import re
-from typing import Set
+import socket
+from contextlib import contextmanager
+from threading import Event, Thread
+from typing import List, Set
 
 import requests
 from bs4 import BeautifulSoup
 from views.settings import get_setting
 
+CANCEL_CHECK_INTERVAL = 1  # seconds between checks of a cancel event
+
+
+class LLMCancelled(Exception):
+    pass
+
 
 def parse_token_count(size_str: str) -> int:
     size_str = size_str.strip().upper()
@@ -41,16 +50,58 @@ def get_context_size(model_name: str, default: int = 4096) -> str:
     return default
 
 
+@contextmanager
+def cancellable(response, cancel_event):
+    """
+    Shut the connection of a streamed response down once cancel_event is set,
+    which also stops the generation on the server, and raise LLMCancelled.
+    Closing the response wouldn't do, it waits for the blocked read.
+    """
+    if cancel_event is None:
+        yield
+        return
+
+    done = Event()
+
+    def watch():
+        while not done.is_set():
+            if cancel_event.wait(CANCEL_CHECK_INTERVAL):
+                connection = response.raw.connection
+                if connection is not None and connection.sock is not None:
+                    connection.sock.shutdown(socket.SHUT_RDWR)
+                return
+
+    Thread(target=watch, daemon=True).start()
+    try:
+        yield
+    except Exception:
+        if cancel_event.is_set():
+            raise LLMCancelled("LLM request cancelled")
+        raise
+    finally:
+        done.set()
+    if cancel_event.is_set():
+        raise LLMCancelled("LLM request cancelled")
+
+
 def request_llm(
     setting_prefix: str,
     prompt: str,
     input_text: str = None,
     stream_callback=None,
+    cancel_event: Event = None,
+    json_output: bool = False,
 ) -> Set[str]:
     """
     Request a language model (LLM) to process the prompt and return the response.
     Returns a tuple of (AI type, model, response).
+    Setting cancel_event stops the request, which raises LLMCancelled.
+    With json_output the model is asked to answer with a JSON object only, the
+    prompt must still describe it.
     """
+    if cancel_event is not None and cancel_event.is_set():
+        raise LLMCancelled("LLM request cancelled")
+
     ai_type = get_setting(f"{setting_prefix}_type")
     model = get_setting(f"{setting_prefix}_model")
 
@@ -60,20 +111,23 @@ def request_llm(
     # LLAMA
     if ai_type == "llama":
         ollama_server = get_setting("ollama_server", "http://ollama:11434")
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": True,
+            "options": {
+                "num_ctx": parse_token_count(get_context_size(model)),
+                "num_keep": 2048,
+            },
+        }
+        if json_output:
+            payload["format"] = "json"
         with requests.post(
             f"{ollama_server}/api/generate",
-            json={
-                "model": model,
-                "prompt": prompt,
-                "stream": True,
-                "options": {
-                    "num_ctx": parse_token_count(get_context_size(model)),
-                    "num_keep": 2048,
-                },
-            },
+            json=payload,
             stream=True,
             timeout=3600,
-        ) as response:
+        ) as response, cancellable(response, cancel_event):
             if response.status_code != 200:
                 raise Exception(f"LLM error {response.status_code}: {response.text}")
 
@@ -105,8 +159,12 @@ def request_llm(
             "messages": [{"role": "user", "content": prompt}],
             "stream": True,
         }
+        if json_output:
+            payload["response_format"] = {"type": "json_object"}
         url = "https://api.mistral.ai/v1/chat/completions"
-        with requests.post(url, headers=headers, json=payload, stream=True) as response:
+        with requests.post(
+            url, headers=headers, json=payload, stream=True
+        ) as response, cancellable(response, cancel_event):
             if response.status_code != 200:
                 raise Exception(
                     f"Mistral error {response.status_code}: {response.text}"
@@ -142,9 +200,13 @@ def request_llm(
             "messages": [{"role": "user", "content": prompt}],
             "stream": True,
         }
+        if json_output:
+            payload["response_format"] = {"type": "json_object"}
         url = "https://api.openai.com/v1/chat/completions"
 
-        with requests.post(url, headers=headers, json=payload, stream=True) as response:
+        with requests.post(
+            url, headers=headers, json=payload, stream=True
+        ) as response, cancellable(response, cancel_event):
             if response.status_code != 200:
                 raise Exception(f"OpenAI error {response.status_code}: {response.text}")
 
@@ -169,6 +231,8 @@ def request_llm(
         api_key = get_setting("gemini_api_key")
         url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
         payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        if json_output:
+            payload["generationConfig"] = {"responseMimeType": "application/json"}
 
         response = requests.post(url, json=payload)
         if response.status_code != 200:
@@ -185,3 +249,19 @@ def request_llm(
 
     else:
         raise ValueError(f"Unsupported AI type: {ai_type}")
+
+
+def request_embeddings(texts: List[str]) -> List[List[float]]:
+    """
+    Embed texts with the embedding model served by the Ollama server.
+    Returns one vector per text.
+    """
+    ollama_server = get_setting("ollama_server", "http://ollama:11434")
+    response = requests.post(
+        f"{ollama_server}/api/embed",
+        json={"model": get_setting("embedding_model"), "input": texts},
+        timeout=600,
+    )
+    if response.status_code != 200:
+        raise Exception(f"Embedding error {response.status_code}: {response.text}")
+    return response.json()["embeddings"]
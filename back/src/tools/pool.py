@@ -0,0 +1,43 @@
+import time
+from threading import Thread
+
+from views.settings import get_setting
+
+POOL_CHECK_INTERVAL = 10  # seconds between checks of the concurrency setting
+
+
+class WorkerPool:
+    """
+    Threads running the same job loop, as many as a concurrency setting.
+    Each thread is given a slot number and returns once the setting drops
+    to it or below, so the setting bounds the number of jobs in flight.
+    """
+
+    def __init__(self, name, setting, target):
+        self.name = name
+        self.setting = setting
+        self.target = target
+        self.threads = {}  # slot -> thread
+
+    def size(self):
+        return max(1, int(get_setting(self.setting)))
+
+    def is_retired(self, slot):
+        return slot >= self.size()
+
+    def run(self):
+        """
+        Start the threads and keep their number in line with the setting,
+        restarting the ones that died.
+        """
+        while True:
+            for slot in range(self.size()):
+                thread = self.threads.get(slot)
+                if thread is None or not thread.is_alive():
+                    thread = Thread(
+                        target=self.target, args=(slot,), name=f"{self.name}-{slot}"
+                    )
+                    thread.daemon = True
+                    thread.start()
+                    self.threads[slot] = thread
+            time.sleep(POOL_CHECK_INTERVAL)
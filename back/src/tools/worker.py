@@ -0,0 +1,156 @@
+import json
+import logging
+import os
+import select
+import subprocess
+import sys
+import time
+from threading import Lock
+
+WORKER_START_TIMEOUT = 600  # seconds, first start may download the model
+WORKER_JOB_TIMEOUT = 1800  # seconds, default for a job, None waits for it
+
+
+def serve(handle):
+    """
+    Worker side: answer the jobs read as JSON lines on stdin with one JSON line
+    each on stdout, until stdin is closed.
+    Libraries printing on stdout would corrupt the answers, so stdout is
+    redirected to stderr and the answers go through a duplicate of it.
+    """
+    output = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    def answer(response):
+        output.write(json.dumps(response) + "\n")
+        output.flush()
+
+    answer({"ready": True})
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            answer({"result": handle(**json.loads(line))})
+        except Exception as e:
+            answer({"error": f"{type(e).__name__}: {str(e)}"})
+
+
+class ModelWorker:
+    """
+    Long-lived subprocess keeping a model loaded between jobs.
+    The command is run with --serve (see serve) and jobs are sent one at a
+    time. A crashed or stuck worker is killed and started again on the next
+    job, so a bad file only fails its own job.
+    """
+
+    def __init__(
+        self,
+        name,
+        command,
+        start_timeout=WORKER_START_TIMEOUT,
+        job_timeout=WORKER_JOB_TIMEOUT,
+    ):
+        self.name = name
+        self.command = command
+        self.start_timeout = start_timeout
+        self.job_timeout = job_timeout
+        self.process = None
+        self.buffer = b""
+        self.lock = Lock()
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        logging.info(f"{self.name} >> Starting worker...")
+        self.process = subprocess.Popen(
+            self.command + ["--serve"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            bufsize=0,
+        )
+        self.buffer = b""
+        if not self.read(self.start_timeout).get("ready"):
+            raise RuntimeError(f"{self.name} worker did not start")
+        logging.info(f"{self.name} >> Worker ready.")
+
+    def read(self, timeout):
+        """
+        Read the next answer of the worker, skipping what its libraries print
+        on stdout before serve redirects it. A None timeout waits forever.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            while b"\n" not in self.buffer:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                ready = (remaining is None or remaining > 0) and select.select(
+                    [self.process.stdout], [], [], remaining
+                )[0]
+                if not ready:
+                    raise TimeoutError(f"{self.name} worker timed out after {timeout}s")
+                chunk = os.read(self.process.stdout.fileno(), 65536)
+                if not chunk:
+                    raise RuntimeError(
+                        f"{self.name} worker exited with code {self.process.wait()}"
+                    )
+                self.buffer += chunk
+            line, self.buffer = self.buffer.split(b"\n", 1)
+            try:
+                message = json.loads(line)
+            except ValueError:
+                message = None
+            if isinstance(message, dict):
+                return message
+            logging.debug(f"{self.name} >> {line.decode(errors='replace')}")
+
+    def run(self, **job):
+        """
+        Run a job on the worker, starting it if needed, and return its result.
+        """
+        with self.lock:
+            try:
+                if not self.is_alive():
+                    self.start()
+                self.process.stdin.write((json.dumps(job) + "\n").encode())
+                self.process.stdin.flush()
+                response = self.read(self.job_timeout)
+            except Exception:
+                self.kill()
+                raise
+        if "error" in response:
+            raise RuntimeError(f"{self.name} failed: {response['error']}")
+        return response["result"]
+
+    def stop(self):
+        """
+        Stop the worker, freeing its model.
+        """
+        with self.lock:
+            self.kill()
+
+    def terminate(self):
+        """
+        Kill the worker from another thread, failing the job it runs. Unlike
+        stop it doesn't wait for the job, the worker starts again on the next.
+        """
+        process = self.process
+        if process is not None and process.poll() is None:
+            logging.info(f"{self.name} >> Terminating worker...")
+            process.kill()
+
+    def kill(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            logging.info(f"{self.name} >> Stopping worker...")
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process.stdout.close()
+        self.process = None
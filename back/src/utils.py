@@ -1,11 +1,15 @@
+import hashlib
 import json
 import logging
 import mimetypes
 import os
+import tempfile
+from datetime import datetime
 
 import docx
 from db import (
     OCR,
+    File,
     Note,
     Project,
     ProjectFile,
@@ -17,6 +21,14 @@ from db import (
 )
 from PyPDF2 import PdfReader
 
+TEXT_STORE_PATH = "/data/text"
+WORD_MIMES = (
+    "application/msword",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+)
+# Files being written by copy tools (rsync, browsers, editors) and uploads
+TEMPORARY_SUFFIXES = (".tmp", ".part", ".crdownload", ".download", ".swp")
+
 
 def guess_mime(file_name: str) -> str:
     """
@@ -45,24 +57,87 @@ def guess_mime(file_name: str) -> str:
     return mime.strip() if mime is not None else "application/octet-stream"
 
 
-def read_content(
-    file: str,
-    force_read: bool = False,
-    include_note: bool = True,
-    include_projects: bool = False,
-    include_tags: bool = False,
-    include_summary: bool = False,
-) -> str:
+def get_content_hash(file: str) -> str:
     """
-    Read the content of a file and return it as a string.
+    Get the content hash of a file from the catalog, or compute it when the
+    file is not cataloged or changed since.
     """
-    content = None
-    projects = None
-    tags = None
-    note = None
-    summary = None
-    keywords = None
+    stat = os.stat(file)
+    db = get_db()
+    try:
+        entry = db.query(File).filter(File.path == file).first()
+    finally:
+        db.close()
+
+    if (
+        entry is not None
+        and entry.hash
+        and entry.size == stat.st_size
+        and entry.mtime == datetime.fromtimestamp(int(stat.st_mtime))
+    ):
+        return entry.hash
+    return hash_file(file)
+
+
+def extract_pages(file: str, mime: str = None):
+    """
+    Extract the text of a PDF or Word file as a list of pages.
+    The extracted text is stored once per content hash under /data/text and
+    reused until the file content changes.
+    """
+    mime = mime or guess_mime(file)
+    if mime != "application/pdf" and mime not in WORD_MIMES:
+        return None
+
+    hash = get_content_hash(file)
+    path = os.path.join(TEXT_STORE_PATH, hash[:2], f"{hash}.json")
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["pages"]
+
+    if mime == "application/pdf":
+        logging.info(f"Extracting PDF text of {file}")
+        pages = [page.extract_text() or "" for page in PdfReader(file).pages]
+    else:
+        logging.info(f"Extracting DOCX text of {file}")
+        doc = docx.Document(file)
+        pages = ["\n".join(p.text for p in doc.paragraphs)]
+
+    # Rebuild workers can extract the same content at once, each writes its
+    # own temporary file, named after the hash so pruning keeps it
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        "w",
+        encoding="utf-8",
+        dir=os.path.dirname(path),
+        prefix=f"{hash}.",
+        suffix=".tmp",
+        delete=False,
+    ) as f:
+        json.dump({"file": file, "pages": pages}, f)
+    os.replace(f.name, path)
+    return pages
 
+
+def prune_text_store(hashes):
+    """
+    Remove the extracted text of contents that are no longer in /shared.
+    """
+    removed = 0
+    for dp, _, filenames in os.walk(TEXT_STORE_PATH):
+        for filename in filenames:
+            if filename.split(".")[0] not in hashes:
+                os.remove(os.path.join(dp, filename))
+                removed += 1
+    return removed
+
+
+def extract_text(file: str, force_read: bool = False) -> str:
+    """
+    Extract the raw text of a file: the OCR and caption of an image, the
+    transcription of an audio or video, the text of a text, PDF or Word file.
+    """
+    content = None
     db = get_db()
     try:
         mime = guess_mime(file)
@@ -92,25 +167,41 @@ def read_content(
             with open(file, "r", encoding="utf-8", errors="ignore") as f:
                 content = f.read()
 
-        # MARK: PDF
-        elif mime == "application/pdf":
-            logging.info("SUMMARY >> Attempting to read PDF content.")
-            content = "\n".join(
-                page.extract_text() or "" for page in PdfReader(file).pages
-            )
-
-        # MARK: Word
-        elif mime in (
-            "application/msword",
-            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        ):
-            logging.info("SUMMARY >> Attempting to read DOCX content.")
-            doc = docx.Document(file)
-            content = "\n".join(p.text for p in doc.paragraphs)
+        # MARK: PDF and Word
+        elif mime == "application/pdf" or mime in WORD_MIMES:
+            logging.info("SUMMARY >> Attempting to read document content.")
+            content = "\n".join(extract_pages(file, mime))
 
         elif force_read:
             with open(file, "r") as f:
                 content = f.read()
+    finally:
+        db.close()
+    return content
+
+
+def read_content(
+    file: str,
+    force_read: bool = False,
+    include_note: bool = True,
+    include_projects: bool = False,
+    include_tags: bool = False,
+    include_summary: bool = False,
+) -> str:
+    """
+    Read the content of a file and return it as a string.
+    """
+    content = None
+    projects = None
+    tags = None
+    note = None
+    summary = None
+    keywords = None
+
+    db = get_db()
+    try:
+        mime = guess_mime(file)
+        content = extract_text(file, force_read)
 
         if include_projects:
             projects = (
@@ -165,10 +256,54 @@ Content:
 """
 
 
-def walk_files():
+def hash_file(file: str) -> str:
+    """
+    Compute the SHA-256 hash of a file content.
+    """
+    sha = hashlib.sha256()
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def parse_path(file: str):
+    """
+    Get the date and subfolder of a file from its /shared/<date>/<subfolder>/ path.
+    """
+    parts = file.split("/")
+    try:
+        date = datetime.fromisoformat(parts[2])
+    except Exception:
+        date = None
+    subfolder = parts[3] if len(parts) > 4 else None
+    return date, subfolder
+
+
+def walk_files(start_date: str = None, end_date: str = None):
+    """
+    List all files in /shared, skipping the temporary ones.
+    With a date range, only the /shared/<YYYY-MM-DD> directories inside the
+    range are walked.
+    """
+    roots = ["/shared"]
+    if start_date or end_date:
+        start_date = start_date[:10] if start_date else "0000-00-00"
+        end_date = end_date[:10] if end_date else "9999-99-99"
+        roots = []
+        for entry in os.scandir("/shared"):
+            if not entry.is_dir() or not start_date <= entry.name <= end_date:
+                continue
+            try:
+                datetime.strptime(entry.name, "%Y-%m-%d")
+            except ValueError:
+                continue
+            roots.append(entry.path)
+
     return [
         os.path.join(dp, filename)
-        for dp, _, filenames in os.walk("/shared")
+        for root in roots
+        for dp, _, filenames in os.walk(root)
         for filename in filenames
-        if filename != ".DS_Store"
+        if filename != ".DS_Store" and not filename.endswith(TEMPORARY_SUFFIXES)
     ]
@@ -17,6 +17,11 @@ def is_chat_running(session_id: str):
     return ChatManager.is_running(session_id)
 
 
+@router.post("/{session_id}/cancel")
+def cancel_chat_session(session_id: str):
+    return ChatManager.cancel(session_id)
+
+
 @router.post("/create")
 def create_chat_session(title: str):
     return ChatManager.create_chat(title)
@@ -1,3 +1,5 @@
+import base64
+import hashlib
 import json
 import logging
 import os
@@ -8,18 +10,23 @@ from datetime import datetime
 from io import BytesIO
 from typing import List
 
-from controllers.FileManager import FileManager
+from controllers.CatalogManager import CatalogManager
+from controllers.FileManager import DEEP_MODE, HYBRID_MODE, FileManager
+from controllers.IngestManager import IngestManager
 from controllers.NoteManager import NoteManager
 from controllers.OCRManager import OCRManager
+from controllers.SimilarityManager import SIMILARITY_THRESHOLD, SimilarityManager
+from controllers.SuggestManager import SuggestManager
 from controllers.SummarizeManager import SummarizeManager
 from controllers.TranscriptionManager import TranscriptionManager
+from controllers.VectorManager import VectorManager
 from db import get_db
 from db.models import Note, ProjectFile, TagFile, Link, StockPile
-from fastapi import APIRouter, HTTPException, UploadFile
+from fastapi import APIRouter, HTTPException, Query, UploadFile
 from PIL import Image
 from pillow_heif import register_heif_opener
-from starlette.responses import FileResponse
-from utils import guess_mime, walk_files
+from starlette.responses import FileResponse, StreamingResponse
+from utils import guess_mime, hash_file
 from views.settings import get_setting
 from views.stockpile import StockPile, get_recent_added
 from pydub import AudioSegment
@@ -65,6 +72,18 @@ def add_recent_added_file(file: str):
         db.close()
 
 
+async def save_upload(file: UploadFile, path: str):
+    """
+    Stream an uploaded file to disk, returns the SHA-256 hash of its content.
+    """
+    sha = hashlib.sha256()
+    with open(path, "wb") as f:
+        while chunk := await file.read(1024 * 1024):
+            sha.update(chunk)
+            f.write(chunk)
+    return sha.hexdigest()
+
+
 @router.post("/upload")
 async def upload_files(
     files: List[UploadFile],
@@ -73,10 +92,17 @@ async def upload_files(
     projects: str = None,
     tags: str = None,
     file_edit_info: str = None,
+    duplicates: str = None,
 ):
     """
     Upload a file to the system.
+    Uploads whose content is already in /shared are rejected, hard linked to
+    the existing file or kept as a copy depending on duplicates (defaults to
+    the upload_duplicates setting). Linked and kept duplicates get the OCR,
+    transcription and summary of the existing file instead of being processed.
     """
+    duplicates = duplicates or get_setting("upload_duplicates")
+    found_duplicates = {}
     file_edit_info = json.loads(file_edit_info) if file_edit_info else {}
     date = date or datetime.now().strftime("%Y-%m-%d")
     projects = json.loads(projects) if projects else []
@@ -116,20 +142,49 @@ async def upload_files(
                 )
             )
             file_exists = os.path.exists(file_path)
+            temp_path = f"{file_path}.part"  # skipped by the /shared watcher
 
-            if file_ext == ".heic":
-                content = await file.read()
-                image = Image.open(BytesIO(content))
-                image.save(file_path, format="PNG")
-            elif file_ext == ".m4a":
-                content = await file.read()
-                audio = AudioSegment.from_file(BytesIO(content))
-                audio.export(file_path, format="mp3")
-            else:
-                with open(file_path, "wb") as f:
-                    f.write(await file.read())
+            try:
+                if file_ext == ".heic":
+                    content = await file.read()
+                    image = Image.open(BytesIO(content))
+                    image.save(temp_path, format="PNG")
+                    hash = hash_file(temp_path)
+                elif file_ext == ".m4a":
+                    content = await file.read()
+                    audio = AudioSegment.from_file(BytesIO(content))
+                    audio.export(temp_path, format="mp3")
+                    hash = hash_file(temp_path)
+                else:
+                    hash = await save_upload(file, temp_path)
+
+                sources = CatalogManager.find_duplicates(hash, exclude=file_path)
+                source = sources[0] if sources else None
+                if source and duplicates == "reject":
+                    os.remove(temp_path)
+                    found_duplicates[file.filename] = source
+                    logging.info(f"Rejected upload of {file_path}, same as {source}")
+                    continue
+                if source and duplicates == "link":
+                    try:
+                        os.link(source, f"{file_path}.link.tmp")
+                        os.replace(f"{file_path}.link.tmp", file_path)
+                        os.remove(temp_path)
+                    except OSError as e:
+                        logging.warning(f"Can't link {file_path} to {source}: {str(e)}")
+                        os.replace(temp_path, file_path)
+                else:
+                    os.replace(temp_path, file_path)
+            finally:
+                # Left behind when the upload failed before being moved
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            if source:
+                found_duplicates[file.filename] = source
 
             add_recent_added_file(file_path)
+            CatalogManager.add(file_path, hash)
+            done = IngestManager.copy_processing(source, file_path) if source else []
 
             db = get_db()
             try:
@@ -155,33 +210,23 @@ async def upload_files(
                 )
             finally:
                 db.close()
+            FileManager.index_file(file_path)
+            SimilarityManager.index_file(file_path)
 
-            if file_exists:
+            if file_exists and not source:
                 os.utime(file_path, None)
-            else:
-                auto_summary = get_setting("enable_auto_summary")
-                mime = guess_mime(file_path)
-
-                if (
-                    mime
-                    and mime.startswith("image/")
-                    and get_setting("enable_auto_ocr")
-                ):
-                    OCRManager.add_file_to_queue(file_path)
-                    if auto_summary:
-                        SummarizeManager.add_file_to_queue(file_path)
-
-                elif (
-                    mime and (mime.startswith("audio/") or mime.startswith("video/"))
-                ) and get_setting("enable_auto_transcription"):
-                    TranscriptionManager.add_file_to_queue(file_path)
-                    if auto_summary:
-                        SummarizeManager.add_file_to_queue(file_path)
-
-                elif auto_summary:
-                    SummarizeManager.add_file_to_queue(file_path)
-
-        return {"message": f"{len(files)} files uploaded successfully."}
+            elif not file_exists:
+                IngestManager.enqueue_processing(file_path, done=done)
+
+        if duplicates == "reject" and found_duplicates:
+            return {
+                "message": f"{len(files) - len(found_duplicates)} files uploaded successfully, {len(found_duplicates)} duplicates rejected.",
+                "duplicates": found_duplicates,
+            }
+        return {
+            "message": f"{len(files)} files uploaded successfully.",
+            "duplicates": found_duplicates,
+        }
     except Exception as e:
         for file in files:
             file_path = os.path.join("/shared", date, subdirectory, file.filename)
@@ -190,6 +235,8 @@ async def upload_files(
             SummarizeManager.delete(file_path)
             OCRManager.delete(file_path)
             TranscriptionManager.delete(file_path)
+            CatalogManager.delete(file_path)
+            FileManager.unindex_file(file_path)
         logging.error(f"Removed files after error: {file_path}")
 
         logging.error(f"Error uploading files: {str(e)}")
@@ -236,6 +283,10 @@ async def delete_file(file: str):
             db.close()
 
         os.remove(file_path)
+        CatalogManager.delete(file_path)
+        FileManager.unindex_file(file_path)
+        VectorManager.remove_file(file_path)
+        SimilarityManager.remove_file(file_path)
         return {"message": f"File {file} deleted successfully."}
     except FileNotFoundError as e:
         logging.error(f"File not found: {str(e)}")
@@ -321,6 +372,11 @@ async def move_file(
         finally:
             db.close()
         os.rename(file, new_file_path)
+        CatalogManager.move(file, new_file_path)
+        FileManager.unindex_file(file)
+        FileManager.index_file(new_file_path)
+        VectorManager.move_file(file, new_file_path)
+        SimilarityManager.move_file(file, new_file_path)
 
         return new_file_path
     except FileNotFoundError as e:
@@ -383,15 +439,84 @@ async def get_file_metadata(file: str):
         raise HTTPException(status_code=404, detail=str(e))
 
 
+def encode_cursor(file: str) -> str:
+    return base64.urlsafe_b64encode(file.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        return base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def paginate(
+    files: List,
+    limit: int,
+    cursor: str = None,
+    key=lambda file: file,
+    ranked: bool = False,
+):
+    """
+    Cut a page out of a list sorted by descending path, or of a ranked list.
+    The cursor is the opaque position of the last item of the previous page,
+    its path or, in a ranked list, its index.
+    """
+    start = 0
+    if cursor:
+        after = decode_cursor(cursor)
+        if ranked:
+            try:
+                start = int(after)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor.")
+        else:
+            start = next(
+                (i for i, file in enumerate(files) if key(file) < after), len(files)
+            )
+    page = files[start : start + limit]
+    next_cursor = None
+    if start + limit < len(files):
+        next_cursor = encode_cursor(
+            str(start + limit) if ranked else key(page[-1])
+        )
+    return {"files": page, "total": len(files), "next_cursor": next_cursor}
+
+
+def stream_ndjson(items):
+    return StreamingResponse(
+        (json.dumps(item, default=str) + "\n" for item in items),
+        media_type="application/x-ndjson",
+    )
+
+
 @router.get("/list")
-async def list_files():
+async def list_files(limit: int = Query(None, ge=1), cursor: str = None):
+    """
+    List all files in the system, most recent first.
+    With a limit, a page is returned along with the cursor of the next one.
     """
-    List all files in the system.
+    if limit is None:
+        return CatalogManager.list_paths()
+
+    # One more path tells whether there is a next page
+    files = CatalogManager.list_paths(
+        limit=limit + 1, before=decode_cursor(cursor) if cursor else None
+    )
+    total = CatalogManager.count()
+    return {
+        "files": files[:limit],
+        "total": total,
+        "next_cursor": encode_cursor(files[limit - 1]) if len(files) > limit else None,
+    }
+
+
+@router.get("/list/stream")
+async def stream_files():
     """
-    result = walk_files()
-    result.sort()
-    result.reverse()
-    return result
+    Stream all files in the system as NDJSON, most recent first.
+    """
+    return stream_ndjson(CatalogManager.iter_paths())
 
 
 @router.get("/count")
@@ -399,7 +524,87 @@ async def count_files():
     """
     Count the number of files in the system.
     """
-    return len(walk_files())
+    return CatalogManager.count()
+
+
+@router.post("/reconcile")
+def reconcile_files(start_date: str = None, end_date: str = None):
+    """
+    Reconcile the file catalog with the content of the shared folder,
+    optionally only for the date directories between start_date and end_date.
+    New files are indexed and queued for processing like uploads.
+    Not async: the scan walks and hashes files, so it runs in the threadpool
+    instead of blocking the other requests.
+    """
+    try:
+        changes = IngestManager.scan(start_date, end_date)
+        return {
+            "message": "File catalog reconciled successfully.",
+            "added": len(changes["added"]),
+            "updated": len(changes["updated"]),
+            "removed": len(changes["removed"]),
+        }
+    except Exception as e:
+        logging.error(f"Error reconciling file catalog: {str(e)}")
+        logging.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=500, detail=f"Error reconciling file catalog: {str(e)}"
+        )
+
+
+def search_filters(
+    start_date: str = None,
+    end_date: str = None,
+    subfolder: str = None,
+    types: str = None,
+    projects: str = None,
+    tags: str = None,
+    exclude_file_types: bool = False,
+    exclude_subfolders: bool = False,
+    exclude_projects: bool = False,
+    exclude_tags: bool = False,
+):
+    """
+    Turn the comma-separated search parameters into FileManager filters.
+    """
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "subfolders": subfolder.split(",") if subfolder else None,
+        "types": types.split(",") if types else None,
+        "projects": projects.split(",") if projects else None,
+        "tags": tags.split(",") if tags else None,
+        "exclude_file_types": exclude_file_types,
+        "exclude_subfolders": exclude_subfolders,
+        "exclude_projects": exclude_projects,
+        "exclude_tags": exclude_tags,
+    }
+
+
+def is_ranked(text: str = None, search_mode: int = 0):
+    """
+    Whether a search returns its files by relevance instead of by path.
+    """
+    return bool(text and text.strip()) and search_mode in (DEEP_MODE, HYBRID_MODE)
+
+
+def find_files(text: str = None, search_mode: int = 0, **filters):
+    """
+    Search for files, by relevance for DEEP and HYBRID text searches, by
+    descending path otherwise.
+    """
+    try:
+        result = FileManager.search_files(
+            text or None, search_mode=search_mode, **search_filters(**filters)
+        )
+        if not is_ranked(text, search_mode):
+            result.sort()
+            result.reverse()
+        return result
+    except Exception as e:
+        logging.error(f"Error searching files: {str(e)}")
+        logging.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error searching files: {str(e)}")
 
 
 @router.get("/search")
@@ -411,57 +616,176 @@ async def search_files(
     types: str = None,
     projects: str = None,
     tags: str = None,
-    search_mode: int = 0,  # 0: FAST, 1: NORMAL, 2: DEEP
+    search_mode: int = 0,  # 0: FAST, 1: NORMAL, 2: DEEP, 3: HYBRID
     exclude_file_types: bool = False,
     exclude_subfolders: bool = False,
     exclude_projects: bool = False,
     exclude_tags: bool = False,
+    limit: int = Query(None, ge=1),
+    cursor: str = None,
+    facets: bool = False,
+    pages: bool = False,
 ):
     """
     Search for files based on a query.
+    With a limit, a page is returned along with the cursor of the next one.
+    With facets, the counts of the matched files by type, subfolder, project,
+    tag, day and month are returned along with them.
+    With pages, the best matching pages of the returned files are returned
+    along with them.
     """
-    if text is not None and len(text) == 0:
-        text = None
-    if types is not None and len(types) == 0:
-        types = None
-    if subfolder is not None and len(subfolder) == 0:
-        subfolder = None
-    if projects is not None and len(projects) == 0:
-        projects = None
-    if tags is not None and len(tags) == 0:
-        tags = None
+    filters = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "subfolder": subfolder,
+        "types": types,
+        "projects": projects,
+        "tags": tags,
+        "exclude_file_types": exclude_file_types,
+        "exclude_subfolders": exclude_subfolders,
+        "exclude_projects": exclude_projects,
+        "exclude_tags": exclude_tags,
+    }
+    result = find_files(text, search_mode=search_mode, **filters)
+    if limit is None and not facets and not pages:
+        return result
 
-    try:
-        result = FileManager.search_files(
+    response = (
+        paginate(result, limit, cursor, ranked=is_ranked(text, search_mode))
+        if limit is not None
+        else {"files": result, "total": len(result)}
+    )
+    if facets:
+        try:
+            response["facets"] = FileManager.count_facets(
+                result if text else None, **search_filters(**filters)
+            )
+        except Exception as e:
+            logging.error(f"Error counting facets: {str(e)}")
+            logging.error(traceback.format_exc())
+            raise HTTPException(
+                status_code=500, detail=f"Error counting facets: {str(e)}"
+            )
+    if pages:
+        try:
+            response["pages"] = FileManager.match_pages(text, response["files"])
+        except Exception as e:
+            logging.error(f"Error matching pages: {str(e)}")
+            logging.error(traceback.format_exc())
+            raise HTTPException(
+                status_code=500, detail=f"Error matching pages: {str(e)}"
+            )
+    return response
+
+
+@router.get("/search/stream")
+async def stream_search_files(
+    text: str = None,
+    start_date: str = None,
+    end_date: str = None,
+    subfolder: str = None,
+    types: str = None,
+    projects: str = None,
+    tags: str = None,
+    search_mode: int = 0,  # 0: FAST, 1: NORMAL, 2: DEEP, 3: HYBRID
+    exclude_file_types: bool = False,
+    exclude_subfolders: bool = False,
+    exclude_projects: bool = False,
+    exclude_tags: bool = False,
+):
+    """
+    Search for files based on a query and stream them as NDJSON.
+    """
+    return stream_ndjson(
+        find_files(
             text,
-            start_date,
-            end_date,
-            subfolder.split(",") if subfolder else None,
-            types.split(",") if types else None,
-            projects.split(",") if projects else None,
-            tags.split(",") if tags else None,
             search_mode=search_mode,
+            start_date=start_date,
+            end_date=end_date,
+            subfolder=subfolder,
+            types=types,
+            projects=projects,
+            tags=tags,
             exclude_file_types=exclude_file_types,
             exclude_subfolders=exclude_subfolders,
             exclude_projects=exclude_projects,
             exclude_tags=exclude_tags,
         )
-        result.sort()
-        result.reverse()
-        return result
-    except Exception as e:
-        logging.error(f"Error searching files: {str(e)}")
-        logging.error(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=f"Error searching files: {str(e)}")
+    )
+
+
+@router.get("/suggest")
+async def suggest(prefix: str, limit: int = 10, kinds: str = None):
+    """
+    Suggest file names, keywords, tags and projects starting with a prefix.
+    Kinds is a comma-separated subset of file, keyword, tag and project.
+    """
+    return SuggestManager.suggest(
+        prefix, limit=limit, kinds=kinds.split(",") if kinds else None
+    )
+
+
+@router.get("/suggest/stats")
+async def get_suggest_stats():
+    """
+    Count the suggestions of each kind.
+    """
+    return SuggestManager.stats()
+
+
+@router.get("/cache")
+async def get_search_cache_stats():
+    """
+    Get the hit/miss counters of the search result cache.
+    """
+    return FileManager.cache.stats()
+
+
+@router.get("/vectors")
+async def get_vector_stats():
+    """
+    Get the size of the semantic vector index.
+    """
+    return VectorManager.stats()
+
+
+@router.get("/similar/{file:path}")
+async def get_similar_files(file: str, threshold: float = None, limit: int = 20):
+    """
+    Get the near-duplicates of a file with their estimated similarity.
+    """
+    return SimilarityManager.similar(
+        file, threshold=threshold or SIMILARITY_THRESHOLD, limit=limit
+    )
+
+
+@router.get("/duplicates")
+async def get_near_duplicates(threshold: float = None, min_size: int = 2):
+    """
+    Get the groups of near-duplicate files, largest first.
+    """
+    return {
+        "clusters": SimilarityManager.clusters(
+            threshold=threshold or SIMILARITY_THRESHOLD, min_size=min_size
+        ),
+        **SimilarityManager.stats(),
+    }
 
 
 @router.get("/index")
-async def index_files():
+async def index_files(limit: int = Query(None, ge=1), cursor: str = None):
     """
-    Index all files in the system.
+    Get the indexed documents of all files.
+    With a limit, a page is returned along with the cursor of the next one.
     """
     try:
-        return FileManager.get_indexed_files()
+        documents = FileManager.get_indexed_files()
+        if limit is None:
+            return documents
+        documents.sort(key=lambda document: document["file"], reverse=True)
+        return paginate(documents, limit, cursor, key=lambda document: document["file"])
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logging.error(f"Error getting indexed files: {str(e)}")
         logging.error(traceback.format_exc())
@@ -470,14 +794,32 @@ async def index_files():
         )
 
 
+@router.get("/index/stream")
+async def stream_index_files():
+    """
+    Stream the indexed documents of all files as NDJSON.
+    """
+    return stream_ndjson(FileManager.get_indexed_files())
+
+
+@router.get("/index/progress")
+async def get_index_progress():
+    """
+    Get the progress and throughput of the running or last index rebuild.
+    """
+    return FileManager.rebuild_progress
+
+
 @router.post("/index")
 async def reindex_files():
     """
-    Reindex all files in the system.
+    Start a full rebuild of the index, see /files/index/progress.
     """
     try:
-        FileManager.index_files()
-        return {"message": "Files reindexed successfully."}
+        FileManager.start_rebuild()
+        return {"message": "Index rebuild started."}
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logging.error(f"Error reindexing files: {str(e)}")
         logging.error(traceback.format_exc())
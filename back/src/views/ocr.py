@@ -3,6 +3,7 @@ import os
 import traceback
 
 from controllers.OCRManager import OCRManager
+from controllers.SchedulerManager import PRIORITY_INTERACTIVE, SchedulerManager
 from fastapi import APIRouter, HTTPException
 
 router = APIRouter(prefix="/ocr", tags=["OCR"])
@@ -14,7 +15,7 @@ async def get_running_ocr():
     Get the list of currently running OCR tasks.
     """
     try:
-        return OCRManager.in_progess_file
+        return SchedulerManager.running_files("ocr") or None
     except Exception as e:
         logging.error(f"Error retrieving running OCR tasks: {str(e)}")
         logging.error(traceback.format_exc())
@@ -76,7 +77,7 @@ async def launch_ocr(file: str):
     if not os.path.exists(file):
         raise HTTPException(status_code=404, detail=f"File {file} not found.")
     try:
-        OCRManager.add_file_to_queue(file)
+        OCRManager.add_file_to_queue(file, PRIORITY_INTERACTIVE)
         return {"message": f"OCR processing for {file} has been launched."}
     except Exception as e:
         logging.error(f"Error launching OCR for {file}: {str(e)}")
@@ -84,3 +85,24 @@ async def launch_ocr(file: str):
         raise HTTPException(
             status_code=500, detail=f"Error launching OCR for {file}: {str(e)}"
         )
+
+
+@router.post("/cancel/{file:path}")
+async def cancel_ocr(file: str):
+    """
+    Cancel the queued or running OCR of a specific file.
+    """
+    try:
+        cancelled = SchedulerManager.cancel("ocr", file)
+    except Exception as e:
+        logging.error(f"Error cancelling OCR for {file}: {str(e)}")
+        logging.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error cancelling OCR for {file}: {str(e)}",
+        )
+    if not cancelled:
+        raise HTTPException(
+            status_code=404, detail=f"No OCR task to cancel for {file}."
+        )
+    return {"message": f"OCR cancelled for {file}."}
@@ -2,6 +2,8 @@ import json
 import logging
 import traceback
 
+from controllers.FileManager import FileManager
+from controllers.SuggestManager import SuggestManager
 from db import Project, ProjectFile, get_db
 from fastapi import APIRouter, HTTPException
 
@@ -92,6 +94,7 @@ async def add_file_to_project(project_name: str, file: str):
         project_file = ProjectFile(file=file, project=project_name)
         db.add(project_file)
         db.commit()
+        FileManager.index_file(file)
         return {"message": "File added to project successfully."}
     except Exception as e:
         db.rollback()
@@ -124,6 +127,7 @@ async def remove_file_from_project(project_name: str, file: str):
             )
 
         db.commit()
+        FileManager.index_file(file)
         return {"message": "File removed from project successfully."}
     except Exception as e:
         db.rollback()
@@ -178,6 +182,7 @@ async def create_project(name: str, color: str, description: str = None):
         )
         db.add(project)
         db.commit()
+        SuggestManager.add("project", name)
         return {"message": "Project created successfully."}
     except Exception as e:
         db.rollback()
@@ -215,6 +220,19 @@ async def update_project(
             existing_project.description = description
 
         db.commit()
+        if name:
+            SuggestManager.remove("project", project_name)
+            SuggestManager.add("project", name)
+            FileManager.index_files(
+                [
+                    project_file.file
+                    for project_file in db.query(ProjectFile).filter(
+                        ProjectFile.project == name
+                    )
+                ]
+            )
+        else:
+            FileManager.notify_change()
         return {"message": "Project updated successfully."}
     except Exception as e:
         db.rollback()
@@ -244,12 +262,15 @@ async def delete_project(project_name: str):
         project_files = (
             db.query(ProjectFile).filter(ProjectFile.project == project_name).all()
         )
+        files = [pf.file for pf in project_files]
         for pf in project_files:
             db.delete(pf)
 
         # Delete the project itself
         db.delete(project)
         db.commit()
+        SuggestManager.remove("project", project_name)
+        FileManager.index_files(files)
         return {"message": "Project deleted successfully."}
     except Exception as e:
         db.rollback()
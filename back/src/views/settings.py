@@ -13,19 +13,33 @@ default_settings = {
     # "summarization_model": "llama3.1:8b",
     "search_limit": 50,
     "search_default_timeframe_days": 30,
+    "search_page_size": 100,
+    "catalog_reconcile_interval": 600,  # seconds, fallback full scan of /shared
+    "watcher_debounce": 2,  # seconds without events before a file is ingested
+    "index_workers": 4,  # processes used by full index rebuilds
+    "upload_duplicates": "link",  # link, reject or keep uploads of existing content
     "explorer_default_representation_mode": 1,  # 0: grid, 1: list, 2: table
     "projects_default_representation_mode": 1,  # 0: grid, 1: list, 2: table
     "chat_files_default_representation_mode": 0, # 0: grid, 1: list, 2: table
     "link_files_default_representation_mode": 0, # 0: grid, 1: list, 2: table
     "target_hourly_working_time": 7.5,
     "enable_auto_ocr": True,
+    "ocr_concurrency": 1,  # images processed at once, each loads its own models
+    "transcription_concurrency": 1,  # files transcribed at once
+    "summary_concurrency": 2,  # files summarized at once
+    "ocr_worker_idle_timeout": 300,  # seconds before the OCR & BLIP models are unloaded
     "enable_auto_transcription": True,
     "enable_auto_summary": True,
     "ollama_server": "http://ollama:11434",
     "transcription_type": "llama",
     "transcription_model": "small",
+    "transcription_compute_type": "int8",  # int8, float32 or default (the model's)
+    "transcription_beam_size": 5,
+    "transcription_cpu_threads": 0,  # 0: faster-whisper default
+    "transcription_worker_idle_timeout": 300,  # seconds before the model is unloaded
     "summarization_type": "llama",
     "summarization_model": "llama3.2:1b",
+    "embedding_model": "nomic-embed-text",
     "chat_type": "llama",
     "chat_model": "llama3.2:1b",
     "refractor_type": "llama",
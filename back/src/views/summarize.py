@@ -2,6 +2,7 @@ import logging
 import traceback
 
 from controllers.SummarizeManager import SummarizeManager
+from controllers.SchedulerManager import PRIORITY_INTERACTIVE, SchedulerManager
 from fastapi import APIRouter, HTTPException
 
 router = APIRouter(prefix="/summarize", tags=["Summarize"])
@@ -13,7 +14,7 @@ async def get_running_summarize():
     Get the list of currently running summarization tasks.
     """
     try:
-        return SummarizeManager.in_progress_file
+        return SchedulerManager.running_files("summary") or None
     except Exception as e:
         logging.error(f"Error retrieving running summarization tasks: {str(e)}")
         logging.error(traceback.format_exc())
@@ -76,7 +77,7 @@ async def launch_summarize(file: str):
     Launch summarization processing for a specific file.
     """
     try:
-        SummarizeManager.add_file_to_queue(file)
+        SummarizeManager.add_file_to_queue(file, PRIORITY_INTERACTIVE)
         return {"message": f"Summarization launched for {file}."}
     except Exception as e:
         logging.error(f"Error launching summarization for {file}: {str(e)}")
@@ -85,3 +86,24 @@ async def launch_summarize(file: str):
             status_code=500,
             detail=f"Error launching summarization for {file}: {str(e)}",
         )
+
+
+@router.post("/cancel/{file:path}")
+async def cancel_summarize(file: str):
+    """
+    Cancel the queued or running summarization of a specific file.
+    """
+    try:
+        cancelled = SchedulerManager.cancel("summary", file)
+    except Exception as e:
+        logging.error(f"Error cancelling summarization for {file}: {str(e)}")
+        logging.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error cancelling summarization for {file}: {str(e)}",
+        )
+    if not cancelled:
+        raise HTTPException(
+            status_code=404, detail=f"No summarization task to cancel for {file}."
+        )
+    return {"message": f"Summarization cancelled for {file}."}
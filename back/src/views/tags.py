@@ -1,6 +1,8 @@
 import logging
 import traceback
 
+from controllers.FileManager import FileManager
+from controllers.SuggestManager import SuggestManager
 from db import Tag, TagFile, get_db
 from fastapi import APIRouter, HTTPException
 
@@ -59,6 +61,7 @@ async def create_tag(name: str, color: str):
         tag = Tag(name=name, color=color)
         db.add(tag)
         db.commit()
+        SuggestManager.add("tag", name)
         return {"message": "Tag created successfully."}
     except Exception as e:
         db.rollback()
@@ -88,6 +91,17 @@ async def update_tag(tag_name: str, name: str = None, color: str = None):
             existing_tag.color = color
 
         db.commit()
+        if name:
+            SuggestManager.remove("tag", tag_name)
+            SuggestManager.add("tag", name)
+            FileManager.index_files(
+                [
+                    tag_file.file
+                    for tag_file in db.query(TagFile).filter(TagFile.tag == name)
+                ]
+            )
+        else:
+            FileManager.notify_change()
         return {"message": "Tag updated successfully."}
     except Exception as e:
         db.rollback()
@@ -136,6 +150,7 @@ async def add_file_to_tag(tag_name: str, file: str):
         tag_file = TagFile(file=file, tag=tag_name)
         db.add(tag_file)
         db.commit()
+        FileManager.index_file(file)
         return {"message": "File added to tag successfully."}
     except Exception as e:
         db.rollback()
@@ -192,6 +207,7 @@ async def remove_file_from_tag(tag_name: str, file: str):
             )
 
         db.commit()
+        FileManager.index_file(file)
         return {"message": "File removed from tag successfully."}
     except Exception as e:
         db.rollback()
@@ -217,12 +233,15 @@ async def delete_tag(tag_name: str):
 
         # Delete all files associated with the tag
         tag_files = db.query(TagFile).filter(TagFile.tag == tag_name).all()
+        files = [tf.file for tf in tag_files]
         for tf in tag_files:
             db.delete(tf)
 
         # Delete the tag itself
         db.delete(tag)
         db.commit()
+        SuggestManager.remove("tag", tag_name)
+        FileManager.index_files(files)
         return {"message": "Tag and all associated files deleted successfully."}
     except Exception as e:
         db.rollback()
@@ -3,6 +3,7 @@ import os
 import traceback
 
 from controllers.TranscriptionManager import TranscriptionManager
+from controllers.SchedulerManager import PRIORITY_INTERACTIVE, SchedulerManager
 from fastapi import APIRouter, HTTPException
 
 router = APIRouter(prefix="/transcription", tags=["Transcription"])
@@ -14,7 +15,7 @@ async def get_running_transcription():
     Get the list of currently running transcription tasks.
     """
     try:
-        return TranscriptionManager.in_progress_file
+        return SchedulerManager.running_files("transcription") or None
     except Exception as e:
         logging.error(f"Error retrieving running transcription tasks: {str(e)}")
         logging.error(traceback.format_exc())
@@ -80,7 +81,7 @@ async def launch_transcription(file: str):
         raise HTTPException(status_code=404, detail=f"File {file} does not exist.")
 
     try:
-        TranscriptionManager.add_file_to_queue(file)
+        TranscriptionManager.add_file_to_queue(file, PRIORITY_INTERACTIVE)
         return {"message": f"Transcription launched for {file}."}
     except Exception as e:
         logging.error(f"Error launching transcription for {file}: {str(e)}")
@@ -89,3 +90,24 @@ async def launch_transcription(file: str):
             status_code=500,
             detail=f"Error launching transcription for {file}: {str(e)}",
         )
+
+
+@router.post("/cancel/{file:path}")
+async def cancel_transcription(file: str):
+    """
+    Cancel the queued or running transcription of a specific file.
+    """
+    try:
+        cancelled = SchedulerManager.cancel("transcription", file)
+    except Exception as e:
+        logging.error(f"Error cancelling transcription for {file}: {str(e)}")
+        logging.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error cancelling transcription for {file}: {str(e)}",
+        )
+    if not cancelled:
+        raise HTTPException(
+            status_code=404, detail=f"No transcription task to cancel for {file}."
+        )
+    return {"message": f"Transcription cancelled for {file}."}
@@ -4,16 +4,37 @@ import sys
 from faster_whisper import WhisperModel
 
 
-def main(model, audio_path):
+def load(model, compute_type="default", cpu_threads=0):
     device = "cuda" if os.path.exists("/dev/nvidia0") else "cpu"
-    model = WhisperModel(model, device=device)
-    segments, _ = model.transcribe(audio_path)
-    full_text = " ".join([segment.text for segment in segments])
+    return WhisperModel(
+        model, device=device, compute_type=compute_type, cpu_threads=cpu_threads
+    )
+
+
+def transcribe(model, audio_path, beam_size=5):
+    segments, _ = model.transcribe(audio_path, beam_size=beam_size)
+    return " ".join([segment.text for segment in segments])
+
+
+def main(model, audio_path):
+    model = load(model)
+    full_text = transcribe(model, audio_path)
     print(full_text)
 
 
+def serve(model, compute_type, cpu_threads):
+    from tools.worker import serve
+
+    model = load(model, compute_type, int(cpu_threads))
+    serve(lambda file, beam_size=5: transcribe(model, file, beam_size))
+
+
 if __name__ == "__main__":
-    model = sys.argv[1]
-    audio_path = sys.argv[2]
+    if sys.argv[-1] == "--serve":
+        # model, compute type and CPU threads
+        serve(*sys.argv[1:-1])
+    else:
+        model = sys.argv[1]
+        audio_path = sys.argv[2]
 
-    main(model, audio_path)
+        main(model, audio_path)
@@ -0,0 +1,23 @@
+"""
+Processing worker: runs the OCR, transcription and summary jobs of the task
+tables outside of the API process.
+
+Jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED and a lease renewed
+while they run, so several workers can drain the same tables. The API process
+indexes their results. Run the API with EMBEDDED_WORKERS=false so it doesn't
+run jobs itself, e.g.:
+
+    EMBEDDED_WORKERS=false docker compose --profile workers up -d --scale worker=3
+"""
+
+import logging
+
+from controllers.SchedulerManager import SchedulerManager
+from pillow_heif import register_heif_opener
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    register_heif_opener()
+    SchedulerManager.start_thread()
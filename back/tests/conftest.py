@@ -0,0 +1,73 @@
+import os
+import sys
+
+# The tests run against a throwaway sqlite database instead of MariaDB
+os.environ.setdefault("DATABASE_URL", "sqlite:////tmp/superdiary-tests.db")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import pytest
+from db import DB
+from db.models import Base
+
+
+@pytest.fixture(autouse=True)
+def database():
+    engine = DB().engine
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    yield
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    """
+    An empty search index under tmp_path, no rebuild is started.
+    """
+    import controllers.FileManager as module
+    from controllers.FileManager import FileManager
+
+    monkeypatch.setattr(module, "INDEX_PATH", str(tmp_path / "index"))
+    monkeypatch.setattr(module, "INDEX_VERSION_FILE", str(tmp_path / "index.version"))
+    monkeypatch.setattr(module, "INDEX_STAGING_PATH", str(tmp_path / "staging"))
+    monkeypatch.setattr(
+        module, "INDEX_CHECKPOINT_FILE", str(tmp_path / "index.checkpoint")
+    )
+    monkeypatch.setattr(FileManager, "start_rebuild", classmethod(lambda cls: None))
+    FileManager.setup()
+    FileManager.live_empty = False
+    FileManager.cache.invalidate()
+    return FileManager
+
+
+@pytest.fixture
+def make_file(tmp_path, monkeypatch):
+    """
+    Write a file under a stand-in /shared/<date>/<subfolder> and return its path.
+    """
+    import controllers.FileManager as module
+    from utils import parse_path
+
+    shared = str(tmp_path / "shared")
+    monkeypatch.setattr(
+        module, "parse_path", lambda file: parse_path(file.replace(shared, "/shared"))
+    )
+
+    def make(name, content, date="2024-05-01", subfolder="notes"):
+        folder = tmp_path / "shared" / date / subfolder
+        folder.mkdir(parents=True, exist_ok=True)
+        path = folder / name
+        path.write_text(content, encoding="utf-8")
+        return str(path)
+
+    return make
+
+
+@pytest.fixture
+def client():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from views.files import router
+
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import pytest
+from controllers.FileManager import DEEP_MODE
+from db import get_db
+from db.models import File
+from views.files import encode_cursor
+
+
+def test_deep_search_pages_keep_the_ranking(index, make_file, client):
+    # The best match has the lowest path, path order would reverse them
+    best = make_file("a.txt", "invoice " * 50)
+    other = make_file("z.txt", "invoice for the boiler, " + "radiator " * 50)
+    index.index_files([best, other])
+
+    response = client.get(
+        "/files/search", params={"text": "invoice", "search_mode": DEEP_MODE}
+    )
+    assert response.json() == [best, other]
+
+    pages, cursor = [], None
+    while True:
+        params = {"text": "invoice", "search_mode": DEEP_MODE, "limit": 1}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/files/search", params=params).json()
+        pages.append(page["files"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == [[best], [other]]
+
+
+def test_searches_without_text_are_sorted_by_path(index, make_file, client):
+    files = [make_file(name, "content") for name in ["b.txt", "c.txt", "a.txt"]]
+    index.index_files(files)
+
+    response = client.get("/files/search", params={"search_mode": DEEP_MODE})
+    assert response.json() == sorted(files, reverse=True)
+
+
+@pytest.mark.parametrize("route", ["/files/search", "/files/list", "/files/index"])
+@pytest.mark.parametrize("limit", [0, -1])
+def test_pages_need_a_positive_limit(index, client, route, limit):
+    assert client.get(route, params={"limit": limit}).status_code == 422
+
+
+def test_cursor_past_the_last_page(index, make_file, client):
+    files = [make_file(name, "invoice") for name in ["a.txt", "b.txt"]]
+    index.index_files(files)
+    db = get_db()
+    for file in files:
+        db.add(File(path=file, mime="text/plain", size=7, mtime=datetime.now()))
+    db.commit()
+    db.close()
+
+    for route, params in [
+        ("/files/search", {}),
+        ("/files/search", {"text": "invoice", "search_mode": DEEP_MODE}),
+        ("/files/list", {}),
+        ("/files/index", {}),
+    ]:
+        page = client.get(route, params={**params, "limit": 2}).json()
+        assert len(page["files"]) == 2 and page["next_cursor"] is None
+
+        # The cursor of the last file, or past the end of a ranked list
+        last = page["files"][-1]
+        cursor = encode_cursor(last if isinstance(last, str) else last["file"])
+        if "text" in params:
+            cursor = encode_cursor("2")
+        page = client.get(route, params={**params, "limit": 2, "cursor": cursor}).json()
+        assert page["files"] == [] and page["next_cursor"] is None
@@ -0,0 +1,53 @@
+from controllers.FileManager import CHUNK_HITS, CHUNK_SIZE, DEEP_MODE
+from db import get_db
+from db.models import Setting
+
+# Several chunks of filler with words to find at known offsets
+FILLER = "the boiler was serviced and the radiators bled. " * (CHUNK_SIZE // 16)
+TEXT = f"Plumber visit.\n{FILLER}The invoice arrives next week.\n"
+
+
+def test_deep_search_ignores_metadata_labels(index, make_file):
+    file = make_file("visit.txt", TEXT)
+    index.index_files([file])
+
+    for label in ["Summary", "Keywords", "Extension", "Content"]:
+        assert index.search_files(label, search_mode=DEEP_MODE) == []
+    assert index.search_files("invoice", search_mode=DEEP_MODE) == [file]
+
+
+def test_chunk_offsets_point_at_the_file_text(index, make_file):
+    file = make_file("visit.txt", TEXT)
+    index.index_files([file])
+
+    (match,) = index.match_pages("invoice", [file])[file]
+    assert match["page"] is None
+    assert match["end"] == len(TEXT)
+    assert "invoice" in TEXT[match["start"] : match["end"]]
+
+    (match,) = index.match_pages("plumber", [file])[file]
+    assert match["start"] == 0
+    assert TEXT[match["start"] : match["end"]].startswith("Plumber visit.")
+
+
+def test_deep_search_filters_chunks_before_the_limit(index, make_file):
+    db = get_db()
+    db.add(Setting(key="search_limit", value="int:1"))
+    db.commit()
+    db.close()
+
+    # More strongly matching chunks outside the date filter than chunk hits
+    excluded = [
+        make_file(f"{i}.txt", "invoice " * 100, date="2024-05-02")
+        for i in range(CHUNK_HITS * 2)
+    ]
+    allowed = make_file("visit.txt", TEXT)
+    index.index_files(excluded + [allowed])
+
+    result = index.search_files(
+        "invoice",
+        start_date="2024-05-01",
+        end_date="2024-05-01",
+        search_mode=DEEP_MODE,
+    )
+    assert result == [allowed]
@@ -1,6 +1,7 @@
 import datetime
 from typing import List
 
+import pandas as pd
 import requests
 import streamlit as st
 from utils import get_setting, mimes_map_compressed
@@ -19,6 +20,8 @@ def search_files(
     exclude_subfolders: bool = False,
     exclude_projects: bool = False,
     exclude_tags: bool = False,
+    page_size: int = None,
+    facets: bool = False,
 ):
     # MARK: SEARCH FILES
     with st.spinner("Searching files...", show_time=True):
@@ -37,17 +40,36 @@ def search_files(
             )
         if tags is not None and len(tags) > 0:
             request += f"&tags={','.join(tags)}&exclude_tags={exclude_tags}"
+        with_pages = text is not None and search_mode == 2
+        if with_pages:
+            request += "&pages=true"
+
+        first_page = request if page_size is None else f"{request}&limit={page_size}"
+        if facets:
+            first_page += "&facets=true"
 
         start_time = datetime.datetime.now()
-        result = requests.get(request)
+        result = requests.get(first_page)
         end_time = datetime.datetime.now()
 
     files = []
+    total = 0
+    next_cursor = None
+    counts = None
+    pages = {}
     if result.status_code == 200:
+        if page_size is None and not facets and not with_pages:
+            files = result.json()
+            total = len(files)
+        else:
+            files = result.json()["files"]
+            total = result.json()["total"]
+            next_cursor = result.json().get("next_cursor")
+            counts = result.json().get("facets")
+            pages = result.json().get("pages", {})
         st.toast(
-            f"Found {len(result.json())} files matching the criteria.",
+            f"Found {total} files matching the criteria.",
         )
-        files = result.json()
     else:
         st.toast(
             f"Failed to search files: {result.text}",
@@ -63,6 +85,12 @@ def search_files(
         "projects": projects,
         "tags": tags,
         "files": files,
+        "total": total,
+        "request": request,
+        "page_size": page_size,
+        "next_cursor": next_cursor,
+        "facets": counts,
+        "pages": pages,
         "search_mode": search_mode,
         "time_spent": end_time - start_time,
         "exclude_file_types": exclude_file_types,
@@ -72,6 +100,75 @@ def search_files(
     }
 
 
+def display_facets(facets):
+    """
+    Show how the matched files spread over types, subfolders, projects, tags
+    and time.
+    """
+    with st.expander("📊 Breakdown"):
+        cols = st.columns(4)
+        for col, (name, label) in zip(
+            cols,
+            [
+                ("types", "Types"),
+                ("subfolders", "Subfolders"),
+                ("projects", "Projects"),
+                ("tags", "Tags"),
+            ],
+        ):
+            with col:
+                st.markdown(f"**{label}**")
+                for value, count in list(facets[name].items())[:10]:
+                    st.caption(f"{value}: {count}")
+
+        if facets["days"]:
+            # by month when the days don't fit in a readable chart
+            counts = facets["months"] if len(facets["days"]) > 62 else facets["days"]
+            st.bar_chart(
+                pd.DataFrame({"date": list(counts), "files": list(counts.values())}),
+                x="date",
+                y="files",
+            )
+
+
+def display_pages(files, pages):
+    """
+    Show the best matching pages of the found files.
+    """
+    with st.expander("📄 Matching pages"):
+        for file in files:
+            if file in pages:
+                st.caption(
+                    f"{file.split('/')[-1]}: "
+                    + ", ".join(
+                        (
+                            f"page {match['page']}"
+                            if match["page"]
+                            else f"characters {match['start']}-{match['end']}"
+                        )
+                        for match in pages[file]
+                    )
+                )
+
+
+def load_more_files(search_result):
+    """
+    Fetch the next page of a paginated search and append it to the result.
+    """
+    with st.spinner("Loading more files...", show_time=True):
+        result = requests.get(
+            f"{search_result['request']}&limit={search_result['page_size']}&cursor={search_result['next_cursor']}"
+        )
+    if result.status_code == 200:
+        search_result["files"] += result.json()["files"]
+        search_result["total"] = result.json()["total"]
+        search_result["next_cursor"] = result.json()["next_cursor"]
+        search_result.get("pages", {}).update(result.json().get("pages", {}))
+    else:
+        st.error(f"Failed to load more files: {result.text}")
+    return search_result
+
+
 def search_engine(
     nbr_columns: int = 6,
     force_types: List[str] = None,
@@ -79,6 +176,8 @@ def search_engine(
     force_tags: List[str] = None,
     force_projects: List[str] = None,
     force_start_date: datetime = None,
+    page_size: int = None,
+    facets: bool = False,
 ):
     with st.form("file_search_form", clear_on_submit=False):
         search_text = st.text_input(
@@ -170,13 +269,14 @@ def search_engine(
                     "⚡️",
                     "🔍",
                     "🧠",
+                    "🧬",
                 ]
                 search_mode = st.segmented_control(
                     "Search mode",
                     options=range(len(representation_options)),
                     format_func=lambda x: representation_options[x],
                     default=1,
-                    help="Choose the search mode (⚡️ Quick, 🔍 Normal, 🧠 Deep). Quick Search is fast but less accurate — it only looks at keywords and notes. Normal Search also includes summaries. Deep Search is the most thorough (and slowest), scanning the full file content.",
+                    help="Choose the search mode (⚡️ Quick, 🔍 Normal, 🧠 Deep, 🧬 Hybrid). Quick Search is fast but less accurate — it only looks at keywords and notes. Normal Search also includes summaries. Deep Search is the most thorough (and slowest), scanning the full file content. Hybrid Search combines Normal Search with semantic matching, finding files about the same topic even without the same words.",
                     key="search_mode",
                 )
                 if search_mode is None:
@@ -226,12 +326,14 @@ def search_engine(
                 exclude_subfolders=exuclude_subfolders,
                 exclude_projects=exclude_projects,
                 exclude_tags=exclude_tags,
+                page_size=page_size,
+                facets=facets,
             )
     return None
 
 
 def generate_query_description(search_result):
-    query_str = f"Found {len(search_result['files'])} files in {search_result['time_spent'].total_seconds():.3f}s with mode {search_result['search_mode']} beetween {search_result['start_date']} and {search_result['end_date']}"
+    query_str = f"Found {search_result.get('total', len(search_result['files']))} files in {search_result['time_spent'].total_seconds():.3f}s with mode {search_result['search_mode']} beetween {search_result['start_date']} and {search_result['end_date']}"
     if search_result["query"] is not None and len(search_result["query"]) > 0:
         query_str += f" with query '{search_result['query']}'"
     if search_result["types"] is not None and len(search_result["types"]) > 0:
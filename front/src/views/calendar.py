@@ -355,12 +355,15 @@ def dialog_create_record(projects):
 
 
 def box_date(date):
+    page_size = get_setting("search_page_size", 100)
     files = requests.get(
-        f"http://back:80/files/search?start_date={date}&end_date={date}"
+        f"http://back:80/files/search?start_date={date}&end_date={date}&limit={page_size}"
     )
     error_files = None
+    nbr_files = 0
     if files.status_code == 200:
-        files = files.json()
+        nbr_files = files.json()["total"]
+        files = files.json()["files"]
     else:
         error_files = files.text
         files = []
@@ -398,10 +401,10 @@ def box_date(date):
     with st.expander(
         find_emoji_for_time_spent(sum([r["time_spent"] for r in records]), date)
         + date.strftime("%Y-%m-%d")
-        + f" - **{len(records)}** records, **{len(files)}** files, **{sum([r['time_spent'] for r in records])}** hours",
+        + f" - **{len(records)}** records, **{nbr_files}** files, **{sum([r['time_spent'] for r in records])}** hours",
         expanded=False,
     ):
-        tabs = st.tabs([f"📅 Records: {len(records)}", f"📁 Files: {len(files)}"])
+        tabs = st.tabs([f"📅 Records: {len(records)}", f"📁 Files: {nbr_files}"])
         with tabs[0]:
             st.error(
                 f"Error fetching records: {error_records}"
@@ -414,6 +417,8 @@ def box_date(date):
         with tabs[1]:
             st.error(f"Error fetching files: {error_files}") if error_files else None
             if files:
+                if nbr_files > len(files):
+                    st.caption(f"Showing the {len(files)} most recent files.")
                 display_files(
                     files,
                     representation_mode=0,
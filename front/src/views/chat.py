@@ -331,6 +331,18 @@ def is_chat_running(session_id):
         return False
 
 
+def cancel_chat(session_id):
+    try:
+        response = requests.post(f"http://back:80/chat/{session_id}/cancel")
+        if response.status_code == 200:
+            toast_for_rerun("Answer stopped.", icon="🛑")
+            load_chat_session(session_id, silent=True)
+        else:
+            st.toast("Failed to stop the answer.", icon="❌")
+    except requests.RequestException as e:
+        st.toast(f"Error stopping the answer: {e}", icon="❌")
+
+
 def stream_thinking(session_id):
     data = ""
     while True:
@@ -533,6 +545,8 @@ def chat():
                 st.markdown(content)
 
         if is_chat_running(st.session_state.chat_session).get("state") != "not_running":
+            if st.button("🛑 Stop answer", use_container_width=True):
+                cancel_chat(st.session_state.chat_session)
             with st.chat_message("assistant"):
                 with st.spinner("Thinking...", show_time=True):
                     st.write_stream(stream_thinking(st.session_state.chat_session))
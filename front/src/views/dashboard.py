@@ -4,7 +4,7 @@ import json
 import requests
 import streamlit as st
 from core.files import display_files
-from utils import clear_cache, fmt_bytes, spacer, toast_for_rerun
+from utils import clear_cache, fmt_bytes, get_setting, spacer, toast_for_rerun
 from widgets import bar_widget, disk_widget
 from dotenv import dotenv_values
 
@@ -115,6 +115,12 @@ def dialog_upload(files):
             if response.status_code == 200:
                 del st.session_state.dashboard_new_files
                 clear_cache()
+                duplicates = response.json().get("duplicates", {})
+                if duplicates:
+                    toast_for_rerun(
+                        f"{len(duplicates)} files were already uploaded: {', '.join(duplicates)}",
+                        icon="♊",
+                    )
                 toast_for_rerun(
                     "Files uploaded successfully!",
                     icon="🆕",
@@ -175,14 +181,19 @@ def dashboard():
                     key="recent_opened_files",
                 )
 
+        page_size = get_setting("search_page_size", 100)
         sub_cols = st.columns(2)
         with sub_cols[0]:
             today_files = requests.get(
-                f"http://back:80/files/search?start_date={today}&end_date={today}"
+                f"http://back:80/files/search?start_date={today}&end_date={today}&limit={page_size}"
             ).json()
-            with st.expander(f"Today files - {len(today_files)} files", expanded=True):
+            with st.expander(
+                f"Today files - {today_files['total']} files", expanded=True
+            ):
+                if today_files["next_cursor"]:
+                    st.caption(f"Showing the {page_size} most recent files.")
                 display_files(
-                    today_files,
+                    today_files["files"],
                     representation_mode=0,
                     multi_select_mode=0,
                     key="today_files",
@@ -190,13 +201,15 @@ def dashboard():
 
         with sub_cols[1]:
             week_files = requests.get(
-                f"http://back:80/files/search?start_date={today - datetime.timedelta(days=7)}&end_date={today}"
+                f"http://back:80/files/search?start_date={today - datetime.timedelta(days=7)}&end_date={today}&limit={page_size}"
             ).json()
             with st.expander(
-                f"Week files (7d) - {len(week_files)} files", expanded=True
+                f"Week files (7d) - {week_files['total']} files", expanded=True
             ):
+                if week_files["next_cursor"]:
+                    st.caption(f"Showing the {page_size} most recent files.")
                 display_files(
-                    week_files,
+                    week_files["files"],
                     representation_mode=0,
                     multi_select_mode=0,
                     key="week_files",
@@ -1,12 +1,20 @@
 import streamlit as st
-from core.explorer import search_engine, generate_query_description
+from core.explorer import (
+    display_facets,
+    display_pages,
+    generate_query_description,
+    load_more_files,
+    search_engine,
+)
 from core.files import display_files, representation_mode_select
 from utils import get_setting
 
 
 def explorer():
     # MARK: SEARCH FORM
-    search_result = search_engine()
+    search_result = search_engine(
+        page_size=get_setting("search_page_size", 100), facets=True
+    )
     if search_result is not None:
         st.session_state.explorer_files = search_result
 
@@ -20,6 +28,13 @@ def explorer():
     if "explorer_files" in st.session_state:
         query_str = generate_query_description(st.session_state.explorer_files)
         st.caption(query_str)
+        if st.session_state.explorer_files.get("facets"):
+            display_facets(st.session_state.explorer_files["facets"])
+        if st.session_state.explorer_files.get("pages"):
+            display_pages(
+                st.session_state.explorer_files["files"],
+                st.session_state.explorer_files["pages"],
+            )
 
         if len(st.session_state.explorer_files["files"]) > 0:
             # MARK: TABLE
@@ -29,6 +44,13 @@ def explorer():
                 nbr_of_files_per_line=nbr_of_files_per_line,
                 show_preview=show_preview,
             )
+            if st.session_state.explorer_files.get("next_cursor"):
+                if st.button(
+                    f"Load more ({len(st.session_state.explorer_files['files'])}/{st.session_state.explorer_files['total']})",
+                    use_container_width=True,
+                ):
+                    load_more_files(st.session_state.explorer_files)
+                    st.rerun()
         else:
             st.write("No files found in the system.")
     else:
@@ -216,7 +216,7 @@ def fetch_display_tasks(task_type: str, file: str = None):
         result_running = requests.get(f"http://back:80/{task_type}/running")
         if result_running.status_code == 200 and result_running.json() is not None:
             st.caption(
-                f"Daemon health: {health_status} - {result_running.content.decode('utf-8')}"
+                f"Daemon health: {health_status} - {', '.join(result_running.json())}"
             )
         else:
             st.caption(f"Daemon health: {health_status}")
@@ -383,6 +383,20 @@ def settings():
                 value=settings.get("auto_display_file_size_limit", 10),
                 help="Set the maximum file size (in MB) for automatic display in the viewer.",
             )
+            duplicate_options = {
+                "link": "🔗 Link to the existing file",
+                "reject": "🚫 Reject",
+                "keep": "📄 Keep a copy",
+            }
+            settings["upload_duplicates"] = st.selectbox(
+                "Duplicate uploads",
+                options=list(duplicate_options),
+                format_func=lambda x: duplicate_options[x],
+                index=list(duplicate_options).index(
+                    settings.get("upload_duplicates", "link")
+                ),
+                help="Choose what to do with uploads whose content is already in the diary. Linked and kept duplicates reuse the OCR, transcription and summary of the existing file.",
+            )
 
         with cols[1]:
             settings["search_default_timeframe_days"] = st.number_input(
@@ -391,6 +405,12 @@ def settings():
                 value=settings.get("search_default_timeframe_days", 30),
                 help="Set the default timeframe (in days) for search operations.",
             )
+            settings["search_page_size"] = st.number_input(
+                "Search page size (files)",
+                min_value=10,
+                value=settings.get("search_page_size", 100),
+                help="Set the number of files fetched per page in the explorer, dashboard and calendar.",
+            )
         
         with cols[2]:
             settings["target_hourly_working_time"] = st.number_input(
@@ -454,6 +474,13 @@ def settings():
                     value=settings["enable_auto_summary"],
                     help="Enable automatic summarization of text files when uploaded.",
                 )
+                settings["summary_concurrency"] = st.number_input(
+                    "Files summarized at once",
+                    min_value=1,
+                    max_value=16,
+                    value=settings.get("summary_concurrency", 2),
+                    help="Number of summaries requested from the model at once.",
+                )
                 settings["summarization_type"], settings["summarization_model"] = (
                     chose_ai_menu(
                         settings["summarization_type"],
@@ -471,6 +498,19 @@ def settings():
                     value=settings["enable_auto_ocr"],
                     help="Enable automatic OCR & BLIP processing of image files when uploaded.",
                 )
+                settings["ocr_concurrency"] = st.number_input(
+                    "Images processed at once",
+                    min_value=1,
+                    max_value=16,
+                    value=settings.get("ocr_concurrency", 1),
+                    help="Each image processed at once loads its own OCR & BLIP models, make sure you have enough RAM.",
+                )
+                settings["ocr_worker_idle_timeout"] = st.number_input(
+                    "Keep OCR & BLIP models loaded (seconds idle)",
+                    min_value=1,
+                    value=settings.get("ocr_worker_idle_timeout", 300),
+                    help="The models stay loaded between images so photo batches don't reload them for every image, and are unloaded after this idle time to free memory.",
+                )
 
             with st.expander("Transcription Settings", expanded=True):
                 st.caption(
@@ -488,6 +528,45 @@ def settings():
                     index=transcription_models.index(settings["transcription_model"]),
                     horizontal=True,
                 )
+                settings["transcription_concurrency"] = st.number_input(
+                    "Files transcribed at once",
+                    min_value=1,
+                    max_value=16,
+                    value=settings.get("transcription_concurrency", 1),
+                    help="Each file transcribed at once loads its own model, make sure you have enough RAM.",
+                )
+                compute_types = ["int8", "float32", "default"]
+                settings["transcription_compute_type"] = st.selectbox(
+                    "Compute type",
+                    options=compute_types,
+                    index=compute_types.index(
+                        settings.get("transcription_compute_type", "int8")
+                    ),
+                    help="int8 quantization is the fastest on CPU, float32 is slightly more accurate, default uses the precision of the model.",
+                )
+                cols_transcription = st.columns(3)
+                with cols_transcription[0]:
+                    settings["transcription_beam_size"] = st.number_input(
+                        "Beam size",
+                        min_value=1,
+                        max_value=10,
+                        value=settings.get("transcription_beam_size", 5),
+                        help="Higher values are more accurate but slower, 1 is greedy decoding.",
+                    )
+                with cols_transcription[1]:
+                    settings["transcription_cpu_threads"] = st.number_input(
+                        "CPU threads, 0 for default",
+                        min_value=0,
+                        value=settings.get("transcription_cpu_threads", 0),
+                        help="Number of CPU threads used by the transcription model.",
+                    )
+                with cols_transcription[2]:
+                    settings["transcription_worker_idle_timeout"] = st.number_input(
+                        "Keep model loaded (seconds idle)",
+                        min_value=1,
+                        value=settings.get("transcription_worker_idle_timeout", 300),
+                        help="The model stays loaded between files and is reloaded only when the model, compute type or CPU threads change. It is unloaded after this idle time to free memory.",
+                    )
                 st.markdown("""
 | Model       | Speed     | RAM Needed        | WER (English) |
 |-------------|-----------|-------------------|---------------|
@@ -501,6 +580,23 @@ def settings():
                     "Note: The higher the model, the more accurate the transcription, but it requires more resources, make sure you have enough RAM."
                 )
 
+            with st.expander("Semantic Search Settings", expanded=True):
+                st.caption(
+                    "Note: Hybrid search embeds summaries and file contents with an Ollama embedding model (e.g., nomic-embed-text). Changing the model embeds every file again."
+                )
+                result = requests.get("http://back:80/ollama/list")
+                installed_models = (
+                    [m["name"] for m in result.json()] if result.status_code == 200 else []
+                )
+                if settings["embedding_model"] not in installed_models:
+                    installed_models.append(settings["embedding_model"])
+                settings["embedding_model"] = st.selectbox(
+                    "Embedding model",
+                    options=installed_models,
+                    index=installed_models.index(settings["embedding_model"]),
+                    help="Select the Ollama model used to embed files for hybrid search.",
+                )
+
         if settings != loaded_settings:
             apply_settings(settings)
 
@@ -276,6 +276,27 @@ def dialog_add_link(file):
         st.rerun()
 
 
+# MARK: CANCEL TASK
+def cancel_task_button(task_type: str, label: str, file: str):
+    """
+    Show a button cancelling the queued or running task of the file, if any.
+    """
+    result = requests.get(f"http://back:80/{task_type}/tasks/{file}")
+    if result.status_code != 200 or not any(
+        task["state"] in ("PENDING", "IN_PROGRESS") for task in result.json()
+    ):
+        return
+    if st.button(
+        f"Cancel {label}", use_container_width=True, key=f"cancel_{task_type}"
+    ):
+        result = requests.post(f"http://back:80/{task_type}/cancel/{file}")
+        if result.status_code == 200:
+            toast_for_rerun(f"Cancelled the {label} task.", icon="🛑")
+            st.rerun()
+        else:
+            st.error(f"Failed to cancel {label} task.")
+
+
 # MARK: GET EDGES AND NODES FOR FILE LINKS
 def get_edges_and_nodes(
     file,
@@ -538,6 +559,25 @@ def see_file(file):
         else:
             st.warning("No links available for this file.")
 
+        result = requests.get(f"http://back:80/files/similar/{file}")
+        if result.status_code == 200 and result.json():
+            st.markdown("##### ♊ Similar documents")
+            for match in result.json():
+                cols = st.columns([1, 6])
+                with cols[0]:
+                    if st.button(
+                        "🔍",
+                        use_container_width=True,
+                        help=f"Click to view the similar file {match['file']}.",
+                        key=f"view_similar_{match['file']}",
+                    ):
+                        st.session_state["file_to_see"] = match["file"]
+                        st.switch_page(PAGE_VIEWER)
+                with cols[1]:
+                    st.markdown(
+                        f"{match['file'].split('/')[-1]} ({match['similarity']:.0%} similar)"
+                    )
+
     # MARK: SUMMARIZE
     with tab_summarize:
         result = requests.get(f"http://back:80/summarize/get/{file}")
@@ -565,6 +605,7 @@ def see_file(file):
                 st.rerun()
             else:
                 st.error("Failed to ask summary.")
+        cancel_task_button("summarize", "summary", file)
 
     # MARK: NOTES
     with tab_notes:
@@ -678,6 +719,7 @@ def view():
                         st.rerun()
                     else:
                         st.error("Failed to create transcription task.")
+                cancel_task_button("transcription", "transcription", file)
 
             elif mime.startswith("image/"):
                 # MARK: OCR
@@ -792,6 +834,7 @@ def view():
                         st.rerun()
                     else:
                         st.error("Failed to create OCR & BLIP task.")
+                cancel_task_button("ocr", "OCR & BLIP", file)
 
             elif (
                 file.endswith(".zip")